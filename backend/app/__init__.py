@@ -1,3 +1,3 @@
-from app.models import aluno, plano, checkin
+from app.models import academia, aluno, plano, checkin, snapshot, resumo, buffer, outbox, pontuacao, versao
 from app.schemas import Aluno, AlunoCreate, Plano, PlanoCreate, Checkin, CheckinCreate, Frequencia, RiscoChurn
 from app.services import churn_predictor 
\ No newline at end of file
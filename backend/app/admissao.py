@@ -0,0 +1,123 @@
+import asyncio
+import math
+import os
+import time
+from fastapi import HTTPException
+from app.metricas import metricas
+
+# Controle de admissão: cada classe de rota tem um limite de requisições
+# simultâneas e um tempo máximo de espera na fila. As requisições esperam no
+# event loop, antes de ocupar uma thread do threadpool ou uma conexão do banco.
+ATIVO = os.getenv("ADMISSAO_ATIVA", "true").lower() in ("1", "true", "sim")
+
+CHECKIN = "checkin"
+ESCRITA = "escrita"
+RISCO = "risco"
+LISTAGEM = "listagem"
+EXPORTACAO = "exportacao"
+DEGRADADO = "degradado"
+
+# (limite, espera máxima em ms, fila máxima). Fora os check-ins, a soma dos limites
+# fica abaixo do pool do banco (5 + 10 conexões), que sobra para as catracas.
+PADROES = {
+    CHECKIN: (32, 2000, 256),
+    ESCRITA: (3, 1000, 32),
+    RISCO: (3, 100, 16),
+    LISTAGEM: (3, 250, 16),
+    EXPORTACAO: (1, 0, 0),
+    DEGRADADO: (2, 50, 16),
+}
+
+
+class ClasseAdmissao:
+    """
+    Semáforo de uma classe de rotas. Quem não consegue entrar dentro da
+    espera máxima, ou encontra a fila cheia, é recusado.
+    Ajustável por ADMISSAO_<CLASSE>_LIMITE, _ESPERA_MS e _FILA.
+    """
+
+    def __init__(self, nome: str, limite: int, espera_ms: int, fila: int):
+        self.nome = nome
+        self.limite = int(os.getenv(f"ADMISSAO_{nome.upper()}_LIMITE", limite))
+        self.espera = int(os.getenv(f"ADMISSAO_{nome.upper()}_ESPERA_MS", espera_ms)) / 1000.0
+        self.fila_maxima = int(os.getenv(f"ADMISSAO_{nome.upper()}_FILA", fila))
+        # Sugestão de nova tentativa para o cliente recusado
+        self.tentar_em = max(1, math.ceil(self.espera * 2))
+        self.ativos = 0
+        self.na_fila = 0
+        self._semaforo = None  # Criado no event loop do servidor
+        metricas.definir(f"admissao_{nome}_limite", self.limite)
+
+    def _publicar(self):
+        metricas.definir(f"admissao_{self.nome}_ativos", self.ativos)
+        metricas.definir(f"admissao_{self.nome}_fila", self.na_fila)
+
+    async def entrar(self) -> bool:
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.limite)
+        if self._semaforo.locked() and self.na_fila >= self.fila_maxima:
+            return False
+
+        inicio = time.perf_counter()
+        self.na_fila += 1
+        self._publicar()
+        try:
+            if self._semaforo.locked() and self.espera <= 0:
+                return False
+            await asyncio.wait_for(self._semaforo.acquire(), self.espera or None)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.na_fila -= 1
+            metricas.observar(f"admissao_{self.nome}_espera_ms", (time.perf_counter() - inicio) * 1000)
+
+        self.ativos += 1
+        self._publicar()
+        return True
+
+    def sair(self):
+        self.ativos -= 1
+        self._semaforo.release()
+        self._publicar()
+
+
+classes = {nome: ClasseAdmissao(nome, *padrao) for nome, padrao in PADROES.items()}
+
+
+def admitir(nome: str, degradar: bool = False):
+    """
+    Dependência que reserva uma vaga na classe `nome` durante a requisição
+    e devolve se ela deve ser atendida em modo degradado. Sem vaga, a rota
+    com `degradar` passa para a classe degradado (resposta barata, sem
+    recalcular); as outras recebem 503 com Retry-After.
+    """
+    classe = classes[nome]
+
+    async def dependencia():
+        if not ATIVO:
+            yield False
+            return
+        if await classe.entrar():
+            try:
+                yield False
+            finally:
+                classe.sair()
+            return
+
+        degradado = classes[DEGRADADO]
+        if degradar and await degradado.entrar():
+            metricas.incrementar(f"admissao_{nome}_degradadas")
+            try:
+                yield True
+            finally:
+                degradado.sair()
+            return
+
+        metricas.incrementar(f"admissao_{nome}_recusadas")
+        raise HTTPException(
+            status_code=503,
+            detail="Servidor ocupado, tente novamente em instantes",
+            headers={"Retry-After": str(classe.tentar_em)}
+        )
+
+    return dependencia
@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
 import os
 from dotenv import load_dotenv
 
@@ -17,16 +18,40 @@ POSTGRES_PORT = os.getenv("POSTGRES_PORT")
 if not all([POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_DB, POSTGRES_HOST, POSTGRES_PORT]):
     raise ValueError("Variáveis de ambiente do banco de dados não configuradas corretamente")
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+# Réplicas de leitura (streaming replication do primário), no formato "host:porta,host:porta"
+POSTGRES_REPLICAS = [r.strip() for r in os.getenv("POSTGRES_REPLICAS", "").split(",") if r.strip()]
+
+def _url(host: str, port: str) -> str:
+    return f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{host}:{port}/{POSTGRES_DB}"
+
+SQLALCHEMY_DATABASE_URL = _url(POSTGRES_HOST, POSTGRES_PORT)
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engines_replica = [
+    create_engine(_url(*replica.rsplit(":", 1)), pool_pre_ping=True) for replica in POSTGRES_REPLICAS
+]
 
-Base = declarative_base()
+class SessaoRoteada(Session):
+    """
+    Sessão que manda leituras para a réplica escolhida na criação
+    (info={"replica": engine}; ver app.replicas). Escritas, SELECT ... FOR
+    UPDATE e tudo o que vem depois da primeira escrita na sessão vão para
+    o primário, então a sessão sempre lê o que ela mesma gravou.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if isinstance(clause, UpdateBase) or getattr(clause, "_for_update_arg", None) is not None:
+            self.info["escreveu"] = True
+        replica = self.info.get("replica")
+        if replica is None or self.info.get("escreveu"):
+            return engine
+        return replica
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close() 
\ No newline at end of file
+@event.listens_for(SessaoRoteada, "before_flush")
+def _marcar_flush(sessao, contexto, instancias):
+    # O flush escreve: a partir dele a sessão usa só o primário
+    sessao.info["escreveu"] = True
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=SessaoRoteada)
+
+Base = declarative_base()
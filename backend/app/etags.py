@@ -0,0 +1,125 @@
+import hashlib
+import os
+from collections import Counter
+from typing import List, Optional
+from fastapi import Request, Response
+from sqlalchemy import delete, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.metricas import metricas
+from app.models import AlteracaoRecurso, VersaoRecurso
+
+# O navegador guarda a resposta, mas revalida com If-None-Match a cada uso
+CACHE_CONTROL = "no-cache"
+# Alterações ainda não compactadas que uma leitura de versão tolera antes de compactar
+# a academia ela mesma; limita a contagem mesmo sem o worker (ou com ele parado)
+LIMITE_PENDENTES = int(os.getenv("ETAG_LIMITE_PENDENTES", "500"))
+# Primeira chave da trava consultiva da compactação em linha (a segunda é a academia)
+TRAVA_COMPACTACAO = 4242041
+
+
+def versao_aluno(aluno_id: int) -> str:
+    """Recurso com as alterações de um aluno e dos seus check-ins (ver migracoes)"""
+    return f"aluno:{aluno_id}"
+
+
+def versoes(db: Session, academia_id: int, recursos: List[str]) -> List[int]:
+    """
+    Contadores de alteração dos recursos da academia, em uma consulta (0 se
+    nunca alterado): a parte compactada mais as alterações ainda não somadas.
+    As duas tabelas são lidas no mesmo snapshot, então a compactação não muda o valor.
+    Com alterações pendentes demais, compacta as da academia antes da próxima leitura.
+    """
+    partes = union_all(
+        select(VersaoRecurso.recurso, VersaoRecurso.versao.label("total"), literal(0).label("pendentes")).where(
+            VersaoRecurso.academia_id == academia_id,
+            VersaoRecurso.recurso.in_(recursos)
+        ),
+        select(AlteracaoRecurso.recurso, func.count().label("total"), func.count().label("pendentes")).where(
+            AlteracaoRecurso.academia_id == academia_id,
+            AlteracaoRecurso.recurso.in_(recursos)
+        ).group_by(AlteracaoRecurso.recurso)
+    ).subquery()
+    linhas = db.execute(
+        select(partes.c.recurso, func.sum(partes.c.total), func.sum(partes.c.pendentes)).group_by(partes.c.recurso)
+    ).all()
+    if sum(pendentes for _, _, pendentes in linhas) > LIMITE_PENDENTES:
+        compactar_em_linha(academia_id)
+    totais = {recurso: total for recurso, total, _ in linhas}
+    return [int(totais.get(recurso, 0)) for recurso in recursos]
+
+def compactar_versoes(db: Session, academia_id: Optional[int] = None) -> int:
+    """
+    Soma as alterações registradas pelos gatilhos em versoes_recursos e as
+    apaga, em uma transação (agendada no worker, ou só de uma academia em
+    compactar_em_linha). As escritas das rotas nunca esperam por ela: os
+    gatilhos só inserem em alteracoes_recursos.
+    """
+    comando = delete(AlteracaoRecurso)
+    if academia_id is not None:
+        comando = comando.where(AlteracaoRecurso.academia_id == academia_id)
+    linhas = db.execute(comando.returning(AlteracaoRecurso.recurso, AlteracaoRecurso.academia_id)).all()
+    if not linhas:
+        db.rollback()
+        return 0
+
+    contagens = Counter((recurso, academia_id) for recurso, academia_id in linhas)
+    comando = insert(VersaoRecurso).values([
+        {"recurso": recurso, "academia_id": academia_id, "versao": total}
+        for (recurso, academia_id), total in contagens.items()
+    ])
+    db.execute(comando.on_conflict_do_update(
+        index_elements=[VersaoRecurso.recurso, VersaoRecurso.academia_id],
+        set_={"versao": VersaoRecurso.versao + comando.excluded.versao}
+    ))
+    db.commit()
+    metricas.incrementar("versoes_compactadas", len(linhas))
+    return len(linhas)
+
+def compactar_em_linha(academia_id: int):
+    """
+    Compactação disparada por uma leitura, numa sessão própria no primário
+    (a da requisição pode estar numa réplica). Se outra requisição já está
+    compactando a academia, segue sem esperar; uma falha aqui não derruba a leitura.
+    """
+    db = SessionLocal()
+    try:
+        if db.execute(select(func.pg_try_advisory_xact_lock(TRAVA_COMPACTACAO, academia_id))).scalar():
+            if compactar_versoes(db, academia_id):
+                metricas.incrementar("versoes_compactadas_em_linha")
+    except Exception as e:
+        print(f"Erro ao compactar versões da academia {academia_id}: {str(e)}")
+    finally:
+        db.rollback()
+        db.close()
+
+
+def gerar_etag(*partes) -> str:
+    return '"' + hashlib.sha1("|".join(str(parte) for parte in partes).encode()).hexdigest()[:24] + '"'
+
+
+def etag_recursos(db: Session, academia_id: int, *recursos: str, extra=()) -> str:
+    """ETag forte a partir das versões dos recursos (e de partes extras, como a versão do modelo)"""
+    return gerar_etag(academia_id, *recursos, *versoes(db, academia_id, list(recursos)), *extra)
+
+
+def corresponde(request: Request, etag: str) -> bool:
+    cabecalho = request.headers.get("if-none-match")
+    if not cabecalho:
+        return False
+    candidatos = {candidato.strip() for candidato in cabecalho.split(",")}
+    candidatos |= {candidato[2:] for candidato in candidatos if candidato.startswith("W/")}
+    return "*" in candidatos or etag in candidatos
+
+
+def nao_modificado(etag: str) -> Response:
+    """304 sem corpo: nem ORM nem serialização são usados"""
+    metricas.incrementar("etag_304")
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def com_etag(resposta: Response, etag: str) -> Response:
+    resposta.headers["ETag"] = etag
+    resposta.headers["Cache-Control"] = CACHE_CONTROL
+    return resposta
@@ -1,13 +1,23 @@
-from fastapi import FastAPI
+import os
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import alunos, planos, checkin
-from app.database import engine, Base
+from fastapi.middleware.gzip import GZipMiddleware
+from app.routes import academias, alunos, planos, checkin, modelo, dashboard, metricas, exportacao
+from app.database import engine
+from app.migracoes import migrar
+from app.replicas import CABECALHO_LSN, marcar_escrita
+from app.services.buffer_checkins import buffer_checkins
+from app.services.indice_checkins import indice_checkins
 
-# Cria as tabelas no banco de dados
-Base.metadata.create_all(bind=engine)
+# Cria as tabelas no banco de dados e aplica as migrações (um worker por vez)
+migrar(engine)
 
 app = FastAPI(title="IA Gym API")
 
+# Tamanho mínimo (bytes) para compactar a resposta
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1000"))
+
 # Configuração do CORS
 app.add_middleware(
     CORSMiddleware,
@@ -15,12 +25,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lido pelo frontend para as leituras seguintes (ver app.replicas)
+    expose_headers=[CABECALHO_LSN],
 )
 
+# Compacta respostas grandes (listas de alunos, ranking, dashboard) quando o cliente aceita gzip
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES)
+
+# Leituras logo após uma escrita do mesmo cliente só usam réplicas que já a aplicaram (ver get_db)
+@app.middleware("http")
+async def rotear_leituras(request: Request, call_next):
+    return await run_in_threadpool(marcar_escrita, request, await call_next(request))
+
 # Inclui as rotas
+app.include_router(academias.router, prefix="/academia", tags=["academias"])
 app.include_router(alunos.router, prefix="/aluno", tags=["alunos"])
 app.include_router(planos.router, prefix="/plano", tags=["planos"])
 app.include_router(checkin.router, prefix="/aluno/checkin", tags=["checkin"])
+app.include_router(modelo.router, prefix="/modelo", tags=["modelo"])
+app.include_router(dashboard.router, prefix="/dashboard", tags=["dashboard"])
+app.include_router(metricas.router, prefix="/metricas", tags=["metricas"])
+app.include_router(exportacao.router, prefix="/exportacao", tags=["exportacao"])
+
+@app.on_event("startup")
+def iniciar_buffer_checkins():
+    if buffer_checkins is not None:
+        buffer_checkins.iniciar()
+
+@app.on_event("startup")
+def iniciar_indice_checkins():
+    if indice_checkins is not None:
+        indice_checkins.iniciar()
+
+@app.on_event("shutdown")
+def parar_buffer_checkins():
+    if buffer_checkins is not None:
+        buffer_checkins.parar()
 
 @app.get("/")
 def root():
@@ -0,0 +1,131 @@
+import json
+import os
+import struct
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+import numpy as np
+
+# Formatos das mensagens trocadas com os workers. O content_type de cada
+# mensagem diz como decodificá-la, então consumidores que só entendem
+# JSON continuam funcionando enquanto o formato padrão for JSON.
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_CHECKINS = "application/vnd.iagym.checkins.v1"
+
+# Formato usado pelos publicadores para lotes de check-ins ("json" ou "colunar").
+# Só deve virar "colunar" depois que todos os consumidores forem atualizados.
+FORMATO_CHECKINS = os.getenv("MENSAGENS_FORMATO_CHECKINS", "json")
+
+# Layout colunar v1 (little-endian):
+#   cabeçalho: "IGCK", versão (u8), 3 bytes reservados, quantidade (u32)
+#   aluno_id:  int64[quantidade]
+#   data:      int64[quantidade], microssegundos desde a época (UTC)
+MAGICO = b"IGCK"
+VERSAO = 1
+_CABECALHO = struct.Struct("<4sB3xI")
+_INT64 = np.dtype("<i8")
+_EPOCA = datetime(1970, 1, 1)
+_MICROSSEGUNDO = timedelta(microseconds=1)
+
+
+def codificar_checkins(aluno_ids, datas_us) -> bytes:
+    """Codifica colunas de aluno_id e data (em microssegundos) no layout colunar"""
+    aluno_ids = np.ascontiguousarray(aluno_ids, dtype=_INT64)
+    datas_us = np.ascontiguousarray(datas_us, dtype=_INT64)
+    if aluno_ids.shape != datas_us.shape or aluno_ids.ndim != 1:
+        raise ValueError("aluno_ids e datas devem ser vetores do mesmo tamanho")
+    return b"".join((
+        _CABECALHO.pack(MAGICO, VERSAO, len(aluno_ids)),
+        aluno_ids.tobytes(),
+        datas_us.tobytes(),
+    ))
+
+
+def decodificar_checkins(corpo: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Lê um lote colunar sem copiar: devolve (aluno_ids, datas_us) como views do corpo"""
+    if len(corpo) < _CABECALHO.size:
+        raise ValueError("Mensagem de check-ins truncada")
+    magico, versao, quantidade = _CABECALHO.unpack_from(corpo)
+    if magico != MAGICO:
+        raise ValueError("Mensagem não está no formato colunar de check-ins")
+    if versao != VERSAO:
+        raise ValueError(f"Versão {versao} do formato de check-ins não suportada")
+    if len(corpo) != _CABECALHO.size + 2 * quantidade * _INT64.itemsize:
+        raise ValueError("Tamanho da mensagem não confere com a quantidade de check-ins")
+
+    aluno_ids = np.frombuffer(corpo, dtype=_INT64, count=quantidade, offset=_CABECALHO.size)
+    datas_us = np.frombuffer(
+        corpo, dtype=_INT64, count=quantidade,
+        offset=_CABECALHO.size + quantidade * _INT64.itemsize
+    )
+    return aluno_ids, datas_us
+
+
+def colunas_de_dicts(checkins: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Converte a lista de dicts do formato JSON ({aluno_id, data}) em colunas"""
+    aluno_ids = np.fromiter((c["aluno_id"] for c in checkins), dtype=_INT64, count=len(checkins))
+    datas = [c["data"] for c in checkins]
+    if all(isinstance(data, str) for data in datas):
+        # O numpy converte strings ISO em lote, bem mais rápido que fromisoformat por linha
+        datas_us = np.array(datas, dtype="datetime64[us]").astype(_INT64)
+    else:
+        # Para datetimes a conversão do numpy é lenta; a aritmética com timedelta é mais rápida
+        datas_us = np.fromiter(
+            ((_como_datetime(data) - _EPOCA) // _MICROSSEGUNDO for data in datas),
+            dtype=_INT64, count=len(datas)
+        )
+    return aluno_ids, datas_us
+
+
+def _como_datetime(data) -> datetime:
+    return datetime.fromisoformat(data) if isinstance(data, str) else data
+
+
+def codificar_lote_checkins(checkins: List[Dict[str, Any]], formato: str = None) -> Tuple[bytes, str]:
+    """
+    Codifica um lote de check-ins no formato pedido (ou no padrão
+    configurado) e devolve o corpo junto com o content_type.
+    """
+    formato = formato or FORMATO_CHECKINS
+    if formato == "colunar":
+        return codificar_checkins(*colunas_de_dicts(checkins)), CONTENT_TYPE_CHECKINS
+    if formato != "json":
+        raise ValueError(f"Formato de mensagem desconhecido: {formato}")
+
+    corpo = {"checkins": [
+        {"aluno_id": c["aluno_id"],
+         "data": c["data"].isoformat() if isinstance(c["data"], datetime) else c["data"]}
+        for c in checkins
+    ]}
+    return json.dumps(corpo).encode(), CONTENT_TYPE_JSON
+
+
+def decodificar_lote_checkins(corpo: bytes, content_type: str = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Decodifica um lote de check-ins em qualquer formato suportado, escolhido pelo content_type"""
+    if content_type == CONTENT_TYPE_CHECKINS:
+        return decodificar_checkins(corpo)
+    # Sem content_type, assume JSON (mensagens publicadas antes do formato colunar)
+    return colunas_de_dicts(json.loads(corpo).get("checkins", []))
+
+
+def para_datetimes(datas_us: np.ndarray) -> List[datetime]:
+    """Converte microssegundos desde a época em datetimes (UTC, sem fuso)"""
+    return np.asarray(datas_us, dtype=_INT64).astype("datetime64[us]").tolist()
+
+
+# Eventos de domínio são roteados por academia: gym.eventos.<shard>.<academia_id>.<tipo>.
+# Cada shard tem sua fila (eventos.<shard>), então os eventos de uma academia ficam
+# sempre na mesma fila, em ordem, e os workers dividem os shards entre si (WORKER_SHARDS).
+EVENTOS_SHARDS = int(os.getenv("EVENTOS_SHARDS", "4"))
+
+
+def shard_da_academia(academia_id: int) -> int:
+    return academia_id % EVENTOS_SHARDS
+
+
+def rota_evento(tipo: str, academia_id: int) -> str:
+    return f"gym.eventos.{shard_da_academia(academia_id)}.{academia_id}.{tipo}"
+
+
+def filas_eventos() -> Dict[str, str]:
+    """Fila de cada shard de eventos e o padrão de routing key ligado a ela"""
+    return {f"eventos.{shard}": f"gym.eventos.{shard}.#" for shard in range(EVENTOS_SHARDS)}
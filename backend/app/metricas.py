@@ -0,0 +1,56 @@
+import threading
+from collections import deque
+
+class Metricas:
+    """
+    Registro simples de métricas do processo: contadores, valores
+    instantâneos (gauges) e distribuições com as últimas observações.
+    """
+
+    def __init__(self, janela: int = 1000):
+        self._lock = threading.Lock()
+        self._janela = janela
+        self._contadores = {}
+        self._valores = {}
+        self._distribuicoes = {}
+
+    def incrementar(self, nome: str, valor: float = 1):
+        with self._lock:
+            self._contadores[nome] = self._contadores.get(nome, 0) + valor
+
+    def definir(self, nome: str, valor: float):
+        with self._lock:
+            self._valores[nome] = valor
+
+    def observar(self, nome: str, valor: float):
+        with self._lock:
+            distribuicao = self._distribuicoes.get(nome)
+            if distribuicao is None:
+                distribuicao = self._distribuicoes[nome] = {
+                    "quantidade": 0, "soma": 0.0, "maximo": 0.0,
+                    "recentes": deque(maxlen=self._janela)
+                }
+            distribuicao["quantidade"] += 1
+            distribuicao["soma"] += valor
+            distribuicao["maximo"] = max(distribuicao["maximo"], valor)
+            distribuicao["recentes"].append(valor)
+
+    def resumo(self) -> dict:
+        with self._lock:
+            distribuicoes = {}
+            for nome, d in self._distribuicoes.items():
+                recentes = sorted(d["recentes"])
+                distribuicoes[nome] = {
+                    "quantidade": d["quantidade"],
+                    "media": d["soma"] / d["quantidade"],
+                    "maximo": d["maximo"],
+                    "p50": recentes[len(recentes) // 2],
+                    "p95": recentes[min(int(len(recentes) * 0.95), len(recentes) - 1)],
+                }
+            return {
+                "contadores": dict(self._contadores),
+                "valores": dict(self._valores),
+                "distribuicoes": distribuicoes,
+            }
+
+metricas = Metricas()
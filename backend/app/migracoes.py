@@ -0,0 +1,183 @@
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import AddConstraint, UniqueConstraint
+from app.database import Base
+from app.services.academias import definir_chave_academia_padrao, garantir_academia_padrao
+
+# Chave da trava consultiva que serializa as migrações entre processos
+TRAVA_MIGRACOES = 4242031
+
+# Tabelas substituídas por outras; só guardavam dados derivados, reconstruídos a partir dos check-ins
+TABELAS_OBSOLETAS = ("resumo_checkins_hora", "resumo_dashboard")
+# Índices substituídos por versões com a academia como primeira coluna
+INDICES_OBSOLETOS = {"alunos": ("ix_alunos_ativos_risco",)}
+# Colunas que deixaram de existir nos modelos (e que impediriam as inserções, se NOT NULL)
+COLUNAS_OBSOLETAS = {"resumo_dashboard_academia": ("ultimo_checkin_id",)}
+# Tabelas cujas alterações incrementam a versão do recurso (ETags das rotas)
+TABELAS_VERSIONADAS = ("alunos", "planos", "checkins")
+
+# Uma linha nova por comando e por academia afetada, lendo as linhas da tabela de
+# transição. Só insere: um contador compartilhado atualizado aqui ficaria travado
+# até o commit e enfileiraria todas as escritas da academia
+FUNCAO_VERSAO = """
+CREATE OR REPLACE FUNCTION incrementar_versao_recurso() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO alteracoes_recursos (recurso, academia_id)
+    SELECT TG_TABLE_NAME, academia_id FROM linhas_alteradas GROUP BY academia_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# Versão de cada aluno (recurso "aluno:<id>"), alterada pelas escritas no aluno e nos
+# seus check-ins: o ETag do risco de um aluno não muda com o check-in de outro
+TABELAS_VERSIONADAS_POR_ALUNO = ("alunos", "checkins")
+FUNCAO_VERSAO_ALUNO = """
+CREATE OR REPLACE FUNCTION incrementar_versao_aluno() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'alunos' THEN
+        INSERT INTO alteracoes_recursos (recurso, academia_id)
+        SELECT 'aluno:' || id, academia_id FROM linhas_alteradas GROUP BY id, academia_id;
+    ELSE
+        INSERT INTO alteracoes_recursos (recurso, academia_id)
+        SELECT 'aluno:' || aluno_id, academia_id FROM linhas_alteradas GROUP BY aluno_id, academia_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# Check-ins inseridos, por academia, dia e hora, para o resumo do dashboard
+# (ver models.ContagemCheckinPendente). Também só insere, pelo mesmo motivo
+FUNCAO_CONTAGEM_CHECKINS = """
+CREATE OR REPLACE FUNCTION registrar_contagem_checkins() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO contagens_checkins_pendentes (academia_id, dia, hora, total)
+    SELECT academia_id, data::date, EXTRACT(HOUR FROM data)::int, count(*)
+    FROM linhas_alteradas WHERE data IS NOT NULL
+    GROUP BY 1, 2, 3;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+def migrar(engine: Engine):
+    """
+    Cria as tabelas novas, a academia padrão e aplica as migrações numa
+    única transação. Cada worker do uvicorn importa a aplicação e chama
+    esta função; a trava consultiva faz os demais esperarem o primeiro
+    terminar, e aí não encontram mais nada a alterar.
+    """
+    with engine.begin() as conexao:
+        conexao.exec_driver_sql(f"SELECT pg_advisory_xact_lock({TRAVA_MIGRACOES})")
+        Base.metadata.create_all(bind=conexao)
+        garantir_academia_padrao(conexao)
+        aplicar_migracoes(conexao)
+        definir_chave_academia_padrao(conexao)
+
+def aplicar_migracoes(conexao: Connection):
+    """
+    Completa tabelas já existentes com as colunas, índices e restrições
+    de unicidade declarados nos modelos. O create_all só cria tabelas
+    novas; este passo é idempotente e roda logo depois dele na inicialização.
+    """
+    # Inspeciona pela mesma conexão: tabelas já alteradas na transação ficam
+    # travadas, e uma consulta por outra conexão esperaria por ela para sempre
+    inspector = inspect(conexao)
+    tabelas_existentes = set(inspector.get_table_names())
+
+    for tabela in TABELAS_OBSOLETAS:
+        if tabela in tabelas_existentes:
+            print(f"Migração: removendo tabela obsoleta {tabela}")
+            conexao.exec_driver_sql(f"DROP TABLE {tabela}")
+
+    for tabela in Base.metadata.sorted_tables:
+        if tabela.name not in tabelas_existentes:
+            continue
+
+        colunas = {coluna["name"]: coluna for coluna in inspector.get_columns(tabela.name)}
+        for nome in COLUNAS_OBSOLETAS.get(tabela.name, ()):
+            if nome in colunas:
+                print(f"Migração: removendo coluna obsoleta {tabela.name}.{nome}")
+                conexao.exec_driver_sql(f"ALTER TABLE {tabela.name} DROP COLUMN {nome}")
+        for coluna in tabela.columns:
+            existente = colunas.get(coluna.name)
+            if existente is not None:
+                if existente["nullable"] and not coluna.nullable and coluna.server_default is not None:
+                    # Passou a ser NOT NULL: preenche os nulos com o padrão antes de exigir
+                    padrao = coluna.server_default.arg
+                    print(f"Migração: {tabela.name}.{coluna.name} passa a ser NOT NULL DEFAULT {padrao}")
+                    conexao.exec_driver_sql(
+                        f"UPDATE {tabela.name} SET {coluna.name} = {padrao} WHERE {coluna.name} IS NULL"
+                    )
+                    conexao.exec_driver_sql(
+                        f"ALTER TABLE {tabela.name} ALTER COLUMN {coluna.name} SET DEFAULT {padrao}, "
+                        f"ALTER COLUMN {coluna.name} SET NOT NULL"
+                    )
+                continue
+            tipo = coluna.type.compile(dialect=conexao.dialect)
+            ddl = f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}'
+            if coluna.server_default is not None:
+                ddl += f" DEFAULT {coluna.server_default.arg}"
+            if not coluna.nullable:
+                ddl += " NOT NULL"
+            for chave in coluna.foreign_keys:
+                ddl += f" REFERENCES {chave.column.table.name} ({chave.column.name})"
+            print(f"Migração: {ddl}")
+            conexao.exec_driver_sql(ddl)
+
+        indices = {indice["name"]: indice for indice in inspector.get_indexes(tabela.name)}
+        for nome in INDICES_OBSOLETOS.get(tabela.name, ()):
+            if nome in indices:
+                print(f"Migração: removendo índice obsoleto {nome}")
+                conexao.exec_driver_sql(f"DROP INDEX {nome}")
+
+        for indice in tabela.indexes:
+            existente = indices.get(indice.name)
+            if existente is not None and bool(existente["unique"]) != bool(indice.unique):
+                # Unicidade mudou (por exemplo, passou a valer por academia): recria o índice
+                print(f"Migração: recriando índice {indice.name}")
+                conexao.exec_driver_sql(f"DROP INDEX {indice.name}")
+                existente = None
+            if existente is None:
+                print(f"Migração: criando índice {indice.name}")
+                indice.create(bind=conexao)
+
+        restricoes = {restricao["name"] for restricao in inspector.get_unique_constraints(tabela.name)}
+        for restricao in tabela.constraints:
+            if isinstance(restricao, UniqueConstraint) and restricao.name and restricao.name not in restricoes:
+                print(f"Migração: criando restrição {restricao.name}")
+                conexao.execute(AddConstraint(restricao))
+
+    _criar_gatilhos(conexao)
+
+def _criar_gatilhos(conexao):
+    """Gatilhos por comando (não por linha) que registram as alterações; só cria os que faltam"""
+    conexao.exec_driver_sql(FUNCAO_VERSAO)
+    conexao.exec_driver_sql(FUNCAO_VERSAO_ALUNO)
+    conexao.exec_driver_sql(FUNCAO_CONTAGEM_CHECKINS)
+    operacoes = (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+    gatilhos = [
+        (f"versao_{tabela}_{operacao.lower()}", tabela, operacao, transicao, "incrementar_versao_recurso")
+        for tabela in TABELAS_VERSIONADAS
+        for operacao, transicao in operacoes
+    ]
+    gatilhos += [
+        (f"versao_aluno_{tabela}_{operacao.lower()}", tabela, operacao, transicao, "incrementar_versao_aluno")
+        for tabela in TABELAS_VERSIONADAS_POR_ALUNO
+        for operacao, transicao in operacoes
+    ]
+    gatilhos.append(("contagem_checkins_insert", "checkins", "INSERT", "NEW", "registrar_contagem_checkins"))
+
+    existentes = {nome for (nome,) in conexao.exec_driver_sql(
+        "SELECT tgname FROM pg_trigger WHERE NOT tgisinternal"
+    )}
+    for nome, tabela, operacao, transicao, funcao in gatilhos:
+        if nome in existentes:
+            continue
+        print(f"Migração: criando gatilho {nome}")
+        conexao.exec_driver_sql(
+            f"CREATE TRIGGER {nome} AFTER {operacao} ON {tabela} "
+            f"REFERENCING {transicao} TABLE AS linhas_alteradas "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION {funcao}()"
+        )
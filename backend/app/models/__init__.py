@@ -1,5 +1,12 @@
+from .academia import Academia
 from .aluno import Aluno
 from .checkin import Checkin
 from .plano import Plano
+from .snapshot import EstadoFeaturesAluno, SnapshotFeatures
+from .resumo import ContagemCheckinPendente, ResumoCheckinHora, ResumoCheckinMes, ResumoDashboard
+from .buffer import SegmentoAplicado
+from .outbox import EventoOutbox
+from .pontuacao import PontuacaoPendente, VersaoPontuada, ExecucaoAgendada
+from .versao import AlteracaoRecurso, VersaoRecurso
 
-__all__ = ['Aluno', 'Checkin', 'Plano'] 
\ No newline at end of file
+__all__ = ['Academia', 'Aluno', 'Checkin', 'Plano', 'SnapshotFeatures', 'ResumoCheckinHora', 'ResumoCheckinMes', 'ResumoDashboard', 'SegmentoAplicado', 'EventoOutbox', 'PontuacaoPendente', 'VersaoPontuada', 'ExecucaoAgendada', 'VersaoRecurso', 'AlteracaoRecurso', 'EstadoFeaturesAluno', 'ContagemCheckinPendente'] 
\ No newline at end of file
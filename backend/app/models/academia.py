@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.database import Base
+
+# Academia usada por dados anteriores à rede e por clientes que não informam a academia
+ACADEMIA_PADRAO = 1
+
+class Academia(Base):
+    __tablename__ = "academias"
+    __table_args__ = (
+        Index("ix_academias_chave_api_hash", "chave_api_hash", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    nome = Column(String, unique=True, nullable=False)
+    # Com modelo próprio, o churn da academia é treinado só com os seus alunos;
+    # sem ele, a academia usa o modelo compartilhado pelas demais
+    modelo_proprio = Column(Boolean, nullable=False, default=False, server_default="false")
+    criada_em = Column(DateTime, default=datetime.utcnow)
+    # SHA-256 da chave de API da academia (a chave em si só é mostrada ao ser gerada)
+    chave_api_hash = Column(String, nullable=True)
+
+    # Relacionamentos
+    alunos = relationship("Aluno", back_populates="academia")
+    planos = relationship("Plano", back_populates="academia")
+
+    def __repr__(self):
+        return f"<Academia {self.nome}>"
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Enum, Index, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from enum import Enum as PyEnum
 from app.database import Base
+from app.models.academia import ACADEMIA_PADRAO
 
 class StatusMatricula(PyEnum):
     ATIVA = "ATIVA"
@@ -10,21 +11,40 @@ class StatusMatricula(PyEnum):
 
 class Aluno(Base):
     __tablename__ = "alunos"
+    __table_args__ = (
+        UniqueConstraint("academia_id", "email", name="uq_alunos_academia_email"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    academia_id = Column(Integer, ForeignKey("academias.id"), nullable=False,
+                         server_default=str(ACADEMIA_PADRAO), index=True)
     nome = Column(String, index=True)
-    email = Column(String, unique=True, index=True)
+    email = Column(String, index=True)
     telefone = Column(String)
     plano_id = Column(Integer, ForeignKey("planos.id"))
     data_matricula = Column(DateTime, default=datetime.utcnow)
     nome_plano = Column(String)
-    risco_churn = Column(Float, default=0.0)
+    risco_churn = Column(Float, nullable=False, default=0.0, server_default="0")
     status_matricula = Column(String, default=StatusMatricula.ATIVA.value)
     data_cancelamento = Column(DateTime, nullable=True)
+    fatores_risco = Column(JSON, nullable=True)  # Últimos fatores calculados em risco-churn
+    versao_risco = Column(String, nullable=True)  # Versão do modelo que calculou risco_churn (None = heurística)
 
     # Relacionamentos
+    academia = relationship("Academia", back_populates="alunos")
     plano = relationship("Plano", back_populates="alunos")
     checkins = relationship("Checkin", back_populates="aluno")
+    # Check-ins já arquivados, resumidos por mês
+    resumos_checkins = relationship("ResumoCheckinMes", order_by="ResumoCheckinMes.mes")
 
     def __repr__(self):
-        return f"<Aluno {self.nome}>" 
\ No newline at end of file
+        return f"<Aluno {self.nome}>" 
+
+# Ranking de risco: só alunos ativos de uma academia, na ordem da paginação por (risco_churn, id)
+Index(
+    "ix_alunos_academia_ativos_risco",
+    Aluno.academia_id,
+    Aluno.risco_churn.desc(),
+    Aluno.id.desc(),
+    postgresql_where=(Aluno.status_matricula == StatusMatricula.ATIVA.value)
+)
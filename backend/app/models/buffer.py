@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, Integer, DateTime
+from datetime import datetime
+from app.database import Base
+
+class SegmentoAplicado(Base):
+    """Segmentos do buffer de check-ins já gravados no banco (evita reaplicar após falha)"""
+    __tablename__ = "buffer_segmentos_aplicados"
+
+    nome = Column(String, primary_key=True)
+    checkins = Column(Integer, nullable=False, default=0)
+    aplicado_em = Column(DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<SegmentoAplicado {self.nome}>"
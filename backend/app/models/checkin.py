@@ -1,13 +1,21 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
+from app.models.academia import ACADEMIA_PADRAO
 
 class Checkin(Base):
     __tablename__ = "checkins"
+    __table_args__ = (
+        # Consultas por academia: período (frequência, exportação) e marca d'água do dashboard
+        Index("ix_checkins_academia_data", "academia_id", "data"),
+        Index("ix_checkins_academia_checkin", "academia_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     aluno_id = Column(Integer, ForeignKey("alunos.id"))
+    # Cópia da academia do aluno, para filtrar check-ins sem juntar com alunos
+    academia_id = Column(Integer, ForeignKey("academias.id"), nullable=False, server_default=str(ACADEMIA_PADRAO))
     data = Column(DateTime, default=datetime.utcnow)
 
     # Relacionamentos
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, JSON, Index
+from datetime import datetime
+from app.database import Base
+
+class EventoOutbox(Base):
+    """
+    Evento de domínio gravado na mesma transação da alteração que o gerou.
+    O relay publica os pendentes no RabbitMQ e marca publicado_em.
+    """
+    __tablename__ = "eventos_outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    routing_key = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    criado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+    publicado_em = Column(DateTime, nullable=True)
+    tentativas = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<EventoOutbox {self.id} {self.routing_key}>"
+
+# O relay só percorre os pendentes; o índice parcial fica pequeno mesmo com o histórico
+Index(
+    "ix_eventos_outbox_pendentes",
+    EventoOutbox.id,
+    postgresql_where=EventoOutbox.publicado_em.is_(None)
+)
@@ -1,16 +1,22 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base
+from app.models.academia import ACADEMIA_PADRAO
 
 class Plano(Base):
     __tablename__ = "planos"
+    __table_args__ = (
+        UniqueConstraint("academia_id", "nome", name="uq_planos_academia_nome"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    nome = Column(String, unique=True, index=True)
+    academia_id = Column(Integer, ForeignKey("academias.id"), nullable=False, server_default=str(ACADEMIA_PADRAO))
+    nome = Column(String, index=True)
     preco = Column(Float)
     descricao = Column(String)
 
     # Relacionamentos
+    academia = relationship("Academia", back_populates="planos")
     alunos = relationship("Aluno", back_populates="plano")
 
     def __repr__(self):
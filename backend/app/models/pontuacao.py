@@ -0,0 +1,44 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime
+from app.database import Base
+
+class PontuacaoPendente(Base):
+    """
+    Aluno cujas features mudaram sem que o risco fosse recalculado na hora
+    (mudança de status, por exemplo). A pontuação incremental do worker
+    recalcula e remove a marca.
+    """
+    __tablename__ = "pontuacoes_pendentes"
+
+    aluno_id = Column(Integer, ForeignKey("alunos.id", ondelete="CASCADE"), primary_key=True)
+    motivo = Column(String, nullable=False)
+    marcado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<PontuacaoPendente {self.aluno_id} {self.motivo}>"
+
+class VersaoPontuada(Base):
+    """
+    Versão do modelo da academia na última pontuação incremental concluída.
+    Enquanto não muda, a pontuação não procura alunos de versão antiga nela.
+    """
+    __tablename__ = "versoes_pontuadas"
+
+    academia_id = Column(Integer, ForeignKey("academias.id", ondelete="CASCADE"), primary_key=True)
+    versao = Column(String, nullable=True)  # None = heurística (academia sem modelo)
+
+    def __repr__(self):
+        return f"<VersaoPontuada {self.academia_id} {self.versao}>"
+
+class ExecucaoAgendada(Base):
+    """Última execução de cada tarefa do agendador do worker, compartilhada entre os workers"""
+    __tablename__ = "execucoes_agendadas"
+
+    tarefa = Column(String, primary_key=True)
+    ultima_execucao = Column(DateTime, nullable=False)
+    resultado = Column(String, nullable=True)
+    # Reserva da execução em andamento: até este instante, nenhum outro worker a inicia
+    reservada_ate = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<ExecucaoAgendada {self.tarefa} {self.ultima_execucao}>"
@@ -0,0 +1,82 @@
+from sqlalchemy import BigInteger, Boolean, Column, Integer, Date, DateTime, Index, JSON, ForeignKey, func
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import deferred
+from datetime import datetime
+from app.database import Base
+
+class ResumoCheckinHora(Base):
+    """Total de check-ins por academia, dia e hora, mantido incrementalmente"""
+    __tablename__ = "resumo_checkins_academia_hora"
+
+    academia_id = Column(Integer, ForeignKey("academias.id"), primary_key=True)
+    dia = Column(Date, primary_key=True)
+    hora = Column(Integer, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ResumoCheckinHora {self.academia_id} {self.dia} {self.hora}h: {self.total}>"
+
+class ContagemCheckinPendente(Base):
+    """
+    Check-ins ainda não somados em resumo_checkins_academia_hora, inseridos
+    por um gatilho na transação do próprio check-in (uma linha por comando,
+    dia e hora). A atualização do dashboard os consome com DELETE ... RETURNING:
+    só enxerga os de transações já confirmadas, então cada check-in é somado
+    exatamente uma vez, qualquer que seja a ordem de id, data ou commit.
+    """
+    __tablename__ = "contagens_checkins_pendentes"
+    __table_args__ = (
+        Index("ix_contagens_checkins_pendentes_academia", "academia_id"),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    academia_id = Column(Integer, nullable=False)
+    dia = Column(Date, nullable=False)
+    hora = Column(Integer, nullable=False)
+    total = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<ContagemCheckinPendente {self.academia_id} {self.dia} {self.hora}h: {self.total}>"
+
+class ResumoDashboard(Base):
+    """Estatísticas pré-calculadas para o dashboard (uma linha por academia)"""
+    __tablename__ = "resumo_dashboard_academia"
+
+    academia_id = Column(Integer, ForeignKey("academias.id"), primary_key=True)
+    dados = Column(JSON, nullable=False, default=dict)
+    # Resumo novo (ou de antes das contagens pendentes): os totais por hora são refeitos dos check-ins
+    reconstruir = Column(Boolean, nullable=False, default=True, server_default="true")
+    atualizado_em = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ResumoDashboard {self.academia_id} {self.atualizado_em}>"
+
+class ResumoCheckinMes(Base):
+    """
+    Check-ins arquivados de um aluno em um mês (ver services/retencao.py).
+    Guarda o bastante para as features de histórico continuarem exatas:
+    total, primeira e última data e as somas dos intervalos em dias entre
+    check-ins consecutivos do mês (e dos seus quadrados). As datas em µs
+    ficam em `datas` (não carregadas por padrão) para um check-in atrasado
+    do mesmo mês ser juntado ao resumo sem perder a exatidão.
+    """
+    __tablename__ = "resumo_checkins_aluno_mes"
+    __table_args__ = (
+        # Resumos alterados desde a última reconciliação do índice de check-ins
+        Index("ix_resumo_checkins_aluno_mes_atualizado_em", "atualizado_em"),
+    )
+
+    aluno_id = Column(Integer, ForeignKey("alunos.id"), primary_key=True)
+    mes = Column(Date, primary_key=True)
+    academia_id = Column(Integer, ForeignKey("academias.id"), nullable=False, index=True)
+    total = Column(Integer, nullable=False)
+    primeira = Column(DateTime, nullable=False)
+    ultima = Column(DateTime, nullable=False)
+    soma_intervalos = Column(BigInteger, nullable=False, default=0)
+    soma_quadrados = Column(BigInteger, nullable=False, default=0)
+    datas = deferred(Column(ARRAY(BigInteger), nullable=True))  # None nos resumos anteriores a esta coluna
+    # Hora do banco na transação que arquivou o mês ou juntou check-ins a ele
+    atualizado_em = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ResumoCheckinMes {self.aluno_id} {self.mes}: {self.total}>"
@@ -0,0 +1,63 @@
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, ForeignKey, Float, UniqueConstraint, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from enum import Enum as PyEnum
+from app.database import Base
+
+class TipoSnapshot(PyEnum):
+    DIARIO = "DIARIO"
+    CANCELAMENTO = "CANCELAMENTO"
+
+class SnapshotFeatures(Base):
+    """Vetor de features de um aluno calculado em um instante de referência"""
+    __tablename__ = "snapshots_features"
+    __table_args__ = (
+        UniqueConstraint("aluno_id", "tipo", "data_referencia", name="uq_snapshot_aluno_tipo_data"),
+        Index("ix_snapshots_aluno_data", "aluno_id", "data_referencia"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    aluno_id = Column(Integer, ForeignKey("alunos.id"), nullable=False)
+    data_referencia = Column(DateTime, nullable=False, index=True)
+    tipo = Column(String, nullable=False, default=TipoSnapshot.DIARIO.value)
+    cancelado = Column(Integer, nullable=False, default=0)
+    criado_em = Column(DateTime, default=datetime.utcnow)
+
+    # Features (mesma ordem de ChurnPredictor._extract_features)
+    freq_semanal = Column(Float, nullable=False)
+    freq_mensal = Column(Float, nullable=False)
+    dias_ultimo_checkin = Column(Float, nullable=False)
+    variancia_intervalos = Column(Float, nullable=False)
+    tempo_matricula = Column(Float, nullable=False)
+    media_checkins_vida = Column(Float, nullable=False)
+    preco_plano = Column(Float, nullable=False)
+
+    # Relacionamentos
+    aluno = relationship("Aluno")
+
+    def __repr__(self):
+        return f"<SnapshotFeatures {self.aluno_id} {self.tipo} {self.data_referencia}>"
+
+class EstadoFeaturesAluno(Base):
+    """
+    Resumo incremental dos check-ins de um aluno anteriores a `corte`
+    (arquivados ou não), mantido pelo job diário de snapshots: como as
+    janelas de frequência são de até 30 dias, o snapshot seguinte só lê os
+    check-ins a partir do corte. `marca` é o maior id de check-in existente
+    quando o estado foi gravado; um check-in acima dela com data anterior
+    ao corte (lote reenviado, data retroativa) faz o estado ser recalculado.
+    """
+    __tablename__ = "estado_features_alunos"
+
+    aluno_id = Column(Integer, ForeignKey("alunos.id"), primary_key=True)
+    corte = Column(DateTime, nullable=False)
+    marca = Column(BigInteger, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+    primeira = Column(DateTime, nullable=True)
+    ultima = Column(DateTime, nullable=True)
+    soma_intervalos = Column(BigInteger, nullable=False, default=0)
+    soma_quadrados = Column(BigInteger, nullable=False, default=0)
+    atualizado_em = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<EstadoFeaturesAluno {self.aluno_id} até {self.corte}: {self.total}>"
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, BigInteger, Index, Integer, String
+from app.database import Base
+
+class VersaoRecurso(Base):
+    """
+    Contador de alterações de um recurso (tabela) por academia, já
+    compactado: a versão vigente é este valor mais as linhas de
+    alteracoes_recursos ainda não somadas. Alimenta os ETags das rotas.
+    """
+    __tablename__ = "versoes_recursos"
+
+    recurso = Column(String, primary_key=True)
+    academia_id = Column(Integer, primary_key=True)
+    versao = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<VersaoRecurso {self.recurso}/{self.academia_id}: {self.versao}>"
+
+class AlteracaoRecurso(Base):
+    """
+    Uma linha por comando que alterou o recurso na academia, inserida por
+    gatilhos no banco (venha da API, do worker ou do buffer). Só recebe
+    inserções, então as transações de escrita não disputam nenhuma linha;
+    a compactação periódica soma as linhas em versoes_recursos e as apaga.
+    """
+    __tablename__ = "alteracoes_recursos"
+    __table_args__ = (
+        Index("ix_alteracoes_recursos_academia", "academia_id", "recurso"),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    recurso = Column(String, nullable=False)
+    academia_id = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<AlteracaoRecurso {self.recurso}/{self.academia_id}>"
@@ -1,18 +1,23 @@
 import pika
 import json
 import os
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 from functools import wraps
 from datetime import datetime
 from dotenv import load_dotenv
+from app.mensagens import CONTENT_TYPE_JSON, codificar_lote_checkins, filas_eventos
 
 # Carrega as variáveis de ambiente
 load_dotenv()
 
 class RabbitMQClient:
-    def __init__(self):
+    def __init__(self, transacional: bool = False):
         self.connection = None
         self.channel = None
+        # Canal transacional (relay do outbox): as publicações só valem no
+        # tx_commit, que confirma o lote inteiro em uma ida e volta ao broker
+        self.transacional = transacional
+        self._devolvidas = set()
         self.url = os.getenv('RABBITMQ_URL')
         if not self.url:
             raise ValueError("RABBITMQ_URL não configurada no arquivo .env")
@@ -23,6 +28,9 @@ class RabbitMQClient:
                 pika.URLParameters(self.url)
             )
             self.channel = self.connection.channel()
+            if self.transacional:
+                self.channel.tx_select()
+                self.channel.add_on_return_callback(self._on_devolvida)
             
             # Declarar exchanges
             self.channel.exchange_declare(
@@ -36,7 +44,9 @@ class RabbitMQClient:
                 'checkins': 'gym.checkins.*',
                 'daily_reports': 'gym.reports.daily',
                 'churn_analysis': 'gym.churn.*',
-                'batch_processing': 'gym.batch.*'
+                'batch_processing': 'gym.batch.*',
+                # Eventos de domínio: uma fila por shard de academias
+                **filas_eventos()
             }
             
             for queue, routing_pattern in queues.items():
@@ -48,6 +58,10 @@ class RabbitMQClient:
                 )
 
     def publish_message(self, routing_key: str, message: Dict[str, Any]):
+        self.publish_raw(routing_key, json.dumps(message).encode(), CONTENT_TYPE_JSON)
+
+    def publish_raw(self, routing_key: str, body: bytes, content_type: str):
+        """Publica um corpo já codificado; o content_type diz ao consumidor como lê-lo"""
         try:
             if not self.connection or self.connection.is_closed:
                 self.connect()
@@ -55,35 +69,90 @@ class RabbitMQClient:
             self.channel.basic_publish(
                 exchange='gym_events',
                 routing_key=routing_key,
-                body=json.dumps(message),
+                body=body,
                 properties=pika.BasicProperties(
                     delivery_mode=2,  # Mensagem persistente
-                    content_type='application/json'
+                    content_type=content_type
                 )
             )
         except Exception as e:
             print(f"Erro ao publicar mensagem: {str(e)}")
             raise
 
-    def publish_batch_checkins(self, checkins: List[Dict[str, Any]]):
-        """Publica um lote de checkins para processamento"""
-        self.publish_message(
+    def _on_devolvida(self, channel, method, properties, body):
+        """Mensagem mandatory sem fila de destino (basic.return)"""
+        self._devolvidas.add(properties.message_id)
+
+    def publish_confirmado(self, mensagens: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """
+        Publica (message_id, routing_key, mensagem) em ordem, em uma transação
+        do canal: as mensagens são enviadas sem esperar e o tx_commit confirma
+        o lote todo, já persistido, em uma única ida e volta. Mensagens não
+        roteadas voltam por basic.return antes do commit-ok.
+
+        Returns:
+            int: quantas mensagens, a partir da primeira, foram confirmadas
+                 (até a primeira não roteada; as seguintes são publicadas de novo)
+        """
+        try:
+            if not self.connection or self.connection.is_closed:
+                self.connect()
+
+            self._devolvidas.clear()
+            for message_id, routing_key, message in mensagens:
+                self.channel.basic_publish(
+                    exchange='gym_events',
+                    routing_key=routing_key,
+                    body=json.dumps(message),
+                    properties=pika.BasicProperties(
+                        delivery_mode=2,  # Mensagem persistente
+                        content_type='application/json',
+                        message_id=message_id
+                    ),
+                    mandatory=True
+                )
+            self.channel.tx_commit()
+            # Entrega os basic.return recebidos durante o commit
+            self.connection.process_data_events(time_limit=0)
+        except pika.exceptions.AMQPError as e:
+            # Sem commit-ok, o broker descarta a transação inteira
+            print(f"Erro de conexão ao publicar mensagens: {str(e)}")
+            self.close()
+            return 0
+
+        for posicao, (message_id, _, _) in enumerate(mensagens):
+            if message_id in self._devolvidas:
+                print(f"Mensagem {message_id} não roteada pelo broker")
+                return posicao
+        return len(mensagens)
+
+    def publish_batch_checkins(self, checkins: List[Dict[str, Any]], formato: str = None):
+        """
+        Publica um lote de checkins para processamento. O formato padrão
+        vem de MENSAGENS_FORMATO_CHECKINS ("json" ou "colunar").
+        """
+        body, content_type = codificar_lote_checkins(checkins, formato)
+        self.publish_raw(
             routing_key='gym.checkins.batch',
-            message={'checkins': checkins}
+            body=body,
+            content_type=content_type
         )
 
-    def schedule_daily_report(self, data_referencia: str):
-        """Agenda geração de relatório diário"""
+    def schedule_daily_report(self, data_referencia: str, academia_id: int = None):
+        """Agenda geração de relatório diário, de todas as academias ou de uma só"""
+        mensagem = {'data_referencia': data_referencia}
+        if academia_id is not None:
+            mensagem['academia_id'] = academia_id
         self.publish_message(
             routing_key='gym.reports.daily',
-            message={'data_referencia': data_referencia}
+            message=mensagem
         )
 
-    def trigger_churn_analysis(self):
-        """Dispara análise de churn para todos os alunos"""
+    def trigger_churn_analysis(self, completa: bool = False):
+        """Dispara a análise de churn dos alunos alterados (ou de todos, com completa=True)"""
         self.publish_message(
             routing_key='gym.churn.analyze',
-            message={'tipo': 'analise_completa', 'data': datetime.utcnow().isoformat()}
+            message={'tipo': 'analise_completa' if completa else 'incremental', 'data': datetime.utcnow().isoformat()}
         )
 
     def consume(self, queue: str, callback: callable):
@@ -101,7 +170,10 @@ class RabbitMQClient:
 
     def close(self):
         if self.connection and not self.connection.is_closed:
-            self.connection.close()
+            try:
+                self.connection.close()
+            except pika.exceptions.AMQPError:
+                pass
 
 rabbitmq_client = RabbitMQClient()
 
@@ -0,0 +1,151 @@
+import itertools
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, engine, engines_replica
+from app.metricas import metricas
+
+# Atraso máximo tolerado; acima dele a réplica sai do rodízio até alcançar o primário
+REPLICA_LAG_MAX_S = float(os.getenv("REPLICA_LAG_MAX_S", "5"))
+REPLICA_INTERVALO_MONITOR_S = float(os.getenv("REPLICA_INTERVALO_MONITOR_S", "2"))
+# Posição do WAL do primário depois de uma escrita; o cliente devolve o valor
+# nas requisições seguintes e só lê de réplicas que já aplicaram até ali
+CABECALHO_LSN = "X-Iagym-Lsn"
+
+# Atraso de replicação (zero quando tudo o que foi recebido já foi aplicado) e
+# posição do WAL já aplicada
+CONSULTA_REPLICA = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END,
+    CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END::text
+""")
+
+
+def lsn_para_int(lsn: Optional[str]) -> Optional[int]:
+    """Converte uma posição do WAL ("16/B374D848") em número comparável; None se inválida"""
+    try:
+        alto, baixo = lsn.split("/")
+        return (int(alto, 16) << 32) + int(baixo, 16)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _medir_replica(replica) -> Tuple[float, int]:
+    with replica.connect() as conexao:
+        lag, lsn = conexao.execute(CONSULTA_REPLICA).one()
+    return float(lag), lsn_para_int(lsn) or 0
+
+
+class MonitorReplicas:
+    """
+    Mede periodicamente o atraso e a posição aplicada de cada réplica.
+    Réplicas inacessíveis ou atrasadas mais que REPLICA_LAG_MAX_S ficam
+    fora do rodízio de leitura; sem nenhuma disponível, as leituras vão
+    para o primário.
+    """
+
+    def __init__(self, engines):
+        self.engines = engines
+        # (engine, posição aplicada na última medição)
+        self._disponiveis: List[tuple] = []
+        self._rodizio = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _medir(self):
+        disponiveis = []
+        anteriores = {replica for replica, _ in self._disponiveis}
+        for indice, replica in enumerate(self.engines):
+            try:
+                lag, lsn = _medir_replica(replica)
+                motivo = f"atraso de {lag:.1f}s"
+            except Exception as e:
+                lag, lsn = None, 0
+                motivo = str(e).splitlines()[0]
+
+            disponivel = lag is not None and lag <= REPLICA_LAG_MAX_S
+            if lag is not None:
+                metricas.definir(f"replica_{indice}_lag_s", lag)
+            metricas.definir(f"replica_{indice}_disponivel", int(disponivel))
+            # Só registra as mudanças de estado, não cada medição
+            if disponivel != (replica in anteriores):
+                print(f"Réplica {indice} {'disponível' if disponivel else 'fora do rodízio'} ({motivo})")
+            if disponivel:
+                disponiveis.append((replica, lsn))
+        self._disponiveis = disponiveis
+
+    def _executar(self):
+        while True:
+            time.sleep(REPLICA_INTERVALO_MONITOR_S)
+            self._medir()
+
+    def _iniciar(self):
+        # Iniciado no primeiro uso: processos que nunca leem de réplica não criam a thread
+        with self._lock:
+            if self._thread is None:
+                self._medir()
+                self._thread = threading.Thread(target=self._executar, name="monitor-replicas", daemon=True)
+                self._thread.start()
+
+    def escolher(self, lsn_minimo: Optional[int] = None):
+        """
+        Próxima réplica disponível em rodízio, ou None para usar o primário.
+        Com lsn_minimo, só réplicas que já aplicaram o WAL até essa posição;
+        a posição medida só fica para trás da real, então a escolha é segura.
+        """
+        if not self.engines:
+            return None
+        if self._thread is None:
+            self._iniciar()
+        disponiveis = self._disponiveis
+        if not disponiveis:
+            metricas.incrementar("leituras_primario_sem_replica")
+            return None
+        if lsn_minimo is not None:
+            disponiveis = [(replica, lsn) for replica, lsn in disponiveis if lsn >= lsn_minimo]
+            if not disponiveis:
+                metricas.incrementar("leituras_primario_apos_escrita")
+                return None
+        return disponiveis[next(self._rodizio) % len(disponiveis)][0]
+
+monitor_replicas = MonitorReplicas(engines_replica)
+
+
+def sessao_leitura() -> Session:
+    """Sessão para leituras pesadas (relatórios, treino, exportação) que podem ir para uma réplica"""
+    return SessionLocal(info={"replica": monitor_replicas.escolher()})
+
+
+def get_db(request: Request):
+    # GETs podem ler de réplica; depois de uma escrita, só das que já têm a escrita (ver marcar_escrita)
+    replica = None
+    if request.method in ("GET", "HEAD"):
+        replica = monitor_replicas.escolher(lsn_para_int(request.headers.get(CABECALHO_LSN)))
+    db = SessionLocal(info={"replica": replica})
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def posicao_primario() -> str:
+    with engine.connect() as conexao:
+        return conexao.exec_driver_sql("SELECT pg_current_wal_lsn()::text").scalar()
+
+
+def marcar_escrita(request: Request, response):
+    """
+    Devolve ao cliente que acabou de escrever a posição do WAL do primário,
+    já com a escrita confirmada; o cliente a reenvia em CABECALHO_LSN.
+    Roda numa thread do threadpool (consulta o banco).
+    """
+    if engines_replica and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        response.headers[CABECALHO_LSN] = posicao_primario()
+    return response
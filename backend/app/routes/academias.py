@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+from app import models, schemas
+from app.replicas import get_db
+from app.services.academias import academia_do_caminho, exigir_rede, gerar_chave
+from app.services.treinamento import agendar_treinamento
+
+router = APIRouter()
+
+@router.get("/", response_model=List[schemas.Academia], dependencies=[Depends(exigir_rede)])
+def listar_academias(db: Session = Depends(get_db)):
+    return db.query(models.Academia).order_by(models.Academia.id).all()
+
+@router.post("/", response_model=schemas.AcademiaCriada, dependencies=[Depends(exigir_rede)])
+def criar_academia(academia: schemas.AcademiaCreate, db: Session = Depends(get_db)):
+    if db.query(models.Academia).filter(models.Academia.nome == academia.nome).first():
+        raise HTTPException(status_code=400, detail="Academia já cadastrada")
+    # A chave só é devolvida aqui; o banco guarda o hash
+    chave, hash_chave = gerar_chave()
+    db_academia = models.Academia(**academia.dict(), chave_api_hash=hash_chave)
+    db.add(db_academia)
+    db.commit()
+    db.refresh(db_academia)
+    return schemas.AcademiaCriada(**schemas.Academia.from_orm(db_academia).dict(), chave_api=chave)
+
+@router.get("/{academia_id}", response_model=schemas.Academia)
+def obter_academia(academia: models.Academia = Depends(academia_do_caminho)):
+    return academia
+
+@router.post("/{academia_id}/chave-api", response_model=schemas.ChaveApi)
+def trocar_chave_api(academia: models.Academia = Depends(academia_do_caminho), db: Session = Depends(get_db)):
+    """Gera uma nova chave para a academia; a anterior deixa de valer"""
+    chave, academia.chave_api_hash = gerar_chave()
+    db.commit()
+    return {"academia_id": academia.id, "chave_api": chave}
+
+@router.put("/{academia_id}", response_model=schemas.Academia)
+def atualizar_academia(
+    dados: schemas.AcademiaUpdate,
+    academia: models.Academia = Depends(academia_do_caminho),
+    db: Session = Depends(get_db)
+):
+    mudou_modelo = dados.modelo_proprio is not None and dados.modelo_proprio != academia.modelo_proprio
+    for campo, valor in dados.dict(exclude_unset=True).items():
+        setattr(academia, campo, valor)
+    db.commit()
+    db.refresh(academia)
+
+    if mudou_modelo:
+        # Os alunos da academia entraram ou saíram do modelo compartilhado: retreina os dois
+        agendar_treinamento()
+        if academia.modelo_proprio:
+            agendar_treinamento(academia.id)
+    return academia
@@ -1,167 +1,297 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import List, Optional
 from datetime import datetime, timedelta
 from app import models, schemas
-from app.database import get_db
-from app.services.churn_predictor import ChurnPredictor
+from app.admissao import CHECKIN, ESCRITA, LISTAGEM, RISCO, admitir
+from app.replicas import get_db
+from app.etags import com_etag, corresponde, etag_recursos, nao_modificado, versao_aluno
+from app.serializacao import campos, resposta_lista
+from app.services import checkins
+from app.services.buffer_checkins import buffer_checkins
+from app.services.academias import academia_atual, chave_modelo
+from app.services.churn_predictor import preditores
+from app.services.indice_checkins import carregar_checkins
+from app.services.frequencia import JANELAS_PADRAO, calcular_frequencias, montar_janelas
+from app.services.pontuacao import marcar_pendente, pontuar
+from app.services.retencao import excluir_alunos
+from app.services.outbox import (
+    TIPO_CANCELAMENTO, TIPO_MATRICULA, evento_cancelamento, evento_matricula, registrar_evento
+)
+from app.services.snapshots import registrar_snapshot_cancelamento
+from app.services.treinamento import agendar_treinamento
 from app.models.aluno import StatusMatricula
 
 router = APIRouter()
-churn_predictor = ChurnPredictor()
 
-@router.get("/", response_model=List[schemas.Aluno])
-def listar_alunos(db: Session = Depends(get_db)):
-    alunos = db.query(models.Aluno).all()
-    return alunos
+CAMPOS_ALUNO = campos(schemas.Aluno)
 
-def treinar_modelo(db: Session):
-    """Função auxiliar para treinar o modelo"""
-    try:
-        # Obtém todos os alunos com seus dados
-        alunos = db.query(models.Aluno).options(
-            joinedload(models.Aluno.checkins),
-            joinedload(models.Aluno.plano)
-        ).all()
-        
-        if len(alunos) < 2:
-            print("Dados insuficientes para treinar")
-            return False
-            
-        # Prepara dados para treinamento
-        X = []
-        y = []
-        
-        for aluno in alunos:
-            try:
-                features = churn_predictor._extract_features(aluno)
-                X.append(features[0])
-                y.append(1 if aluno.status_matricula == StatusMatricula.CANCELADA.value else 0)
-            except Exception as e:
-                print(f"Erro ao processar aluno {aluno.id}: {e}")
-                continue
-        
-        if len(X) > 0 and len(set(y)) > 1:
-            print(f"Treinando modelo com {len(X)} amostras ({sum(y)} churns)")
-            if churn_predictor.train(X, y):
-                # Atualiza previsões para alunos ativos
-                alunos_ativos = [a for a in alunos if a.status_matricula == StatusMatricula.ATIVA.value]
-                for aluno_ativo in alunos_ativos:
-                    try:
-                        aluno_ativo.risco_churn = churn_predictor.predict(aluno_ativo)
-                    except Exception as e:
-                        print(f"Erro ao atualizar risco do aluno {aluno_ativo.id}: {e}")
-                db.commit()
-                return True
-        return False
-    except Exception as e:
-        print(f"Erro ao treinar modelo: {e}")
-        return False
-
-@router.post("/", response_model=schemas.Aluno)
-def criar_aluno(aluno: schemas.AlunoCreate, db: Session = Depends(get_db)):
-    # Verifica se o email já existe
-    aluno_existente = db.query(models.Aluno).filter(models.Aluno.email == aluno.email).first()
+@router.get("/", response_model=List[schemas.Aluno], dependencies=[Depends(admitir(LISTAGEM))])
+def listar_alunos(request: Request, db: Session = Depends(get_db), academia: models.Academia = Depends(academia_atual)):
+    # Versão da tabela na academia: sem alterações, responde 304 sem consultar os alunos
+    tag = etag_recursos(db, academia.id, "alunos")
+    if corresponde(request, tag):
+        return nao_modificado(tag)
+
+    # Só as colunas do schema, serializadas direto das tuplas (sem objetos ORM nem Pydantic)
+    linhas = db.query(*[getattr(models.Aluno, campo) for campo in CAMPOS_ALUNO]).filter(
+        models.Aluno.academia_id == academia.id
+    ).order_by(models.Aluno.id).all()
+    return com_etag(resposta_lista(schemas.Aluno, CAMPOS_ALUNO, linhas), tag)
+
+@router.post("/", response_model=schemas.Aluno, dependencies=[Depends(admitir(ESCRITA))])
+def criar_aluno(
+    aluno: schemas.AlunoCreate,
+    db: Session = Depends(get_db),
+    academia: models.Academia = Depends(academia_atual)
+):
+    # Verifica se o email já existe na academia
+    aluno_existente = db.query(models.Aluno).filter(
+        models.Aluno.academia_id == academia.id, models.Aluno.email == aluno.email
+    ).first()
     if aluno_existente:
         raise HTTPException(status_code=400, detail="Email já cadastrado")
 
-    # Verifica se o plano existe
-    plano = db.query(models.Plano).filter(models.Plano.id == aluno.plano_id).first()
+    # Verifica se o plano existe na academia
+    plano = db.query(models.Plano).filter(
+        models.Plano.id == aluno.plano_id, models.Plano.academia_id == academia.id
+    ).first()
     if not plano:
         raise HTTPException(status_code=404, detail="Plano não encontrado")
 
     # Cria o aluno com o nome do plano
     db_aluno = models.Aluno(
         **aluno.dict(),
+        academia_id=academia.id,
         nome_plano=plano.nome
     )
     db.add(db_aluno)
+    db.flush()
+
+    # Calcula o risco inicial com o modelo atual e grava tudo, com o evento, em uma transação
+    pontuar(db_aluno, preditores.para_predicao(chave_modelo(academia)))
+    registrar_evento(db, TIPO_MATRICULA, evento_matricula(db_aluno))
     db.commit()
     db.refresh(db_aluno)
 
-    # Treina o modelo se necessário (isso já atualiza o risco de todos os alunos)
-    treinar_modelo(db)
-    
-    # Recarrega o aluno para pegar o risco atualizado
-    db.refresh(db_aluno)
+    # Retreina o modelo da academia em segundo plano (os riscos são atualizados pela pontuação do worker)
+    agendar_treinamento(chave_modelo(academia))
     return db_aluno
 
-@router.get("/{aluno_id}/frequencia", response_model=schemas.Frequencia)
-def obter_frequencia(aluno_id: int, db: Session = Depends(get_db)):
-    aluno = db.query(models.Aluno).filter(models.Aluno.id == aluno_id).first()
-    if not aluno:
+MAX_ALUNOS_LOTE = 1000
+
+@router.post("/frequencia/lote", response_model=List[schemas.FrequenciaAluno], dependencies=[Depends(admitir(LISTAGEM))])
+def obter_frequencia_lote(
+    consulta: schemas.FrequenciaLote,
+    db: Session = Depends(get_db),
+    academia: models.Academia = Depends(academia_atual)
+):
+    if len(consulta.aluno_ids) > MAX_ALUNOS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_ALUNOS_LOTE} alunos por consulta")
+    try:
+        janelas = montar_janelas(consulta.janelas, consulta.inicio, consulta.fim)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    frequencias = calcular_frequencias(db, consulta.aluno_ids, janelas, academia.id)
+    return [{"aluno_id": aluno_id, **frequencia} for aluno_id, frequencia in frequencias.items()]
+
+@router.get("/{aluno_id}/frequencia", response_model=schemas.Frequencia, dependencies=[Depends(admitir(LISTAGEM))])
+def obter_frequencia(
+    aluno_id: int,
+    janelas: List[int] = Query(JANELAS_PADRAO),
+    inicio: Optional[datetime] = None,
+    fim: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    academia: models.Academia = Depends(academia_atual)
+):
+    try:
+        intervalos = montar_janelas(janelas, inicio, fim)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Contagens de check-ins e dias distintos de todas as janelas em uma única consulta
+    frequencias = calcular_frequencias(db, [aluno_id], intervalos, academia.id)
+    if aluno_id not in frequencias:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
 
-    # Calcula a frequência dos últimos 30 dias
-    data_inicio = datetime.utcnow() - timedelta(days=30)
-    checkins = db.query(models.Checkin).filter(
-        models.Checkin.aluno_id == aluno_id,
-        models.Checkin.data >= data_inicio
-    ).all()
+    return frequencias[aluno_id]
 
-    total_dias = 30
-    dias_presentes = len(checkins)
-    percentual = dias_presentes / total_dias
+@router.get("/ranking-risco", response_model=schemas.RankingRisco, dependencies=[Depends(admitir(LISTAGEM))])
+def ranking_risco(
+    request: Request,
+    response: Response,
+    limite: int = Query(50, ge=1, le=500),
+    plano_id: Optional[int] = None,
+    risco_minimo: Optional[float] = Query(None, ge=0.0, le=1.0),
+    matricula_min_dias: Optional[int] = Query(None, ge=0),
+    apos_risco: Optional[float] = None,
+    apos_id: Optional[int] = None,
+    incluir_fatores: bool = False,
+    db: Session = Depends(get_db),
+    academia: models.Academia = Depends(academia_atual)
+):
+    """
+    Alunos ativos com maior risco de churn, em ordem decrescente.
+    A paginação é por chave (risco_churn, id): passe apos_risco/apos_id
+    do campo `proximo` da página anterior. Usa o índice parcial ix_alunos_academia_ativos_risco.
+    """
+    if (apos_risco is None) != (apos_id is None):
+        raise HTTPException(status_code=400, detail="Informe apos_risco e apos_id juntos")
 
-    return {
-        "total_dias": total_dias,
-        "dias_presentes": dias_presentes,
-        "percentual": percentual
-    }
+    # Os filtros fazem parte do ETag: cada página e combinação tem o seu.
+    # Com matricula_min_dias, o resultado também muda com a data.
+    dia = datetime.utcnow().date() if matricula_min_dias is not None else None
+    tag = etag_recursos(db, academia.id, "alunos", extra=(request.url.query, dia))
+    if corresponde(request, tag):
+        return nao_modificado(tag)
+
+    colunas = [
+        models.Aluno.id, models.Aluno.nome, models.Aluno.email, models.Aluno.telefone,
+        models.Aluno.plano_id, models.Aluno.nome_plano, models.Aluno.data_matricula,
+        models.Aluno.risco_churn
+    ]
+    if incluir_fatores:
+        colunas.append(models.Aluno.fatores_risco)
+
+    consulta = db.query(*colunas).filter(
+        models.Aluno.academia_id == academia.id,
+        models.Aluno.status_matricula == StatusMatricula.ATIVA.value
+    )
+    if plano_id is not None:
+        consulta = consulta.filter(models.Aluno.plano_id == plano_id)
+    if risco_minimo is not None:
+        consulta = consulta.filter(models.Aluno.risco_churn >= risco_minimo)
+    if matricula_min_dias is not None:
+        consulta = consulta.filter(
+            models.Aluno.data_matricula <= datetime.utcnow() - timedelta(days=matricula_min_dias)
+        )
+    if apos_risco is not None:
+        consulta = consulta.filter(
+            tuple_(models.Aluno.risco_churn, models.Aluno.id) < tuple_(apos_risco, apos_id)
+        )
+
+    linhas = consulta.order_by(
+        models.Aluno.risco_churn.desc(), models.Aluno.id.desc()
+    ).limit(limite).all()
+
+    itens = []
+    for linha in linhas:
+        item = dict(linha._mapping)
+        if incluir_fatores:
+            item["fatores"] = item.pop("fatores_risco")
+        itens.append(item)
+
+    proximo = None
+    if len(linhas) == limite:
+        proximo = {"apos_risco": linhas[-1].risco_churn, "apos_id": linhas[-1].id}
+
+    com_etag(response, tag)
+    return {"itens": itens, "proximo": proximo}
+
+def _risco_degradado(db: Session, aluno_id: int, academia: models.Academia, preditor, response: Response) -> dict:
+    """
+    Risco gravado pela última pontuação, lido em uma consulta de colunas.
+    risco_churn tem default 0.0, então "nunca pontuado pelo modelo" é sem
+    versão do modelo e sem fatores: nesse caso usa a heurística, sem o modelo
+    (o mesmo valor que uma pontuação sem modelo gravaria).
+    """
+    linha = db.query(models.Aluno.risco_churn, models.Aluno.versao_risco, models.Aluno.fatores_risco).filter(
+        models.Aluno.id == aluno_id, models.Aluno.academia_id == academia.id
+    ).first()
+    if not linha:
+        raise HTTPException(status_code=404, detail="Aluno não encontrado")
+
+    if linha.versao_risco is not None or linha.fatores_risco is not None:
+        risco, origem = linha.risco_churn, "cache"
+    else:
+        aluno = db.query(models.Aluno).filter(
+            models.Aluno.id == aluno_id, models.Aluno.academia_id == academia.id
+        ).first()
+        risco, origem = preditor.predizer_heuristica(aluno), "heuristica"
+    response.headers["X-Risco-Degradado"] = origem
+    return {"risco": risco, "fatores": linha.fatores_risco or []}
 
 @router.get("/{aluno_id}/risco-churn", response_model=schemas.RiscoChurn)
-def obter_risco_churn(aluno_id: int, db: Session = Depends(get_db)):
-    aluno = db.query(models.Aluno).options(
-        joinedload(models.Aluno.checkins),
-        joinedload(models.Aluno.plano)
-    ).filter(models.Aluno.id == aluno_id).first()
+def obter_risco_churn(
+    aluno_id: int,
+    request: Request,
+    response: Response,
+    degradado: bool = Depends(admitir(RISCO, degradar=True)),
+    db: Session = Depends(get_db),
+    academia: models.Academia = Depends(academia_atual)
+):
+    # O risco depende do aluno e dos seus check-ins (versão própria do aluno, que
+    # não muda com o check-in de outro), do plano, da versão do modelo da academia
+    # e do dia (as features contam dias desde o último check-in).
+    # A mesma versão do modelo entra no ETag da validação e no da resposta
+    preditor = preditores.para_predicao(chave_modelo(academia))
+    versao_modelo = preditor.versao_em_uso()
+    recursos = (versao_aluno(aluno_id), "planos")
+    extra = (aluno_id, versao_modelo, datetime.utcnow().date())
+    tag = etag_recursos(db, academia.id, *recursos, extra=extra)
+    if corresponde(request, tag):
+        return nao_modificado(tag)
+
+    if degradado:
+        # Sob carga: devolve o último risco gravado, sem recalcular nem gravar
+        return _risco_degradado(db, aluno_id, academia, preditor, response)
+
+    opcoes = [joinedload(models.Aluno.plano)]
+    if carregar_checkins():
+        opcoes += [joinedload(models.Aluno.checkins), selectinload(models.Aluno.resumos_checkins)]
+    aluno = db.query(models.Aluno).options(*opcoes).filter(
+        models.Aluno.id == aluno_id, models.Aluno.academia_id == academia.id
+    ).first()
     
     if not aluno:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
 
-    # Calcula e atualiza o risco
-    risco = churn_predictor.predict(aluno)
-    aluno.risco_churn = risco
-    db.commit()
-    
-    # Obtém os fatores de risco
-    fatores = churn_predictor.get_fatores_risco(aluno)
+    # Calcula o risco e os fatores com o modelo usado pela academia. Só grava (em
+    # um commit) se mudaram: cada escrita avança a versão dos alunos da academia
+    # e invalidaria o ETag das listagens
+    gravados = (aluno.risco_churn, aluno.versao_risco, aluno.fatores_risco)
+    risco = pontuar(aluno, preditor)
+    fatores = preditor.get_fatores_risco(aluno)
+    aluno.fatores_risco = fatores
+    if (risco, aluno.versao_risco, fatores) != gravados:
+        db.commit()
+        tag = etag_recursos(db, academia.id, *recursos, extra=extra)
+
+    com_etag(response, tag)
 
     return {
         "risco": risco,
         "fatores": fatores
     }
 
-@router.post("/{aluno_id}/checkin", response_model=schemas.Checkin)
-def registrar_checkin(aluno_id: int, db: Session = Depends(get_db)):
+@router.post(
+    "/{aluno_id}/checkin",
+    response_model=schemas.Checkin,
+    responses={202: {"model": schemas.CheckinEnfileirado}},
+    dependencies=[Depends(admitir(CHECKIN))]
+)
+def registrar_checkin(aluno_id: int, db: Session = Depends(get_db), academia: models.Academia = Depends(academia_atual)):
+    if buffer_checkins is not None:
+        return checkins.enfileirar_checkin(db, buffer_checkins, aluno_id, academia.id)
+
     # Verifica se o aluno existe
-    aluno = db.query(models.Aluno).filter(models.Aluno.id == aluno_id).first()
+    aluno = db.query(models.Aluno).filter(
+        models.Aluno.id == aluno_id, models.Aluno.academia_id == academia.id
+    ).first()
     if not aluno:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
 
-    # Cria o check-in
-    db_checkin = models.Checkin(
-        aluno_id=aluno_id,
-        data=datetime.utcnow()
-    )
-    db.add(db_checkin)
-    db.commit()
-    db.refresh(db_checkin)
+    # Cria o check-in e atualiza o risco deste aluno na mesma transação
+    return checkins.registrar_checkin(db, aluno)
 
-    # Treina o modelo periodicamente (isso já atualiza o risco de todos os alunos)
-    if db_checkin.id % 10 == 0:  # A cada 10 checkins
-        treinar_modelo(db)
-    else:
-        # Se não treinou o modelo, atualiza só o risco deste aluno
-        aluno.risco_churn = churn_predictor.predict(aluno)
-        db.commit()
-    
-    return db_checkin
-
-@router.post("/{aluno_id}/cancelar", response_model=schemas.Aluno)
-def cancelar_matricula(aluno_id: int, db: Session = Depends(get_db)):
+@router.post("/{aluno_id}/cancelar", response_model=schemas.Aluno, dependencies=[Depends(admitir(ESCRITA))])
+def cancelar_matricula(aluno_id: int, db: Session = Depends(get_db), academia: models.Academia = Depends(academia_atual)):
     # Verifica se o aluno existe
-    aluno = db.query(models.Aluno).filter(models.Aluno.id == aluno_id).first()
+    aluno = db.query(models.Aluno).filter(
+        models.Aluno.id == aluno_id, models.Aluno.academia_id == academia.id
+    ).first()
     if not aluno:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
         
@@ -171,26 +301,34 @@ def cancelar_matricula(aluno_id: int, db: Session = Depends(get_db)):
     # Atualiza o status da matrícula
     aluno.status_matricula = StatusMatricula.CANCELADA.value
     aluno.data_cancelamento = datetime.utcnow()
+    registrar_snapshot_cancelamento(db, aluno)
+    registrar_evento(db, TIPO_CANCELAMENTO, evento_cancelamento(aluno))
+    marcar_pendente(db, aluno.id, "cancelamento")
     db.commit()
     db.refresh(aluno)
 
-    # Treina o modelo com os novos dados (isso já atualiza o risco de todos os alunos)
-    treinar_modelo(db)
-    
-    # Recarrega o aluno para pegar o risco atualizado
-    db.refresh(aluno)
+    # Retreina o modelo da academia com os novos dados em segundo plano
+    agendar_treinamento(chave_modelo(academia))
     return aluno
 
-@router.put("/{aluno_id}", response_model=schemas.Aluno)
-def atualizar_aluno(aluno_id: int, aluno: schemas.AlunoUpdate, db: Session = Depends(get_db)):
+@router.put("/{aluno_id}", response_model=schemas.Aluno, dependencies=[Depends(admitir(ESCRITA))])
+def atualizar_aluno(
+    aluno_id: int,
+    aluno: schemas.AlunoUpdate,
+    db: Session = Depends(get_db),
+    academia: models.Academia = Depends(academia_atual)
+):
     # Verifica se o aluno existe
-    db_aluno = db.query(models.Aluno).filter(models.Aluno.id == aluno_id).first()
+    db_aluno = db.query(models.Aluno).filter(
+        models.Aluno.id == aluno_id, models.Aluno.academia_id == academia.id
+    ).first()
     if not db_aluno:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
 
     # Verifica se o email já existe (se estiver sendo alterado)
     if aluno.email and aluno.email != db_aluno.email:
         aluno_existente = db.query(models.Aluno).filter(
+            models.Aluno.academia_id == academia.id,
             models.Aluno.email == aluno.email,
             models.Aluno.id != aluno_id
         ).first()
@@ -199,14 +337,17 @@ def atualizar_aluno(aluno_id: int, aluno: schemas.AlunoUpdate, db: Session = Dep
 
     # Verifica se o plano existe (se estiver sendo alterado)
     if aluno.plano_id:
-        plano = db.query(models.Plano).filter(models.Plano.id == aluno.plano_id).first()
+        plano = db.query(models.Plano).filter(
+            models.Plano.id == aluno.plano_id, models.Plano.academia_id == academia.id
+        ).first()
         if not plano:
             raise HTTPException(status_code=404, detail="Plano não encontrado")
         aluno.nome_plano = plano.nome
 
     # Atualiza a data de cancelamento se o status mudou para CANCELADA
-    if (aluno.status_matricula == StatusMatricula.CANCELADA.value and 
-        db_aluno.status_matricula != StatusMatricula.CANCELADA.value):
+    cancelou = (aluno.status_matricula == StatusMatricula.CANCELADA.value and 
+                db_aluno.status_matricula != StatusMatricula.CANCELADA.value)
+    if cancelou:
         db_aluno.data_cancelamento = datetime.utcnow()
     elif (aluno.status_matricula == StatusMatricula.ATIVA.value and 
           db_aluno.status_matricula != StatusMatricula.ATIVA.value):
@@ -216,25 +357,31 @@ def atualizar_aluno(aluno_id: int, aluno: schemas.AlunoUpdate, db: Session = Dep
     for key, value in aluno.dict(exclude_unset=True).items():
         setattr(db_aluno, key, value)
 
+    if cancelou:
+        registrar_snapshot_cancelamento(db, db_aluno)
+        registrar_evento(db, TIPO_CANCELAMENTO, evento_cancelamento(db_aluno))
+
     db.commit()
     db.refresh(db_aluno)
 
     # Atualiza o risco de churn
-    db_aluno.risco_churn = churn_predictor.predict(db_aluno)
+    pontuar(db_aluno, preditores.para_predicao(chave_modelo(academia)))
     db.commit()
     db.refresh(db_aluno)
 
     return db_aluno
 
 @router.delete("/{aluno_id}")
-def deletar_aluno(aluno_id: int, db: Session = Depends(get_db)):
+def deletar_aluno(aluno_id: int, db: Session = Depends(get_db), academia: models.Academia = Depends(academia_atual)):
     # Verifica se o aluno existe
-    aluno = db.query(models.Aluno).filter(models.Aluno.id == aluno_id).first()
+    aluno = db.query(models.Aluno).filter(
+        models.Aluno.id == aluno_id, models.Aluno.academia_id == academia.id
+    ).first()
     if not aluno:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
 
-    # Remove o aluno
-    db.delete(aluno)
+    # Remove o aluno com o que aponta para ele (check-ins, resumos arquivados e snapshots)
+    excluir_alunos(db, [aluno.id])
     db.commit()
 
     return {"message": "Aluno deletado com sucesso"} 
\ No newline at end of file
@@ -1,30 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from datetime import datetime
 from app import models, schemas
-from app.database import get_db
-from app.services.churn_predictor import ChurnPredictor
+from app.admissao import CHECKIN, admitir
+from app.replicas import get_db
+from app.services import checkins
+from app.services.academias import academia_atual
+from app.services.buffer_checkins import buffer_checkins
 
 router = APIRouter()
-churn_predictor = ChurnPredictor()
 
-@router.post("/", response_model=schemas.Checkin)
-def registrar_checkin(checkin: schemas.CheckinCreate, db: Session = Depends(get_db)):
-    # Verifica se o aluno existe
-    aluno = db.query(models.Aluno).filter(models.Aluno.id == checkin.aluno_id).first()
+@router.post(
+    "/",
+    response_model=schemas.Checkin,
+    responses={202: {"model": schemas.CheckinEnfileirado}},
+    dependencies=[Depends(admitir(CHECKIN))]
+)
+def registrar_checkin(
+    checkin: schemas.CheckinCreate,
+    db: Session = Depends(get_db),
+    academia: models.Academia = Depends(academia_atual)
+):
+    if buffer_checkins is not None:
+        return checkins.enfileirar_checkin(db, buffer_checkins, checkin.aluno_id, academia.id)
+
+    # Verifica se o aluno existe na academia
+    aluno = db.query(models.Aluno).filter(
+        models.Aluno.id == checkin.aluno_id, models.Aluno.academia_id == academia.id
+    ).first()
     if not aluno:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
 
-    # Cria o check-in
-    db_checkin = models.Checkin(**checkin.dict(), data=datetime.utcnow())
-    db.add(db_checkin)
-    db.commit()
-    db.refresh(db_checkin)
-
-    # Atualiza o risco de churn
-    risco_churn = churn_predictor.predict(aluno)
-    aluno.risco_churn = risco_churn
-    db.commit()
-    db.refresh(aluno)
-
-    return db_checkin 
\ No newline at end of file
+    # Cria o check-in e atualiza o risco de churn na mesma transação
+    return checkins.registrar_checkin(db, aluno)
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.orm import Session
+from app import models, schemas
+from app.admissao import LISTAGEM, admitir
+from app.replicas import get_db
+from app.etags import com_etag, corresponde, gerar_etag, nao_modificado
+from app.services.academias import academia_atual
+from app.services.dashboard import obter_dashboard, versao_dashboard
+
+router = APIRouter()
+
+@router.get("/", response_model=schemas.Dashboard, dependencies=[Depends(admitir(LISTAGEM))])
+def obter_estatisticas(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    academia: models.Academia = Depends(academia_atual)
+):
+    """Estatísticas gerais da academia, lidas do resumo pré-calculado"""
+    # O ETag é o instante da atualização do resumo: sem mudança, só essa coluna é lida
+    atualizado_em = versao_dashboard(db, academia.id)
+    if atualizado_em is not None:
+        tag = gerar_etag(academia.id, "dashboard", atualizado_em.isoformat())
+        if corresponde(request, tag):
+            return nao_modificado(tag)
+
+    dados = obter_dashboard(db, academia.id)
+    if dados["atualizado_em"] is not None:
+        com_etag(response, gerar_etag(academia.id, "dashboard", dados["atualizado_em"].isoformat()))
+    return dados
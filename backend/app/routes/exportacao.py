@@ -0,0 +1,47 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app import models
+from app.admissao import EXPORTACAO, admitir
+from app.models.aluno import StatusMatricula
+from app.services.academias import academia_atual
+from app.services.exportacao import FORMATOS, exportar, parquet_disponivel
+
+router = APIRouter()
+
+def _resposta_exportacao(tabela: str, formato: str, inicio: Optional[datetime], fim: Optional[datetime],
+                         status: Optional[StatusMatricula], academia: models.Academia) -> StreamingResponse:
+    if formato == "parquet" and not parquet_disponivel():
+        raise HTTPException(status_code=501, detail="Exportação em Parquet requer o pacote pyarrow")
+    if inicio and fim and inicio > fim:
+        raise HTTPException(status_code=400, detail="Data inicial deve ser anterior à data final")
+
+    nome = f"{tabela}_{academia.id}_{datetime.utcnow():%Y%m%d%H%M%S}.{formato}"
+    return StreamingResponse(
+        exportar(tabela, formato, inicio, fim, status.value if status else None, academia_id=academia.id),
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome}"'}
+    )
+
+@router.get("/alunos", dependencies=[Depends(admitir(EXPORTACAO))])
+def exportar_alunos(
+    formato: str = Query("csv", regex="^(csv|parquet)$"),
+    inicio: Optional[datetime] = Query(None, description="Data de matrícula a partir de"),
+    fim: Optional[datetime] = Query(None, description="Data de matrícula até"),
+    status: Optional[StatusMatricula] = None,
+    academia: models.Academia = Depends(academia_atual)
+):
+    """Extrai os alunos da academia em CSV ou Parquet, lidos e enviados em lotes"""
+    return _resposta_exportacao("alunos", formato, inicio, fim, status, academia)
+
+@router.get("/checkins", dependencies=[Depends(admitir(EXPORTACAO))])
+def exportar_checkins(
+    formato: str = Query("csv", regex="^(csv|parquet)$"),
+    inicio: Optional[datetime] = Query(None, description="Check-ins a partir de"),
+    fim: Optional[datetime] = Query(None, description="Check-ins até"),
+    status: Optional[StatusMatricula] = Query(None, description="Status da matrícula do aluno"),
+    academia: models.Academia = Depends(academia_atual)
+):
+    """Extrai os check-ins da academia em CSV ou Parquet, lidos e enviados em lotes"""
+    return _resposta_exportacao("checkins", formato, inicio, fim, status, academia)
@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from app.metricas import metricas
+
+router = APIRouter()
+
+@router.get("/")
+def obter_metricas():
+    """Métricas deste processo (worker do uvicorn)"""
+    return metricas.resumo()
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Depends
+from app import models
+from app.services.academias import academia_atual, chave_modelo
+from app.services.churn_predictor import preditores
+
+router = APIRouter()
+
+@router.get("/memoria")
+def obter_memoria_modelo(academia: models.Academia = Depends(academia_atual)):
+    """Memória ocupada, neste processo (worker do uvicorn), pelo modelo de churn usado pela academia"""
+    return preditores.para_predicao(chave_modelo(academia)).relatorio_memoria()
@@ -1,15 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List
 from app import models, schemas
-from app.database import get_db
+from app.admissao import LISTAGEM, admitir
+from app.replicas import get_db
+from app.etags import com_etag, corresponde, etag_recursos, nao_modificado
+from app.serializacao import campos, resposta_lista
+from app.services.academias import academia_atual
 
 router = APIRouter()
 
 @router.post("/inicializar")
-def inicializar_planos(db: Session = Depends(get_db)):
-    # Verifica se já existem planos
-    if db.query(models.Plano).count() > 0:
+def inicializar_planos(db: Session = Depends(get_db), academia: models.Academia = Depends(academia_atual)):
+    # Verifica se a academia já tem planos
+    if db.query(models.Plano).filter(models.Plano.academia_id == academia.id).count() > 0:
         return {"message": "Planos já inicializados"}
 
     # Cria planos iniciais
@@ -20,28 +24,54 @@ def inicializar_planos(db: Session = Depends(get_db)):
     ]
 
     for plano in planos_iniciais:
-        db_plano = models.Plano(**plano)
+        db_plano = models.Plano(**plano, academia_id=academia.id)
         db.add(db_plano)
 
     db.commit()
     return {"message": "Planos inicializados com sucesso"}
 
-@router.get("/", response_model=List[schemas.Plano])
-def listar_planos(db: Session = Depends(get_db)):
-    planos = db.query(models.Plano).all()
-    return planos
+CAMPOS_PLANO = campos(schemas.Plano)
+
+@router.get("/", response_model=List[schemas.Plano], dependencies=[Depends(admitir(LISTAGEM))])
+def listar_planos(request: Request, db: Session = Depends(get_db), academia: models.Academia = Depends(academia_atual)):
+    tag = etag_recursos(db, academia.id, "planos")
+    if corresponde(request, tag):
+        return nao_modificado(tag)
+
+    # Só as colunas do schema, serializadas direto das tuplas (sem objetos ORM nem Pydantic)
+    linhas = db.query(*[getattr(models.Plano, campo) for campo in CAMPOS_PLANO]).filter(
+        models.Plano.academia_id == academia.id
+    ).order_by(models.Plano.id).all()
+    return com_etag(resposta_lista(schemas.Plano, CAMPOS_PLANO, linhas), tag)
 
 @router.post("/", response_model=schemas.Plano)
-def criar_plano(plano: schemas.PlanoCreate, db: Session = Depends(get_db)):
-    db_plano = models.Plano(**plano.dict())
+def criar_plano(plano: schemas.PlanoCreate, db: Session = Depends(get_db), academia: models.Academia = Depends(academia_atual)):
+    if db.query(models.Plano.id).filter(
+        models.Plano.academia_id == academia.id, models.Plano.nome == plano.nome
+    ).first():
+        raise HTTPException(status_code=400, detail="Plano já cadastrado")
+    db_plano = models.Plano(**plano.dict(), academia_id=academia.id)
     db.add(db_plano)
     db.commit()
     db.refresh(db_plano)
     return db_plano
 
 @router.get("/{plano_id}", response_model=schemas.Plano)
-def obter_plano(plano_id: int, db: Session = Depends(get_db)):
-    plano = db.query(models.Plano).filter(models.Plano.id == plano_id).first()
+def obter_plano(
+    plano_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    academia: models.Academia = Depends(academia_atual)
+):
+    tag = etag_recursos(db, academia.id, "planos", extra=(plano_id,))
+    if corresponde(request, tag):
+        return nao_modificado(tag)
+
+    plano = db.query(models.Plano).filter(
+        models.Plano.id == plano_id, models.Plano.academia_id == academia.id
+    ).first()
     if not plano:
         raise HTTPException(status_code=404, detail="Plano não encontrado")
+    com_etag(response, tag)
     return plano 
\ No newline at end of file
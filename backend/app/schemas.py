@@ -7,6 +7,31 @@ class StatusMatricula(str, Enum):
     ATIVA = "ATIVA"
     CANCELADA = "CANCELADA"
 
+class AcademiaBase(BaseModel):
+    nome: str
+    modelo_proprio: bool = False
+
+class AcademiaCreate(AcademiaBase):
+    pass
+
+class AcademiaUpdate(BaseModel):
+    nome: Optional[str] = None
+    modelo_proprio: Optional[bool] = None
+
+class Academia(AcademiaBase):
+    id: int
+    criada_em: datetime
+
+    class Config:
+        orm_mode = True
+
+class ChaveApi(BaseModel):
+    academia_id: int
+    chave_api: str
+
+class AcademiaCriada(Academia):
+    chave_api: str
+
 class PlanoBase(BaseModel):
     nome: str
     preco: float
@@ -32,10 +57,15 @@ class AlunoCreate(AlunoBase):
 
 class Aluno(AlunoBase):
     id: int
-    data_matricula: datetime
-    nome_plano: str
+    # Nas respostas, tudo o que é NULL no banco pode vir nulo (cadastros antigos, atualizações com null)
+    nome: Optional[str]
+    email: Optional[str]
+    telefone: Optional[str]
+    plano_id: Optional[int]
+    data_matricula: Optional[datetime]
+    nome_plano: Optional[str]
     risco_churn: float
-    status_matricula: StatusMatricula
+    status_matricula: Optional[StatusMatricula]
     data_cancelamento: Optional[datetime] = None
 
     class Config:
@@ -65,11 +95,81 @@ class Checkin(CheckinBase):
     class Config:
         orm_mode = True
 
+class CheckinEnfileirado(CheckinBase):
+    data: datetime
+    enfileirado: bool = True
+
+class JanelaFrequencia(BaseModel):
+    inicio: datetime
+    fim: datetime
+    total_dias: int
+    total_checkins: int
+    dias_presentes: int
+    percentual: float
+
 class Frequencia(BaseModel):
     total_dias: int
     dias_presentes: int
     percentual: float
+    janelas: List[JanelaFrequencia] = []
+
+class FrequenciaAluno(Frequencia):
+    aluno_id: int
+
+class FrequenciaLote(BaseModel):
+    aluno_ids: List[int]
+    janelas: List[int] = [7, 30, 90]
+    inicio: Optional[datetime] = None
+    fim: Optional[datetime] = None
 
 class RiscoChurn(BaseModel):
     risco: float
-    fatores: List[str] 
\ No newline at end of file
+    fatores: List[str]
+
+class AlunoRisco(BaseModel):
+    id: int
+    nome: Optional[str]
+    email: Optional[str]
+    telefone: Optional[str]
+    plano_id: Optional[int]
+    nome_plano: Optional[str]
+    data_matricula: Optional[datetime]
+    risco_churn: float
+    fatores: Optional[List[str]] = None
+
+class CursorRanking(BaseModel):
+    apos_risco: float
+    apos_id: int
+
+class RankingRisco(BaseModel):
+    itens: List[AlunoRisco]
+    proximo: Optional[CursorRanking] = None
+
+class FaixaRisco(BaseModel):
+    inicio: float
+    fim: float
+    total: int
+
+class RiscoPlano(BaseModel):
+    plano_id: int
+    nome: str
+    risco_medio: float
+    alunos: int
+
+class CheckinsDia(BaseModel):
+    dia: str
+    total: int
+
+class CancelamentosMes(BaseModel):
+    mes: str
+    total: int
+
+class Dashboard(BaseModel):
+    atualizado_em: Optional[datetime] = None
+    alunos_ativos: int
+    alunos_cancelados: int
+    histograma_risco: List[FaixaRisco]
+    risco_medio_por_plano: List[RiscoPlano]
+    checkins_por_dia: List[CheckinsDia]
+    mapa_calor_checkins: List[List[int]]
+    cancelamentos_por_mes: List[CancelamentosMes]
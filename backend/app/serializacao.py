@@ -0,0 +1,54 @@
+import json
+import os
+from datetime import date, datetime
+from typing import Any, List, Sequence, Type
+from fastapi.responses import Response
+from pydantic import BaseModel, parse_obj_as
+
+# orjson é opcional: sem ele, usa o json da biblioteca padrão
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Listas grandes saem direto das tuplas do banco, sem passar pelo modelo de resposta.
+# Com VALIDAR_LISTAS=true, o resultado também é validado pelo schema (útil em desenvolvimento).
+VALIDAR_LISTAS = os.getenv("VALIDAR_LISTAS", "false").lower() in ("1", "true", "sim")
+
+
+def _padrao(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def para_json(dados: Any) -> bytes:
+    """Serializa para bytes JSON; datas saem no mesmo formato do encoder do FastAPI"""
+    if orjson is not None:
+        return orjson.dumps(dados)
+    return json.dumps(dados, default=_padrao, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class RespostaJSONRapida(Response):
+    """Resposta JSON que serializa o conteúdo sem jsonable_encoder"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return para_json(content)
+
+
+def campos(schema: Type[BaseModel]) -> List[str]:
+    """Nomes dos campos do schema, na ordem de declaração"""
+    return list(schema.__fields__)
+
+
+def resposta_lista(schema: Type[BaseModel], chaves: Sequence[str], linhas: Sequence[tuple]) -> RespostaJSONRapida:
+    """
+    Monta a resposta de uma lista a partir de tuplas de colunas, na ordem
+    de `chaves`. Como a rota devolve um Response pronto, o FastAPI não
+    revalida nem recodifica o conteúdo pelo response_model.
+    """
+    dados = [dict(zip(chaves, linha)) for linha in linhas]
+    if VALIDAR_LISTAS:
+        parse_obj_as(List[schema], dados)
+    return RespostaJSONRapida(content=dados)
@@ -0,0 +1,108 @@
+import hashlib
+import hmac
+import os
+import secrets
+from typing import Optional, Tuple
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from app.replicas import get_db
+from app.models import Academia
+from app.models.academia import ACADEMIA_PADRAO
+
+# Chave da rede: administra as academias e age por qualquer uma (com X-Academia-Id)
+CHAVE_API_REDE = os.getenv("CHAVE_API_REDE")
+# Chave da academia principal, definida pelo ambiente (instalações com uma academia só,
+# o painel e as catracas). As demais academias recebem a chave ao serem criadas
+CHAVE_API_ACADEMIA_PADRAO = os.getenv("CHAVE_API_ACADEMIA_PADRAO")
+
+def garantir_academia_padrao(conexao: Connection):
+    """
+    Cria a academia padrão, dona dos dados anteriores à rede. Precisa
+    existir antes das migrações que adicionam academia_id às tabelas.
+    """
+    conexao.execute(insert(Academia).values(
+        id=ACADEMIA_PADRAO, nome="Academia principal", modelo_proprio=False
+    ).on_conflict_do_nothing())
+    # Mantém a sequência à frente do id inserido manualmente
+    conexao.exec_driver_sql(
+        "SELECT setval(pg_get_serial_sequence('academias', 'id'), GREATEST((SELECT MAX(id) FROM academias), 1))"
+    )
+
+def definir_chave_academia_padrao(conexao: Connection):
+    """Grava a chave da academia padrão configurada no ambiente (roda depois das migrações)"""
+    if CHAVE_API_ACADEMIA_PADRAO:
+        conexao.execute(update(Academia).where(Academia.id == ACADEMIA_PADRAO).values(
+            chave_api_hash=hash_chave(CHAVE_API_ACADEMIA_PADRAO)
+        ))
+
+def hash_chave(chave: str) -> str:
+    return hashlib.sha256(chave.encode()).hexdigest()
+
+def gerar_chave() -> Tuple[str, str]:
+    """Nova chave de API e o hash guardado no banco"""
+    chave = secrets.token_urlsafe(32)
+    return chave, hash_chave(chave)
+
+def _chave_da_rede(chave: str) -> bool:
+    return bool(CHAVE_API_REDE) and hmac.compare_digest(chave.encode(), CHAVE_API_REDE.encode())
+
+def _academia_da_chave(db: Session, chave: Optional[str]) -> Optional[Academia]:
+    """Academia dona da chave, ou None para a chave da rede; sem chave válida, 401"""
+    if not chave:
+        raise HTTPException(status_code=401, detail="Informe a chave de API no cabeçalho X-Chave-Api")
+    if _chave_da_rede(chave):
+        return None
+    academia = db.query(Academia).filter(Academia.chave_api_hash == hash_chave(chave)).first()
+    if not academia:
+        raise HTTPException(status_code=401, detail="Chave de API inválida")
+    return academia
+
+def _buscar(db: Session, academia_id: int) -> Academia:
+    academia = db.query(Academia).filter(Academia.id == academia_id).first()
+    if not academia:
+        raise HTTPException(status_code=404, detail="Academia não encontrada")
+    return academia
+
+def academia_atual(
+    x_chave_api: Optional[str] = Header(None, description="Chave de API da academia (ou da rede)"),
+    x_academia_id: Optional[int] = Header(None, description="Academia da requisição, só com a chave da rede (padrão: academia principal)"),
+    db: Session = Depends(get_db)
+) -> Academia:
+    """
+    Academia dona da chave de API; todas as consultas da rota ficam restritas
+    a ela. X-Academia-Id só escolhe a academia com a chave da rede; com a
+    chave de uma academia, precisa ser a dela.
+    """
+    academia = _academia_da_chave(db, x_chave_api)
+    if academia is None:
+        return _buscar(db, x_academia_id or ACADEMIA_PADRAO)
+    if x_academia_id is not None and x_academia_id != academia.id:
+        raise HTTPException(status_code=403, detail="A chave de API não dá acesso a esta academia")
+    return academia
+
+def academia_do_caminho(
+    academia_id: int,
+    x_chave_api: Optional[str] = Header(None, description="Chave de API da academia (ou da rede)"),
+    db: Session = Depends(get_db)
+) -> Academia:
+    """Academia do caminho da rota, acessível com a chave dela ou com a da rede"""
+    academia = _academia_da_chave(db, x_chave_api)
+    if academia is None:
+        return _buscar(db, academia_id)
+    if academia.id != academia_id:
+        raise HTTPException(status_code=403, detail="A chave de API não dá acesso a esta academia")
+    return academia
+
+def exigir_rede(x_chave_api: Optional[str] = Header(None, description="Chave de API da rede")):
+    """Rotas da rede (listar e criar academias): só com a chave da rede"""
+    if not x_chave_api:
+        raise HTTPException(status_code=401, detail="Informe a chave de API no cabeçalho X-Chave-Api")
+    if not _chave_da_rede(x_chave_api):
+        raise HTTPException(status_code=403, detail="Rota restrita à chave de API da rede")
+
+def chave_modelo(academia: Academia) -> Optional[int]:
+    """Academia dona do modelo de churn usado por esta academia (None = modelo compartilhado)"""
+    return academia.id if academia.modelo_proprio else None
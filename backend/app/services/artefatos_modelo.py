@@ -0,0 +1,250 @@
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+import numpy as np
+
+# Arquivos que compõem uma versão do modelo em formato plano
+ARRAYS_FLORESTA = ("raizes", "filho_esquerdo", "filho_direito", "feature", "limiar", "valores")
+ARRAYS_ESCALONADOR = ("media", "escala")
+ARQUIVO_VERSAO_ATUAL = "ATUAL"
+VERSOES_MANTIDAS = 3
+
+
+class FlorestaPlana:
+    """
+    Representação de um RandomForestClassifier em arrays contíguos.
+
+    Todas as árvores são concatenadas em um único conjunto de arrays
+    (filhos, feature, limiar e probabilidades por nó), o que permite
+    carregá-los com memory mapping e compartilhar as páginas entre
+    os processos de um mesmo nó.
+    """
+
+    def __init__(self, raizes, filho_esquerdo, filho_direito, feature, limiar, valores, classes):
+        self.raizes = raizes
+        self.filho_esquerdo = filho_esquerdo
+        self.filho_direito = filho_direito
+        self.feature = feature
+        self.limiar = limiar
+        self.valores = valores
+        self.classes_ = np.asarray(classes)
+
+    @classmethod
+    def de_sklearn(cls, modelo) -> "FlorestaPlana":
+        """Converte um RandomForestClassifier treinado para o formato plano"""
+        raizes, esquerdos, direitos, features, limiares, valores = [], [], [], [], [], []
+        deslocamento = 0
+        for estimador in modelo.estimators_:
+            arvore = estimador.tree_
+            esquerdo = arvore.children_left.astype(np.int64)
+            direito = arvore.children_right.astype(np.int64)
+            # Índices globais: folhas continuam marcadas com -1
+            esquerdos.append(np.where(esquerdo == -1, -1, esquerdo + deslocamento))
+            direitos.append(np.where(direito == -1, -1, direito + deslocamento))
+            features.append(arvore.feature.astype(np.int64))
+            limiares.append(arvore.threshold.astype(np.float64))
+
+            # Normaliza os valores de cada nó em probabilidades por classe
+            valor = arvore.value[:, 0, :].astype(np.float64)
+            normalizador = valor.sum(axis=1, keepdims=True)
+            normalizador[normalizador == 0] = 1.0
+            valores.append(valor / normalizador)
+
+            raizes.append(deslocamento)
+            deslocamento += arvore.node_count
+
+        return cls(
+            raizes=np.array(raizes, dtype=np.int64),
+            filho_esquerdo=np.concatenate(esquerdos),
+            filho_direito=np.concatenate(direitos),
+            feature=np.concatenate(features),
+            limiar=np.concatenate(limiares),
+            valores=np.ascontiguousarray(np.concatenate(valores)),
+            classes=modelo.classes_,
+        )
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Percorre todas as árvores em paralelo e retorna a média das probabilidades"""
+        # O sklearn compara as features em float32 com limiares em float64
+        X = np.asarray(X, dtype=np.float32)
+        linhas = np.arange(X.shape[0])[:, None]
+        nos = np.repeat(np.asarray(self.raizes)[None, :], X.shape[0], axis=0)
+
+        while True:
+            esquerdo = self.filho_esquerdo[nos]
+            internos = esquerdo != -1
+            if not internos.any():
+                break
+            feature = np.where(internos, self.feature[nos], 0)
+            vai_esquerda = X[linhas, feature] <= self.limiar[nos]
+            proximo = np.where(vai_esquerda, esquerdo, self.filho_direito[nos])
+            nos = np.where(internos, proximo, nos)
+
+        return self.valores[nos].mean(axis=1)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {nome: getattr(self, nome) for nome in ARRAYS_FLORESTA}
+
+
+class EscalonadorPlano:
+    """Equivalente ao StandardScaler já ajustado, guardado como dois arrays"""
+
+    def __init__(self, media, escala):
+        self.media = media
+        self.escala = escala
+
+    @classmethod
+    def de_sklearn(cls, scaler) -> "EscalonadorPlano":
+        return cls(
+            media=np.asarray(scaler.mean_, dtype=np.float64),
+            escala=np.asarray(scaler.scale_, dtype=np.float64),
+        )
+
+    def transform(self, X) -> np.ndarray:
+        return (np.asarray(X, dtype=np.float64) - self.media) / self.escala
+
+    def inverse_transform(self, X) -> np.ndarray:
+        return np.asarray(X, dtype=np.float64) * self.escala + self.media
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {nome: getattr(self, nome) for nome in ARRAYS_ESCALONADOR}
+
+
+def _nova_versao() -> str:
+    return datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+
+
+def versao_atual(model_dir: Path) -> Optional[str]:
+    """Lê a versão apontada pelo arquivo ATUAL, se existir"""
+    try:
+        return (model_dir / ARQUIVO_VERSAO_ATUAL).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def salvar_artefatos(model_dir: Path, floresta: FlorestaPlana, escalonador: EscalonadorPlano,
+                     metadados: Optional[dict] = None) -> str:
+    """
+    Grava uma nova versão dos arrays do modelo e troca o ponteiro ATUAL
+    de forma atômica. Processos que ainda mapeiam a versão anterior
+    continuam lendo os arquivos antigos até recarregarem.
+    """
+    versao = _nova_versao()
+    base = model_dir / "artefatos"
+    destino = base / versao
+    temporario = base / f".{versao}.tmp"
+    temporario.mkdir(parents=True, exist_ok=True)
+
+    for nome, array in {**floresta.arrays(), **escalonador.arrays()}.items():
+        np.save(temporario / f"{nome}.npy", np.ascontiguousarray(array))
+
+    meta = {
+        "versao": versao,
+        "classes": [int(c) for c in floresta.classes_],
+        "n_arvores": int(len(floresta.raizes)),
+        "n_nos": int(len(floresta.filho_esquerdo)),
+        "criado_em": datetime.utcnow().isoformat(),
+        **(metadados or {}),
+    }
+    (temporario / "meta.json").write_text(json.dumps(meta))
+    os.replace(temporario, destino)
+
+    ponteiro_tmp = model_dir / f".{ARQUIVO_VERSAO_ATUAL}.tmp"
+    ponteiro_tmp.write_text(versao)
+    os.replace(ponteiro_tmp, model_dir / ARQUIVO_VERSAO_ATUAL)
+
+    _remover_versoes_antigas(base)
+    return versao
+
+
+def carregar_artefatos(model_dir: Path, versao: str, mmap: bool = True):
+    """Carrega floresta, escalonador e metadados de uma versão (mapeados em memória por padrão)"""
+    origem = model_dir / "artefatos" / versao
+    modo = "r" if mmap else None
+    arrays = {
+        nome: np.load(origem / f"{nome}.npy", mmap_mode=modo)
+        for nome in ARRAYS_FLORESTA + ARRAYS_ESCALONADOR
+    }
+    meta = json.loads((origem / "meta.json").read_text())
+    floresta = FlorestaPlana(
+        classes=meta["classes"],
+        **{nome: arrays[nome] for nome in ARRAYS_FLORESTA}
+    )
+    escalonador = EscalonadorPlano(**{nome: arrays[nome] for nome in ARRAYS_ESCALONADOR})
+    return floresta, escalonador, meta
+
+
+def _remover_versoes_antigas(base: Path):
+    versoes = sorted(p for p in base.iterdir() if p.is_dir() and not p.name.startswith("."))
+    # No Linux, remover arquivos ainda mapeados é seguro: as páginas
+    # continuam válidas até o último processo desmapear
+    for antiga in versoes[:-VERSOES_MANTIDAS]:
+        shutil.rmtree(antiga, ignore_errors=True)
+
+
+def _ler_smaps(caminho: str, filtro: Optional[str] = None) -> Dict[str, int]:
+    """Soma os campos de /proc/<pid>/smaps (em kB), opcionalmente só dos mapeamentos cujo caminho contém o filtro"""
+    totais: Dict[str, int] = {}
+    incluir = filtro is None
+    cabecalho = re.compile(r"^[0-9a-f]+-[0-9a-f]+ ")
+    with open(caminho) as arquivo:
+        for linha in arquivo:
+            if cabecalho.match(linha):
+                incluir = filtro is None or filtro in linha
+                continue
+            if not incluir:
+                continue
+            partes = linha.split()
+            if len(partes) == 3 and partes[2] == "kB":
+                campo = partes[0].rstrip(":")
+                totais[campo] = totais.get(campo, 0) + int(partes[1])
+    return totais
+
+
+def relatorio_memoria(floresta: Optional[FlorestaPlana], escalonador: Optional[EscalonadorPlano],
+                      model_dir: Path) -> dict:
+    """
+    Relatório da memória do modelo no processo atual.
+
+    Separa o tamanho lógico dos arrays, quanto deles é mapeado de arquivo
+    (compartilhável via page cache) e, no Linux, o RSS/PSS efetivo das
+    páginas do modelo e do processo inteiro.
+    """
+    arrays = {}
+    if floresta is not None:
+        arrays.update(floresta.arrays())
+    if escalonador is not None:
+        arrays.update(escalonador.arrays())
+
+    total = sum(int(a.nbytes) for a in arrays.values())
+    mapeado = sum(int(a.nbytes) for a in arrays.values() if isinstance(a, np.memmap))
+
+    relatorio = {
+        "pid": os.getpid(),
+        "versao": versao_atual(model_dir),
+        "arrays_bytes": total,
+        "arrays_mapeados_bytes": mapeado,
+        "arrays_privados_bytes": total - mapeado,
+    }
+
+    smaps = f"/proc/{os.getpid()}/smaps"
+    if os.path.exists(smaps):
+        try:
+            modelo = _ler_smaps(smaps, filtro=str((model_dir / "artefatos").resolve()))
+            processo = _ler_smaps(smaps)
+            relatorio["modelo_kb"] = {
+                campo: modelo.get(campo, 0)
+                for campo in ("Rss", "Pss", "Shared_Clean", "Private_Clean", "Private_Dirty")
+            }
+            relatorio["processo_kb"] = {
+                campo: processo.get(campo, 0)
+                for campo in ("Rss", "Pss", "Private_Clean", "Private_Dirty")
+            }
+        except OSError as e:
+            print(f"Erro ao ler smaps: {e}")
+
+    return relatorio
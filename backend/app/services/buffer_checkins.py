@@ -0,0 +1,209 @@
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+from app.database import SessionLocal
+from app.metricas import metricas
+from app.models import SegmentoAplicado
+from app.services.checkins import _agendar_retreino_se_necessario, gravar_lote
+
+# Modo write-behind: o check-in é confirmado assim que chega ao journal local
+# (com fsync agrupado) e é gravado no Postgres em lotes
+ATIVO = os.getenv("CHECKIN_BUFFER_ATIVO", "false").lower() in ("1", "true", "sim")
+INTERVALO_MS = int(os.getenv("CHECKIN_BUFFER_INTERVALO_MS", "200"))
+MAX_LINHAS = int(os.getenv("CHECKIN_BUFFER_MAX_LINHAS", "500"))
+DIRETORIO = Path(os.getenv("CHECKIN_BUFFER_DIR", "app/buffer_checkins"))
+
+
+class _Segmento:
+    """Arquivo do journal; fica travado (flock) enquanto o processo dono o usa"""
+
+    def __init__(self, caminho: Path):
+        self.caminho = caminho
+        self.arquivo = open(caminho, "ab")
+        fcntl.flock(self.arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.entradas: List[Tuple[int, datetime]] = []
+
+    def remover(self):
+        self.caminho.unlink(missing_ok=True)
+        self.arquivo.close()
+
+
+class BufferCheckins:
+    """
+    Journal de check-ins com group commit.
+
+    Cada requisição grava uma linha no segmento ativo e espera o fsync;
+    um único fsync cobre todas as linhas escritas até ele. A cada
+    INTERVALO_MS (ou MAX_LINHAS), o segmento é fechado e gravado no
+    Postgres em uma transação, que também registra o nome do segmento
+    para que uma reaplicação após falha seja ignorada.
+    """
+
+    def __init__(self, diretorio: Path = DIRETORIO, intervalo_ms: int = INTERVALO_MS,
+                 max_linhas: int = MAX_LINHAS):
+        self.diretorio = diretorio
+        self.intervalo = intervalo_ms / 1000.0
+        self.max_linhas = max_linhas
+        self._lock = threading.Lock()        # segmento ativo e contadores de escrita
+        self._lock_fsync = threading.Lock()  # sempre adquirido antes de _lock
+        self._escritos = 0
+        self._sincronizados = 0
+        self._ativo = None
+        self._fechados: List[_Segmento] = []
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _novo_segmento(self) -> _Segmento:
+        nome = f"{os.getpid()}-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.log"
+        return _Segmento(self.diretorio / nome)
+
+    def iniciar(self):
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self._recuperar_orfaos()
+        self._ativo = self._novo_segmento()
+        self._thread = threading.Thread(target=self._executar, name="buffer-checkins", daemon=True)
+        self._thread.start()
+        print(f"Buffer de check-ins ativo (lotes a cada {INTERVALO_MS} ms ou {self.max_linhas} linhas)")
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+        if self._thread:
+            self._thread.join()
+        self._rotacionar()
+        self._descarregar()
+
+    def enfileirar(self, aluno_id: int) -> Optional[datetime]:
+        """
+        Grava o check-in no journal e retorna quando ele está em disco.
+        Retorna None, sem gravar, se o buffer já parou (não há segmento ativo).
+        """
+        inicio = time.perf_counter()
+        data = datetime.utcnow()
+        linha = json.dumps({"aluno_id": aluno_id, "data": data.isoformat()}) + "\n"
+
+        with self._lock:
+            if self._ativo is None:
+                return None
+            self._ativo.arquivo.write(linha.encode())
+            self._ativo.arquivo.flush()
+            self._ativo.entradas.append((aluno_id, data))
+            self._escritos += 1
+            seq = self._escritos
+            cheio = len(self._ativo.entradas) >= self.max_linhas
+            metricas.definir("checkin_buffer_fila", self._pendentes())
+
+        self._sincronizar(seq)
+        if cheio:
+            self._acordar.set()
+
+        metricas.observar("checkin_buffer_enfileirar_ms", (time.perf_counter() - inicio) * 1000)
+        return data
+
+    def _pendentes(self) -> int:
+        return len(self._ativo.entradas) + sum(len(s.entradas) for s in self._fechados)
+
+    def _sincronizar(self, seq: int):
+        """Group commit: quem chega ao fsync sincroniza todas as linhas já escritas"""
+        with self._lock_fsync:
+            if self._sincronizados >= seq:
+                return
+            with self._lock:
+                alvo = self._escritos
+                arquivo = self._ativo.arquivo
+            os.fsync(arquivo.fileno())
+            self._sincronizados = alvo
+            metricas.incrementar("checkin_buffer_fsyncs")
+
+    def _rotacionar(self):
+        """Fecha o segmento ativo (já sincronizado) e abre outro"""
+        with self._lock_fsync:
+            with self._lock:
+                if self._ativo is None:
+                    return
+                if not self._ativo.entradas:
+                    # Ao parar, o segmento vazio é fechado e apagado; senão continua ativo
+                    if self._parar.is_set():
+                        self._ativo.remover()
+                        self._ativo = None
+                    return
+                os.fsync(self._ativo.arquivo.fileno())
+                self._sincronizados = self._escritos
+                self._fechados.append(self._ativo)
+                self._ativo = self._novo_segmento() if not self._parar.is_set() else None
+
+    def _descarregar(self):
+        while self._fechados:
+            segmento = self._fechados[0]
+            if not self._aplicar(segmento.caminho.name, segmento.entradas):
+                return  # Tenta de novo no próximo ciclo; o journal continua em disco
+            with self._lock:
+                self._fechados.pop(0)
+                if self._ativo is not None:
+                    metricas.definir("checkin_buffer_fila", self._pendentes())
+            segmento.remover()
+
+    def _aplicar(self, nome: str, entradas: List[Tuple[int, datetime]]) -> bool:
+        inicio = time.perf_counter()
+        db = SessionLocal()
+        try:
+            if db.query(SegmentoAplicado.nome).filter(SegmentoAplicado.nome == nome).first():
+                return True
+            inseridos = gravar_lote(db, entradas)
+            db.add(SegmentoAplicado(nome=nome, checkins=len(inseridos)))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Erro ao gravar lote de check-ins {nome}: {e}")
+            metricas.incrementar("checkin_buffer_erros")
+            return False
+        finally:
+            db.close()
+
+        metricas.observar("checkin_buffer_lote", len(entradas))
+        metricas.observar("checkin_buffer_flush_ms", (time.perf_counter() - inicio) * 1000)
+        metricas.incrementar("checkin_buffer_gravados", len(inseridos))
+        _agendar_retreino_se_necessario(inseridos)
+        return True
+
+    def _recuperar_orfaos(self):
+        """Aplica segmentos deixados por processos que terminaram sem descarregar"""
+        for caminho in sorted(self.diretorio.glob("*.log")):
+            try:
+                segmento = _Segmento(caminho)
+            except BlockingIOError:
+                continue  # Pertence a outro processo em execução
+            for linha in caminho.read_text().splitlines():
+                try:
+                    registro = json.loads(linha)
+                    segmento.entradas.append(
+                        (int(registro["aluno_id"]), datetime.fromisoformat(registro["data"]))
+                    )
+                except (ValueError, KeyError):
+                    # Linha truncada por uma queda no meio da escrita: nunca foi confirmada
+                    continue
+            if self._aplicar(caminho.name, segmento.entradas):
+                print(f"Recuperados {len(segmento.entradas)} check-ins do segmento {caminho.name}")
+                segmento.remover()
+            else:
+                segmento.arquivo.close()
+
+    def _executar(self):
+        while not self._parar.is_set():
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            try:
+                self._rotacionar()
+                self._descarregar()
+            except Exception as e:
+                print(f"Erro no buffer de check-ins: {e}")
+
+
+buffer_checkins = BufferCheckins() if ATIVO else None
@@ -0,0 +1,104 @@
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app import schemas
+from app.metricas import metricas
+from app.models import Academia, Aluno, Checkin
+from app.services.academias import chave_modelo
+from app.services.indice_checkins import carregar_checkins, indice_checkins
+from app.services.pontuacao import pontuar
+from app.services.outbox import TIPO_CHECKIN, evento_checkin, registrar_evento, registrar_eventos
+from app.services.treinamento import agendar_treinamento
+
+RETREINO_A_CADA = 10  # Retreina o modelo a cada 10 checkins
+
+def _agendar_retreino_se_necessario(inseridos: Iterable[Tuple[int, Optional[int]]]):
+    """Recebe pares (id do check-in, chave do modelo) e agenda o treino de cada modelo atingido"""
+    for chave in {chave for checkin_id, chave in inseridos if checkin_id % RETREINO_A_CADA == 0}:
+        agendar_treinamento(chave)
+
+def registrar_checkin(db: Session, aluno: Aluno) -> Checkin:
+    """Grava o check-in, o risco atualizado do aluno e o evento do outbox em uma única transação"""
+    db_checkin = Checkin(aluno_id=aluno.id, academia_id=aluno.academia_id, data=datetime.utcnow())
+    db.add(db_checkin)
+    db.flush()
+
+    # O flush já torna o novo check-in visível para o cálculo do risco
+    if indice_checkins is not None:
+        indice_checkins.adicionar(aluno.id, db_checkin.id, db_checkin.data)
+    pontuar(aluno)
+    registrar_evento(db, TIPO_CHECKIN, evento_checkin(db_checkin.id, aluno.id, aluno.academia_id, db_checkin.data))
+    db.commit()
+    db.refresh(db_checkin)
+
+    # Retreina periodicamente, em segundo plano, o modelo usado pela academia
+    _agendar_retreino_se_necessario([(db_checkin.id, chave_modelo(aluno.academia))])
+    return db_checkin
+
+def enfileirar_checkin(db: Session, buffer, aluno_id: int, academia_id: int):
+    """
+    Modo write-behind: confirma com 202 assim que o check-in está no journal
+    do `buffer` (BufferCheckins). Se o buffer já parou (desligamento do
+    processo em andamento), grava direto no banco, como sem o buffer.
+    """
+    if not db.query(Aluno.id).filter(Aluno.id == aluno_id, Aluno.academia_id == academia_id).first():
+        raise HTTPException(status_code=404, detail="Aluno não encontrado")
+
+    data = buffer.enfileirar(aluno_id)
+    if data is None:
+        metricas.incrementar("checkin_buffer_parado")
+        return registrar_checkin(db, db.query(Aluno).filter(Aluno.id == aluno_id).one())
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder(schemas.CheckinEnfileirado(aluno_id=aluno_id, data=data))
+    )
+
+def gravar_lote(db: Session, entradas: List[Tuple[int, datetime]]) -> List[Tuple[int, Optional[int]]]:
+    """
+    Insere um lote de check-ins e seus eventos no outbox e recalcula uma
+    única vez o risco de cada aluno afetado. A academia de cada check-in
+    vem do aluno. Não faz commit: quem chama controla a transação.
+
+    Returns:
+        list: pares (id do check-in inserido, chave do modelo da academia)
+    """
+    afetados = {aluno_id for aluno_id, _ in entradas}
+    existentes = {
+        aluno_id: (academia_id, academia_id if modelo_proprio else None)
+        for aluno_id, academia_id, modelo_proprio in db.query(
+            Aluno.id, Aluno.academia_id, Academia.modelo_proprio
+        ).join(Academia, Aluno.academia_id == Academia.id).filter(Aluno.id.in_(afetados))
+    }
+    if len(existentes) < len(afetados):
+        print(f"Ignorando check-ins de alunos inexistentes: {sorted(afetados - existentes.keys())}")
+
+    linhas = [
+        {"aluno_id": aluno_id, "academia_id": existentes[aluno_id][0], "data": data}
+        for aluno_id, data in entradas if aluno_id in existentes
+    ]
+    if not linhas:
+        return []
+
+    inseridos = db.execute(
+        insert(Checkin).values(linhas).returning(Checkin.id, Checkin.aluno_id, Checkin.academia_id, Checkin.data)
+    ).all()
+    registrar_eventos(db, TIPO_CHECKIN, [
+        evento_checkin(checkin_id, aluno_id, academia_id, data)
+        for checkin_id, aluno_id, academia_id, data in inseridos
+    ])
+    if indice_checkins is not None:
+        for checkin_id, aluno_id, _, data in inseridos:
+            indice_checkins.adicionar(aluno_id, checkin_id, data)
+
+    opcoes = [joinedload(Aluno.plano), joinedload(Aluno.academia)]
+    if carregar_checkins():
+        opcoes += [joinedload(Aluno.checkins), selectinload(Aluno.resumos_checkins)]
+    alunos = db.query(Aluno).options(*opcoes).filter(Aluno.id.in_(existentes)).all()
+    for aluno in alunos:
+        pontuar(aluno)
+
+    return [(checkin_id, existentes[aluno_id][1]) for checkin_id, aluno_id, _, _ in inseridos]
@@ -1,20 +1,171 @@
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import time
 import numpy as np
 import joblib
 import os
 from pathlib import Path
+from typing import Optional
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from app.models import Aluno, Checkin
+from app.services.indice_checkins import indice_checkins
+from app.services.features import JANELA_MENSAL_DIAS, JANELA_SEMANAL_DIAS, features_do_historico, inicio_janela
+from app.services.retencao import MICROS_POR_DIA, HistoricoArquivado, resumir_meses, resumo_das_datas
+from app.services.artefatos_modelo import (
+    ARQUIVO_VERSAO_ATUAL, EscalonadorPlano, FlorestaPlana,
+    carregar_artefatos, relatorio_memoria, salvar_artefatos, versao_atual
+)
 from sqlalchemy.orm import Session
 
+# Parâmetros do treinamento incremental (warm_start)
+ARVORES_POR_INCREMENTO = int(os.getenv("TREINO_ARVORES_INCREMENTO", "20"))
+MAX_ARVORES = int(os.getenv("TREINO_MAX_ARVORES", "300"))
+MAX_INCREMENTAIS = int(os.getenv("TREINO_INCREMENTAIS_POR_COMPLETO", "20"))
+HORAS_ENTRE_COMPLETOS = float(os.getenv("TREINO_HORAS_RECONSTRUCAO", "24"))
+JANELA_INCREMENTAL = int(os.getenv("TREINO_JANELA_INCREMENTAL", "2000"))
+
+# Limites da deriva abaixo dos quais um novo treino é ignorado
+DERIVA_PSI_MAX = float(os.getenv("TREINO_DERIVA_PSI", "0.1"))
+DERIVA_NOVOS_CANCELAMENTOS = int(os.getenv("TREINO_DERIVA_NOVOS_CANCELAMENTOS", "5"))
+DERIVA_TAXA_CHURN = float(os.getenv("TREINO_DERIVA_TAXA_CHURN", "0.05"))
+# Mesmo sem deriva, o modelo é refeito depois dessa idade
+DERIVA_IDADE_MAX_H = float(os.getenv("TREINO_DERIVA_IDADE_MAX_HORAS", "168"))
+FAIXAS_PSI = 10
+
+# Ajustes simultâneos (de academias diferentes); cada ajuste já usa todos os núcleos
+PROCESSOS_TREINO = int(os.getenv("TREINO_PROCESSOS", "1"))
+
+_pool_treino = None
+_pool_lock = threading.Lock()
+
+def _obter_pool() -> ProcessPoolExecutor:
+    """Pool de processos dedicado ao ajuste do modelo (criado sob demanda)"""
+    global _pool_treino
+    with _pool_lock:
+        if _pool_treino is None:
+            # spawn evita herdar threads e conexões do processo do uvicorn
+            _pool_treino = ProcessPoolExecutor(
+                max_workers=PROCESSOS_TREINO,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool_treino
+
+def _descartar_pool():
+    """Descarta o pool após a morte de um processo filho; o próximo treino cria outro"""
+    global _pool_treino
+    with _pool_lock:
+        if _pool_treino is not None:
+            _pool_treino.shutdown(wait=False)
+            _pool_treino = None
+
+def _pesos_classes(y: np.ndarray) -> dict:
+    """Dá mais peso à classe minoritária (churn)"""
+    n_samples = len(y)
+    n_churns = int(np.sum(y))
+    return {0: 1.0, 1: (n_samples - n_churns) / n_churns}
+
+def _ajustar_floresta(X, y, params: dict, caminho_anterior: str = None, n_arvores: int = None):
+    """
+    Ajusta a floresta em um processo do pool. Com caminho_anterior,
+    carrega o modelo salvo e adiciona árvores via warm_start.
+
+    Returns:
+        tuple: (modelo ajustado, tempo de ajuste em segundos)
+    """
+    if caminho_anterior:
+        modelo = joblib.load(caminho_anterior)
+        modelo.set_params(warm_start=True, n_estimators=n_arvores, **params)
+    else:
+        modelo = RandomForestClassifier(**params)
+    inicio = time.perf_counter()
+    modelo.fit(X, y)
+    modelo.set_params(warm_start=False)
+    return modelo, time.perf_counter() - inicio
+
+def para_micros(datas) -> np.ndarray:
+    """Converte datetimes (UTC, sem fuso) em microssegundos desde a época"""
+    return np.array(datas, dtype="datetime64[us]").astype(np.int64)
+
+def calcular_features(checkins_us: np.ndarray, data_matricula: datetime,
+                      preco_plano: float, referencia: datetime,
+                      arquivado: Optional[HistoricoArquivado] = None) -> np.ndarray:
+    """
+    Calcula as features de um aluno em um instante de referência.
+
+    Args:
+        checkins_us: Datas dos check-ins em microssegundos desde a época
+        data_matricula: Data de matrícula do aluno
+        preco_plano: Preço do plano do aluno
+        referencia: Instante do cálculo (agora, ou a data de cancelamento)
+        arquivado: Resumo dos check-ins já arquivados, todos anteriores aos de checkins_us
+            e à janela mensal da referência (senão, ArquivoNaJanela)
+
+    Returns:
+        np.ndarray: Vetor com as 7 features não normalizadas
+    """
+    ref = int(para_micros([referencia])[0])
+    # Só check-ins até a referência
+    validos = np.sort(checkins_us[checkins_us <= ref])
+    return features_do_historico(
+        arquivado,
+        resumo_das_datas(validos),
+        int(np.count_nonzero(validos > inicio_janela(ref, JANELA_SEMANAL_DIAS))),
+        int(np.count_nonzero(validos > inicio_janela(ref, JANELA_MENSAL_DIAS))),
+        ref,
+        int(para_micros([data_matricula])[0]),
+        preco_plano
+    )
+
+NOMES_FEATURES = (
+    "freq_semanal",
+    "freq_mensal",
+    "dias_ultimo_checkin",
+    "variancia_intervalos",
+    "tempo_matricula",
+    "media_checkins_vida",
+    "preco_plano",
+)
+
+def _proporcoes(coluna: np.ndarray, cortes: np.ndarray) -> np.ndarray:
+    """Fração dos valores em cada faixa delimitada pelos cortes"""
+    contagens = np.bincount(np.searchsorted(cortes, coluna, side="right"), minlength=len(cortes) + 1)
+    return contagens / max(len(coluna), 1)
+
+def resumir_distribuicao(X, y) -> dict:
+    """
+    Resumo da distribuição de treino guardado nos metadados do modelo:
+    faixas por decis de cada feature (para o PSI), média, desvio e rótulos.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    cortes = [np.unique(np.quantile(coluna, np.linspace(0, 1, FAIXAS_PSI + 1)[1:-1])) for coluna in X.T]
+    return {
+        "amostras": int(len(y)),
+        "cancelamentos": int(np.sum(y)),
+        "media": X.mean(axis=0).tolist(),
+        "desvio": X.std(axis=0).tolist(),
+        "cortes": [c.tolist() for c in cortes],
+        "proporcoes": [_proporcoes(coluna, c).tolist() for coluna, c in zip(X.T, cortes)],
+    }
+
+def calcular_psi(esperado: np.ndarray, observado: np.ndarray) -> float:
+    """Population Stability Index entre duas distribuições por faixa"""
+    esperado = np.clip(np.asarray(esperado, dtype=np.float64), 1e-4, None)
+    observado = np.clip(np.asarray(observado, dtype=np.float64), 1e-4, None)
+    return float(np.sum((observado - esperado) * np.log(observado / esperado)))
+
+MODEL_DIR = Path("app/ml_models")
+
 class ChurnPredictor:
-    def __init__(self):
+    def __init__(self, model_dir: Path = MODEL_DIR):
         """
         Inicializa o preditor de churn com um RandomForestClassifier
         e um StandardScaler para normalização dos dados
         """
-        self.model_dir = Path("app/ml_models")
+        self.model_dir = Path(model_dir)
         self.model_path = self.model_dir / "churn_model.joblib"
         self.scaler_path = self.model_dir / "scaler.joblib"
         
@@ -24,102 +175,133 @@ class ChurnPredictor:
         # Inicializa o modelo
         self._initialize_model()
 
-    def _initialize_model(self):
-        """Inicializa ou carrega o modelo existente"""
-        self.model = RandomForestClassifier(
+    def _novo_modelo(self) -> RandomForestClassifier:
+        return RandomForestClassifier(
             n_estimators=100,
             max_depth=5,
             class_weight='balanced',  # Importante para dados desbalanceados
-            random_state=42
+            random_state=42,
+            n_jobs=-1
         )
+
+    def _initialize_model(self):
+        """Inicializa ou carrega o modelo existente"""
+        self.model = self._novo_modelo()
         self.scaler = StandardScaler()
         self.is_trained = False
+        self.versao = None
+        self.meta = {}
+        self._mtime_versao = None
         
         # Tenta carregar modelo existente
         try:
-            if self.model_path.exists() and self.scaler_path.exists():
-                self.model = joblib.load(self.model_path)
-                self.scaler = joblib.load(self.scaler_path)
-                self.is_trained = True
-                print("Modelo de churn carregado com sucesso")
+            versao = versao_atual(self.model_dir)
+            if versao:
+                self._carregar_versao(versao)
+                print(f"Modelo de churn carregado com sucesso (versão {versao})")
+            elif self.model_path.exists() and self.scaler_path.exists():
+                # Modelo salvo antes do formato plano: converte uma única vez
+                modelo = joblib.load(self.model_path)
+                scaler = joblib.load(self.scaler_path)
+                self._publicar(modelo, EscalonadorPlano.de_sklearn(scaler), {"modo": "completo"})
+                print("Modelo de churn convertido para o formato compartilhado")
         except Exception as e:
             print(f"Erro ao carregar modelo: {e}")
             print("Usando modelo inicial")
 
-    def _extract_features(self, aluno: Aluno) -> np.ndarray:
+    def _carregar_versao(self, versao: str):
+        """Mapeia em memória os arrays de uma versão do modelo"""
+        floresta, escalonador, meta = carregar_artefatos(self.model_dir, versao)
+        self.model = floresta
+        self.scaler = escalonador
+        self.versao = versao
+        self.meta = meta
+        self.is_trained = True
+        self._mtime_versao = self._stat_versao()
+
+    def _stat_versao(self):
+        try:
+            return os.stat(self.model_dir / ARQUIVO_VERSAO_ATUAL).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _recarregar_se_necessario(self):
+        """Recarrega o modelo se outro processo publicou uma nova versão"""
+        mtime = self._stat_versao()
+        if mtime is None or mtime == self._mtime_versao:
+            return
+        versao = versao_atual(self.model_dir)
+        if versao and versao != self.versao:
+            try:
+                self._carregar_versao(versao)
+                print(f"Nova versão do modelo carregada: {versao}")
+            except Exception as e:
+                print(f"Erro ao recarregar modelo: {e}")
+        else:
+            self._mtime_versao = mtime
+
+    def versao_em_uso(self):
+        """Versão que as próximas predições vão usar (recarrega se houver uma nova publicada)"""
+        self._recarregar_se_necessario()
+        return self.versao
+
+    def _publicar(self, modelo: RandomForestClassifier, escalonador: EscalonadorPlano,
+                  metadados: dict = None):
+        """Grava o modelo treinado no formato plano e passa a usá-lo via mmap"""
+        versao = salvar_artefatos(
+            self.model_dir,
+            FlorestaPlana.de_sklearn(modelo),
+            escalonador,
+            metadados
+        )
+        self._carregar_versao(versao)
+
+    def relatorio_memoria(self) -> dict:
+        """Memória ocupada pelo modelo neste processo"""
+        if not self.is_trained:
+            return relatorio_memoria(None, None, self.model_dir)
+        return relatorio_memoria(self.model, self.scaler, self.model_dir)
+
+    def _extract_features(self, aluno: Aluno, normalizar: bool = True,
+                          referencia: datetime = None) -> np.ndarray:
         """
         Extrai as features do aluno para predição
         
         Args:
             aluno: Objeto do aluno com seus dados e checkins
+            normalizar: Aplica o scaler do modelo treinado (False para treinamento)
+            referencia: Instante em que as features são calculadas (padrão: agora)
             
         Returns:
             np.ndarray: Array com as features normalizadas
         """
-        hoje = datetime.utcnow()
-        
         # Validação inicial
         if not aluno:
             raise ValueError("Aluno não pode ser nulo")
-        if not hasattr(aluno, 'checkins'):
-            raise ValueError("Aluno não tem checkins carregados")
         if not hasattr(aluno, 'plano'):
             raise ValueError("Aluno não tem plano carregado")
-            
-        # 1. Features de frequência
-        checkins_validos = [c for c in aluno.checkins if c.data and c.data <= hoje]
-        
-        # Frequência última semana
-        checkins_semana = sum(1 for c in checkins_validos 
-                            if (hoje - c.data).days <= 7)
-        freq_semanal = min(checkins_semana / 7.0, 1.0)  # Limita a 100%
-        
-        # Frequência último mês
-        checkins_mes = sum(1 for c in checkins_validos 
-                          if (hoje - c.data).days <= 30)
-        freq_mensal = min(checkins_mes / 30.0, 1.0)  # Limita a 100%
-        
-        # 2. Features temporais
-        # Dias desde último checkin
-        if checkins_validos:
-            datas_checkin = [c.data for c in checkins_validos]
-            ultimo_checkin = max(datas_checkin)
-            dias_ultimo_checkin = min((hoje - ultimo_checkin).days, 365)  # Limita a 1 ano
-            
-            # Variância entre checkins (regularidade)
-            if len(datas_checkin) > 1:
-                datas_ordenadas = sorted(datas_checkin)
-                intervalos = [(datas_ordenadas[i+1] - datas_ordenadas[i]).days 
-                            for i in range(len(datas_ordenadas)-1)]
-                variancia_intervalos = float(np.clip(np.var(intervalos), 0, 100)) if intervalos else 30
-            else:
-                variancia_intervalos = 30
-        else:
-            dias_ultimo_checkin = 365  # Se nunca fez checkin, assume 1 ano
-            variancia_intervalos = 30
-            
-        # 3. Features de engajamento
         if not aluno.data_matricula:
             raise ValueError("Aluno não tem data de matrícula")
             
-        tempo_matricula = max((hoje - aluno.data_matricula).days, 1)  # Evita divisão por zero
-        total_checkins = len(checkins_validos)
-        media_checkins_vida = min(total_checkins / tempo_matricula, 1.0)  # Limita a 1 por dia
-        
-        # 4. Features do plano
         preco_plano = float(aluno.plano.preco) if aluno.plano and aluno.plano.preco else 0.0
-            
-        features = np.array([[
-            freq_semanal,
-            freq_mensal,
-            dias_ultimo_checkin,
-            variancia_intervalos,
-            tempo_matricula,
-            media_checkins_vida,
-            preco_plano
-        ]])
+        referencia = referencia or datetime.utcnow()
+        # Com o índice em memória, o histórico não é lido de aluno.checkins (nem carregado do banco)
+        features = None
+        if indice_checkins is not None and aluno.id is not None:
+            features = indice_checkins.features(aluno.id, aluno.data_matricula, preco_plano, referencia)
+        if features is None:
+            if not hasattr(aluno, 'checkins'):
+                raise ValueError("Aluno não tem checkins carregados")
+            features = calcular_features(
+                para_micros([c.data for c in aluno.checkins if c.data]),
+                aluno.data_matricula,
+                preco_plano,
+                referencia,
+                resumir_meses(aluno.resumos_checkins)
+            )
+        features = features[None, :]
         
-        if self.is_trained:
+        if normalizar and self.is_trained:
             try:
                 features = self.scaler.transform(features)
             except Exception as e:
@@ -132,6 +314,7 @@ class ChurnPredictor:
     def predict(self, aluno: Aluno) -> float:
         """Prediz a probabilidade de churn do aluno"""
         try:
+            self._recarregar_se_necessario()
             features = self._extract_features(aluno)
             
             if not self.is_trained:
@@ -156,6 +339,10 @@ class ChurnPredictor:
             print(f"Erro ao predizer churn: {e}")
             return 0.5  # Valor neutro em caso de erro
     
+    def predizer_heuristica(self, aluno: Aluno) -> float:
+        """Risco pela heurística, sem o modelo (resposta degradada sob carga)"""
+        return self._heuristic_prediction(self._extract_features(aluno, normalizar=False))
+
     def _heuristic_prediction(self, features) -> float:
         """Calcula predição baseada em heurística quando não há modelo treinado"""
         freq_semanal = features[0][0]  # 0 a 1
@@ -246,18 +433,130 @@ class ChurnPredictor:
             
         return fatores
 
-    def save_model(self):
-        """Salva o modelo e o scaler em disco"""
-        if self.is_trained:
-            try:
-                joblib.dump(self.model, self.model_path)
-                joblib.dump(self.scaler, self.scaler_path)
-                print("Modelo salvo com sucesso")
-            except Exception as e:
-                print(f"Erro ao salvar modelo: {e}")
+    def save_model(self, modelo: RandomForestClassifier, scaler: StandardScaler = None,
+                   metadados: dict = None):
+        """
+        Salva o modelo em disco: o estimador completo (usado apenas para
+        retreinar) e os arrays planos que os processos mapeiam para predizer.
+        Sem scaler, mantém o escalonador atual (treino incremental).
+        """
+        try:
+            joblib.dump(modelo, self.model_path)
+            if scaler is not None:
+                joblib.dump(scaler, self.scaler_path)
+                escalonador = EscalonadorPlano.de_sklearn(scaler)
+            else:
+                escalonador = EscalonadorPlano(
+                    media=np.array(self.scaler.media),
+                    escala=np.array(self.scaler.escala)
+                )
+            self._publicar(modelo, escalonador, metadados)
+            print("Modelo salvo com sucesso")
+        except Exception as e:
+            print(f"Erro ao salvar modelo: {e}")
+
+    def escolher_modo(self, n_recentes: int) -> str:
+        """
+        Decide entre adicionar árvores ao modelo atual ou reconstruí-lo.
+        A reconstrução completa acontece periodicamente, ou quando a
+        floresta já cresceu demais.
+        """
+        if not self.is_trained or not self.model_path.exists() or n_recentes == 0:
+            return "completo"
+        if self.meta.get("n_incrementais", 0) >= MAX_INCREMENTAIS:
+            return "completo"
+        if len(self.model.raizes) + ARVORES_POR_INCREMENTO > MAX_ARVORES:
+            return "completo"
+        ultimo_completo = self.meta.get("ultimo_completo")
+        if not ultimo_completo:
+            return "completo"
+        idade = datetime.utcnow() - datetime.fromisoformat(ultimo_completo)
+        if idade > timedelta(hours=HORAS_ENTRE_COMPLETOS):
+            return "completo"
+        return "incremental"
+
+    def avaliar_deriva(self, X, y, recentes=None) -> dict:
+        """
+        Decide se vale retreinar comparando os dados atuais com o resumo
+        guardado no último treino: PSI de cada feature, cancelamentos novos
+        e mudança na taxa de churn. O custo é uma passada pelos dados.
+
+        Returns:
+            dict: retreinar, motivo e as medidas usadas na decisão
+        """
+        resumo = self.meta.get("estatisticas") if self.is_trained else None
+        if not resumo:
+            return {"retreinar": True, "motivo": "sem estatísticas do treino anterior"}
+
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        psi = {
+            nome: calcular_psi(proporcoes, _proporcoes(X[:, i], np.asarray(cortes)))
+            for i, (nome, cortes, proporcoes) in enumerate(zip(NOMES_FEATURES, resumo["cortes"], resumo["proporcoes"]))
+        }
+        # Deslocamento das médias em desvios do treino (informativo)
+        desvio = np.where(np.asarray(resumo["desvio"]) > 0, resumo["desvio"], 1.0)
+        deslocamento = np.abs(X.mean(axis=0) - np.asarray(resumo["media"])) / desvio
+        if recentes is not None:
+            novos_cancelamentos = int(np.sum(y[np.asarray(recentes, dtype=bool)] == 1))
+        else:
+            novos_cancelamentos = max(int(np.sum(y)) - resumo["cancelamentos"], 0)
+        taxa_anterior = resumo["cancelamentos"] / max(resumo["amostras"], 1)
+        taxa = float(np.mean(y)) if len(y) else 0.0
+        maior_psi = max(psi, key=psi.get)
+
+        motivos = []
+        if psi[maior_psi] >= DERIVA_PSI_MAX:
+            motivos.append(f"PSI {psi[maior_psi]:.3f} em {maior_psi}")
+        if novos_cancelamentos >= DERIVA_NOVOS_CANCELAMENTOS:
+            motivos.append(f"{novos_cancelamentos} cancelamentos novos")
+        if abs(taxa - taxa_anterior) >= DERIVA_TAXA_CHURN:
+            motivos.append(f"taxa de churn {taxa_anterior:.3f} -> {taxa:.3f}")
+        criado_em = self.meta.get("criado_em")
+        if criado_em and datetime.utcnow() - datetime.fromisoformat(criado_em) > timedelta(hours=DERIVA_IDADE_MAX_H):
+            motivos.append(f"modelo com mais de {DERIVA_IDADE_MAX_H:.0f}h")
 
-    def train(self, X, y):
-        """Treina o modelo com os dados fornecidos"""
+        return {
+            "retreinar": bool(motivos),
+            "motivo": "; ".join(motivos) or "deriva abaixo dos limites",
+            "psi_max": round(psi[maior_psi], 4),
+            "feature_psi_max": maior_psi,
+            "deslocamento_media_max": round(float(deslocamento.max()), 4),
+            "novos_cancelamentos": novos_cancelamentos,
+            "taxa_churn": round(taxa, 4),
+            "taxa_churn_anterior": round(taxa_anterior, 4),
+        }
+
+    def _janela_incremental(self, X: np.ndarray, y: np.ndarray, recentes: np.ndarray):
+        """
+        Amostras recentes mais uma amostra do histórico, limitada a
+        JANELA_INCREMENTAL, para as novas árvores não esquecerem o passado
+        """
+        idx_recentes = np.flatnonzero(recentes)[-JANELA_INCREMENTAL:]
+        vagas = JANELA_INCREMENTAL - len(idx_recentes)
+        idx_antigos = np.flatnonzero(~recentes)
+        if vagas > 0 and len(idx_antigos) > 0:
+            rng = np.random.default_rng(42)
+            idx_antigos = rng.choice(idx_antigos, size=min(vagas, len(idx_antigos)), replace=False)
+            idx = np.concatenate([idx_recentes, idx_antigos])
+        else:
+            idx = idx_recentes
+        return X[idx], y[idx]
+
+    def train(self, X, y, recentes=None, modo: str = None):
+        """
+        Treina o modelo com os dados fornecidos.
+
+        O ajuste roda em um processo separado usando todos os núcleos.
+        No modo incremental, novas árvores são ajustadas sobre a janela
+        recente (marcada em `recentes`) e adicionadas à floresta atual.
+
+        Args:
+            X: Features brutas (não normalizadas) de todos os alunos
+            y: Rótulos (1 = cancelado)
+            recentes: Máscara booleana das amostras que mudaram desde o último treino
+            modo: "completo" ou "incremental"; se omitido, é escolhido automaticamente
+        """
         try:
             if len(X) < 2 or len(set(y)) < 2:
                 print("Dados insuficientes para treinar o modelo")
@@ -265,31 +564,123 @@ class ChurnPredictor:
                 
             X = np.array(X)
             y = np.array(y)
+            recentes = np.zeros(len(y), dtype=bool) if recentes is None else np.asarray(recentes, dtype=bool)
+            modo = modo or self.escolher_modo(int(recentes.sum()))
             
-            # Normaliza os dados
-            self.scaler.fit(X)
-            X_scaled = self.scaler.transform(X)
+            if modo == "incremental":
+                X_janela, y_janela = self._janela_incremental(X, y, recentes)
+                if len(set(y_janela)) < 2:
+                    print("Janela recente sem as duas classes, fazendo treino completo")
+                    modo = "completo"
             
-            # Configura o modelo para dar mais peso à classe minoritária
-            n_samples = len(y)
-            n_churns = sum(y)
-            if n_churns > 0:
-                class_weight = {
-                    0: 1.0,
-                    1: (n_samples - n_churns) / n_churns  # Balanceia as classes
+            inicio = time.perf_counter()
+            if modo == "incremental":
+                # Mantém o scaler atual: as árvores existentes dependem dele
+                n_arvores = len(self.model.raizes) + ARVORES_POR_INCREMENTO
+                futuro = _obter_pool().submit(
+                    _ajustar_floresta,
+                    self.scaler.transform(X_janela),
+                    y_janela,
+                    {"class_weight": _pesos_classes(y_janela), "n_jobs": -1},
+                    str(self.model_path),
+                    n_arvores
+                )
+                modelo, tempo_ajuste = futuro.result()
+                scaler = None
+                metadados = {
+                    "modo": "incremental",
+                    "n_incrementais": self.meta.get("n_incrementais", 0) + 1,
+                    "ultimo_completo": self.meta.get("ultimo_completo"),
+                    "amostras": int(len(y_janela)),
+                }
+            else:
+                # Normaliza os dados
+                scaler = StandardScaler()
+                scaler.fit(X)
+                X_scaled = scaler.transform(X)
+                
+                # Configura o modelo para dar mais peso à classe minoritária
+                params = self._novo_modelo().get_params()
+                params["class_weight"] = _pesos_classes(y)
+                futuro = _obter_pool().submit(_ajustar_floresta, X_scaled, y, params)
+                modelo, tempo_ajuste = futuro.result()
+                metadados = {
+                    "modo": "completo",
+                    "n_incrementais": 0,
+                    "ultimo_completo": datetime.utcnow().isoformat(),
+                    "amostras": int(len(y)),
                 }
-                self.model.set_params(class_weight=class_weight)
             
-            # Treina o modelo
-            self.model.fit(X_scaled, y)
-            self.is_trained = True
+            metadados["tempo_ajuste_s"] = round(tempo_ajuste, 4)
+            # Referência para decidir, no próximo treino, se os dados mudaram o bastante
+            metadados["estatisticas"] = resumir_distribuicao(X, y)
             
-            # Salva o modelo
-            self.save_model()
+            # Salva o modelo e passa a usar a versão mapeada em memória
+            self.save_model(modelo, scaler, metadados)
             
-            print(f"Modelo treinado com sucesso: {len(X)} amostras, {sum(y)} churns")
+            print(
+                f"Modelo treinado com sucesso ({modo}): {metadados['amostras']} amostras, "
+                f"{len(modelo.estimators_)} árvores, ajuste {tempo_ajuste:.2f}s, "
+                f"total {time.perf_counter() - inicio:.2f}s"
+            )
             return True
             
+        except BrokenProcessPool as e:
+            print(f"Processo de treinamento encerrado inesperadamente: {e}")
+            _descartar_pool()
+            return False
         except Exception as e:
             print(f"Erro ao treinar modelo: {e}")
-            return False 
\ No newline at end of file
+            return False
+
+
+class PreditoresPorAcademia:
+    """
+    Modelos próprios das academias, carregados sob demanda e mantidos
+    em cache no processo, cada um com seus artefatos em
+    ml_models/academias/<id>. Enquanto o modelo próprio de uma academia
+    não foi treinado, ela usa o modelo compartilhado.
+    """
+
+    def __init__(self, compartilhado: ChurnPredictor):
+        self.compartilhado = compartilhado
+        self._preditores = {}
+        self._lock = threading.Lock()
+
+    def do_modelo(self, chave) -> ChurnPredictor:
+        """Preditor dono do modelo `chave` (None = compartilhado), treinado ou não"""
+        if chave is None:
+            return self.compartilhado
+        with self._lock:
+            preditor = self._preditores.get(chave)
+            if preditor is None:
+                preditor = ChurnPredictor(self.compartilhado.model_dir / "academias" / str(chave))
+                self._preditores[chave] = preditor
+            return preditor
+
+    def para_predicao(self, chave) -> ChurnPredictor:
+        preditor = self.do_modelo(chave)
+        if not preditor.is_trained:
+            # Outro processo pode ter treinado o modelo desde a última consulta
+            preditor._recarregar_se_necessario()
+        return preditor if preditor.is_trained else self.compartilhado
+
+    def do_aluno(self, aluno: Aluno) -> ChurnPredictor:
+        academia = aluno.academia
+        return self.para_predicao(academia.id if academia is not None and academia.modelo_proprio else None)
+
+
+# Instâncias únicas por processo (churn_predictor e preditores), compartilhadas pelas
+# rotas e pelo worker e criadas no primeiro acesso: o processo filho do treino (spawn)
+# importa este módulo só para ajustar a floresta e não carrega o modelo
+_instancias = {}
+_instancias_lock = threading.Lock()
+
+def __getattr__(nome: str):
+    if nome not in ("churn_predictor", "preditores"):
+        raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+    with _instancias_lock:
+        if not _instancias:
+            compartilhado = ChurnPredictor()
+            _instancias.update(churn_predictor=compartilhado, preditores=PreditoresPorAcademia(compartilhado))
+    return _instancias[nome]
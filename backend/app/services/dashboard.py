@@ -0,0 +1,216 @@
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, func, cast, select, Date, Integer
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Aluno, Checkin, ContagemCheckinPendente, Plano, ResumoCheckinHora, ResumoDashboard
+from app.models.aluno import StatusMatricula
+
+# Idade máxima do resumo antes de disparar uma atualização em segundo plano
+TTL_DASHBOARD = int(os.getenv("DASHBOARD_TTL_SEGUNDOS", "60"))
+DIAS_CHECKINS = 30
+DIAS_MAPA_CALOR = 90
+FAIXAS_RISCO = 10
+
+# Academias com atualização do resumo em andamento neste processo
+_atualizando = set()
+_lock_atualizando = threading.Lock()
+
+def _agregar_novos_checkins(db: Session, resumo: ResumoDashboard) -> int:
+    """
+    Soma em resumo_checkins_academia_hora as contagens pendentes da academia
+    (gravadas por gatilho junto com cada check-in) e as apaga. As de
+    transações ainda não confirmadas ficam invisíveis e entram na próxima
+    atualização: nenhum check-in é perdido nem somado duas vezes.
+    """
+    contagens = Counter()
+    for dia, hora, total in db.execute(delete(ContagemCheckinPendente).where(
+        ContagemCheckinPendente.academia_id == resumo.academia_id
+    ).returning(ContagemCheckinPendente.dia, ContagemCheckinPendente.hora, ContagemCheckinPendente.total)):
+        contagens[(dia, hora)] += total
+    if not contagens:
+        return 0
+
+    comando = insert(ResumoCheckinHora).values([
+        {"academia_id": resumo.academia_id, "dia": dia, "hora": hora, "total": total}
+        for (dia, hora), total in contagens.items()
+    ])
+    db.execute(comando.on_conflict_do_update(
+        index_elements=[ResumoCheckinHora.academia_id, ResumoCheckinHora.dia, ResumoCheckinHora.hora],
+        set_={"total": ResumoCheckinHora.total + comando.excluded.total}
+    ))
+    return sum(contagens.values())
+
+def _reconstruir_checkins(db: Session, academia_id: int) -> int:
+    """
+    Refaz os totais por hora da academia a partir de todos os check-ins e
+    descarta as contagens pendentes, em um único comando: os dois lados usam
+    o mesmo snapshot, então os check-ins ainda não confirmados ficam para
+    as contagens pendentes das próximas atualizações.
+    """
+    db.query(ResumoCheckinHora).filter(ResumoCheckinHora.academia_id == academia_id).delete(synchronize_session=False)
+    dia = cast(Checkin.data, Date)
+    hora = cast(func.extract("hour", Checkin.data), Integer)
+    pendentes = delete(ContagemCheckinPendente).where(
+        ContagemCheckinPendente.academia_id == academia_id
+    ).cte("pendentes_descartadas")
+    contagens = select(
+        Checkin.academia_id, dia, hora, func.count(Checkin.id)
+    ).where(
+        Checkin.academia_id == academia_id, Checkin.data.isnot(None)
+    ).group_by(Checkin.academia_id, dia, hora)
+    comando = insert(ResumoCheckinHora).from_select(
+        ["academia_id", "dia", "hora", "total"], contagens
+    ).add_cte(pendentes)
+    return db.execute(comando).rowcount
+
+def _calcular_dados(db: Session, academia_id: int) -> dict:
+    hoje = datetime.utcnow().date()
+    da_academia = Aluno.academia_id == academia_id
+    resumo_da_academia = ResumoCheckinHora.academia_id == academia_id
+
+    status = dict(db.query(Aluno.status_matricula, func.count(Aluno.id)).filter(
+        da_academia
+    ).group_by(Aluno.status_matricula).all())
+
+    ativos = and_(da_academia, Aluno.status_matricula == StatusMatricula.ATIVA.value)
+    faixa = func.least(func.width_bucket(Aluno.risco_churn, 0.0, 1.0, FAIXAS_RISCO), FAIXAS_RISCO)
+    por_faixa = dict(db.query(faixa, func.count(Aluno.id)).filter(ativos).group_by(faixa).all())
+    histograma = [
+        {
+            "inicio": round((i - 1) / FAIXAS_RISCO, 2),
+            "fim": round(i / FAIXAS_RISCO, 2),
+            "total": por_faixa.get(i, 0),
+        }
+        for i in range(1, FAIXAS_RISCO + 1)
+    ]
+
+    por_plano = db.query(
+        Plano.id, Plano.nome, func.avg(Aluno.risco_churn), func.count(Aluno.id)
+    ).join(Aluno, Aluno.plano_id == Plano.id).filter(ativos).group_by(Plano.id, Plano.nome).all()
+
+    mes = func.date_trunc("month", Aluno.data_cancelamento)
+    cancelamentos = db.query(mes, func.count(Aluno.id)).filter(
+        da_academia,
+        Aluno.status_matricula == StatusMatricula.CANCELADA.value,
+        Aluno.data_cancelamento.isnot(None)
+    ).group_by(mes).order_by(mes).all()
+
+    por_dia = dict(db.query(ResumoCheckinHora.dia, func.sum(ResumoCheckinHora.total)).filter(
+        resumo_da_academia,
+        ResumoCheckinHora.dia > hoje - timedelta(days=DIAS_CHECKINS)
+    ).group_by(ResumoCheckinHora.dia).all())
+
+    # Mapa de calor: dia da semana (0 = segunda) x hora
+    dia_semana = cast(func.extract("isodow", ResumoCheckinHora.dia), Integer) - 1
+    mapa_calor = [[0] * 24 for _ in range(7)]
+    for dia, hora, total in db.query(
+        dia_semana, ResumoCheckinHora.hora, func.sum(ResumoCheckinHora.total)
+    ).filter(
+        resumo_da_academia,
+        ResumoCheckinHora.dia > hoje - timedelta(days=DIAS_MAPA_CALOR)
+    ).group_by(dia_semana, ResumoCheckinHora.hora).all():
+        mapa_calor[dia][hora] = int(total)
+
+    return {
+        "alunos_ativos": status.get(StatusMatricula.ATIVA.value, 0),
+        "alunos_cancelados": status.get(StatusMatricula.CANCELADA.value, 0),
+        "histograma_risco": histograma,
+        "risco_medio_por_plano": [
+            {"plano_id": plano_id, "nome": nome, "risco_medio": float(media or 0.0), "alunos": total}
+            for plano_id, nome, media, total in por_plano
+        ],
+        "checkins_por_dia": [
+            {"dia": (hoje - timedelta(days=i)).isoformat(), "total": int(por_dia.get(hoje - timedelta(days=i), 0))}
+            for i in range(DIAS_CHECKINS - 1, -1, -1)
+        ],
+        "mapa_calor_checkins": mapa_calor,
+        "cancelamentos_por_mes": [
+            {"mes": data.strftime("%Y-%m"), "total": total} for data, total in cancelamentos
+        ],
+    }
+
+def atualizar_resumo(db: Session, academia_id: int) -> bool:
+    """
+    Atualiza o resumo do dashboard da academia. A linha do resumo é travada
+    com SKIP LOCKED: se outro processo já está atualizando, não faz nada.
+    """
+    db.execute(insert(ResumoDashboard).values(
+        academia_id=academia_id, dados={}
+    ).on_conflict_do_nothing())
+    db.commit()
+
+    resumo = db.query(ResumoDashboard).filter(
+        ResumoDashboard.academia_id == academia_id
+    ).with_for_update(skip_locked=True).first()
+    if resumo is None:
+        return False  # Travada por outra atualização
+
+    if resumo.reconstruir:
+        _reconstruir_checkins(db, academia_id)
+        resumo.reconstruir = False
+        novos = 0
+    else:
+        novos = _agregar_novos_checkins(db, resumo)
+    resumo.dados = _calcular_dados(db, academia_id)
+    resumo.atualizado_em = datetime.utcnow()
+    db.commit()
+    print(f"Resumo do dashboard da academia {academia_id} atualizado ({novos} novos check-ins agregados)")
+    return True
+
+def _atualizar_em_segundo_plano(academia_id: int):
+    try:
+        db = SessionLocal()
+        try:
+            atualizar_resumo(db, academia_id)
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"Erro ao atualizar resumo do dashboard da academia {academia_id}: {e}")
+    finally:
+        with _lock_atualizando:
+            _atualizando.discard(academia_id)
+
+def agendar_atualizacao(academia_id: int):
+    """Atualiza o resumo da academia em uma thread, no máximo uma por academia e por processo"""
+    with _lock_atualizando:
+        if academia_id in _atualizando:
+            return
+        _atualizando.add(academia_id)
+    threading.Thread(
+        target=_atualizar_em_segundo_plano, args=(academia_id,), name=f"resumo-dashboard-{academia_id}", daemon=True
+    ).start()
+
+def versao_dashboard(db: Session, academia_id: int):
+    """
+    Instante da última atualização do resumo da academia (base do ETag do
+    dashboard), sem ler os dados. Se estiver vencido, agenda a atualização.
+    """
+    atualizado_em = db.query(ResumoDashboard.atualizado_em).filter(
+        ResumoDashboard.academia_id == academia_id
+    ).scalar()
+    if atualizado_em is not None and datetime.utcnow() - atualizado_em > timedelta(seconds=TTL_DASHBOARD):
+        agendar_atualizacao(academia_id)
+    return atualizado_em
+
+def obter_dashboard(db: Session, academia_id: int) -> dict:
+    """
+    Lê o resumo pré-calculado da academia. Se estiver vencido, devolve a versão
+    atual e agenda a atualização; só calcula na requisição se nunca foi gerado.
+    """
+    consulta = db.query(ResumoDashboard.dados, ResumoDashboard.atualizado_em).filter(
+        ResumoDashboard.academia_id == academia_id
+    )
+    resumo = consulta.first()
+    if resumo is None or not resumo.dados:
+        atualizar_resumo(db, academia_id)
+        resumo = consulta.first()
+        if resumo is None or not resumo.dados:
+            return {"atualizado_em": None, **_calcular_dados(db, academia_id)}
+    elif datetime.utcnow() - resumo.atualizado_em > timedelta(seconds=TTL_DASHBOARD):
+        agendar_atualizacao(academia_id)
+
+    return {"atualizado_em": resumo.atualizado_em, **resumo.dados}
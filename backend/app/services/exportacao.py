@@ -0,0 +1,199 @@
+import csv
+import io
+from datetime import datetime
+from typing import Iterator, List, Optional
+from sqlalchemy import DateTime, Float, Integer, select
+from app.replicas import sessao_leitura
+from app.models import Aluno, Checkin
+from app.models.aluno import StatusMatricula
+
+# Parquet é opcional: só fica disponível com o pyarrow instalado
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+LINHAS_POR_LOTE = 10000
+
+# Colunas exportadas de cada tabela, na ordem do arquivo
+COLUNAS = {
+    "alunos": [
+        Aluno.id, Aluno.nome, Aluno.email, Aluno.telefone, Aluno.plano_id, Aluno.nome_plano,
+        Aluno.status_matricula, Aluno.data_matricula, Aluno.data_cancelamento, Aluno.risco_churn,
+    ],
+    "checkins": [Checkin.id, Checkin.aluno_id, Checkin.data],
+}
+
+FORMATOS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parquet_disponivel() -> bool:
+    return pq is not None
+
+
+def montar_consulta(tabela: str, inicio: Optional[datetime] = None, fim: Optional[datetime] = None,
+                    status: Optional[str] = None, academia_id: Optional[int] = None):
+    """
+    Consulta de colunas da exportação. O período filtra a data de matrícula
+    (alunos) ou a data do check-in; o status é o da matrícula do aluno.
+    Com `academia_id`, só exporta os dados daquela academia.
+    """
+    if tabela == "alunos":
+        data = Aluno.data_matricula
+        academia = Aluno.academia_id
+        consulta = select(*COLUNAS["alunos"]).order_by(Aluno.id)
+    elif tabela == "checkins":
+        data = Checkin.data
+        academia = Checkin.academia_id
+        consulta = select(*COLUNAS["checkins"]).order_by(Checkin.id)
+        if status:
+            consulta = consulta.join(Aluno, Aluno.id == Checkin.aluno_id)
+    else:
+        raise ValueError(f"Tabela de exportação desconhecida: {tabela}")
+
+    if inicio:
+        consulta = consulta.where(data >= inicio)
+    if fim:
+        consulta = consulta.where(data <= fim)
+    if status:
+        consulta = consulta.where(Aluno.status_matricula == status)
+    if academia_id is not None:
+        consulta = consulta.where(academia == academia_id)
+    return consulta
+
+
+def _lotes(consulta, linhas_por_lote: int) -> Iterator[List[tuple]]:
+    """
+    Lê a consulta com cursor no servidor (stream_results), um lote por vez,
+    de uma réplica quando houver. Abre a própria sessão porque o gerador
+    continua rodando depois que a rota retorna, enquanto a resposta é enviada.
+    """
+    db = sessao_leitura()
+    try:
+        resultado = db.execute(consulta.execution_options(stream_results=True, max_row_buffer=linhas_por_lote))
+        for lote in resultado.partitions(linhas_por_lote):
+            yield lote
+    finally:
+        db.close()
+
+
+def _formatar_csv(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+
+def gerar_csv(tabela: str, lotes: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """Cabeçalho e um bloco de bytes por lote de linhas"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow([coluna.key for coluna in COLUNAS[tabela]])
+    for lote in lotes:
+        escritor.writerows([_formatar_csv(valor) for valor in linha] for linha in lote)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _SaidaIncremental(io.RawIOBase):
+    """Arquivo somente de escrita que acumula os bytes até serem retirados"""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def retirar(self) -> bytes:
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
+
+
+def _schema_parquet(tabela: str):
+    tipos = []
+    for coluna in COLUNAS[tabela]:
+        if isinstance(coluna.type, Integer):
+            tipo = pa.int64()
+        elif isinstance(coluna.type, Float):
+            tipo = pa.float64()
+        elif isinstance(coluna.type, DateTime):
+            tipo = pa.timestamp("us")
+        else:
+            tipo = pa.string()
+        tipos.append(pa.field(coluna.key, tipo))
+    return pa.schema(tipos)
+
+
+def gerar_parquet(tabela: str, lotes: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """Um row group por lote; os bytes são liberados assim que cada row group é escrito"""
+    if not parquet_disponivel():
+        raise RuntimeError("Exportação em Parquet requer o pacote pyarrow")
+
+    schema = _schema_parquet(tabela)
+    saida = _SaidaIncremental()
+    escritor = pq.ParquetWriter(saida, schema)
+    try:
+        for lote in lotes:
+            colunas = list(zip(*lote)) if lote else [[] for _ in schema]
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, schema)],
+                schema=schema
+            ))
+            yield saida.retirar()
+    finally:
+        escritor.close()
+    yield saida.retirar()
+
+
+def exportar(tabela: str, formato: str, inicio: Optional[datetime] = None, fim: Optional[datetime] = None,
+             status: Optional[str] = None, linhas_por_lote: int = LINHAS_POR_LOTE,
+             academia_id: Optional[int] = None) -> Iterator[bytes]:
+    """Gera o arquivo de exportação em blocos, com memória proporcional a um lote"""
+    lotes = _lotes(montar_consulta(tabela, inicio, fim, status, academia_id), linhas_por_lote)
+    if formato == "csv":
+        return gerar_csv(tabela, lotes)
+    if formato == "parquet":
+        return gerar_parquet(tabela, lotes)
+    raise ValueError(f"Formato de exportação desconhecido: {formato}")
+
+
+if __name__ == "__main__":
+    # Exportação pela linha de comando, por exemplo:
+    #   python -m app.services.exportacao checkins --formato parquet --inicio 2024-01-01 --saida checkins.parquet
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Exporta alunos ou check-ins em CSV ou Parquet")
+    parser.add_argument("tabela", choices=sorted(COLUNAS))
+    parser.add_argument("--formato", choices=sorted(FORMATOS), default="csv")
+    parser.add_argument("--inicio", type=datetime.fromisoformat)
+    parser.add_argument("--fim", type=datetime.fromisoformat)
+    parser.add_argument("--status", choices=[s.value for s in StatusMatricula])
+    parser.add_argument("--lote", type=int, default=LINHAS_POR_LOTE)
+    parser.add_argument("--academia", type=int, help="Exporta só os dados desta academia")
+    # Arquivo obrigatório: a saída padrão recebe as mensagens de carregamento do modelo
+    parser.add_argument("--saida", required=True, help="Arquivo de destino")
+    args = parser.parse_args()
+
+    with open(args.saida, "wb") as destino:
+        for bloco in exportar(args.tabela, args.formato, args.inicio, args.fim, args.status, args.lote, args.academia):
+            destino.write(bloco)
+    print(f"Exportação de {args.tabela} gravada em {args.saida}")
@@ -0,0 +1,70 @@
+from typing import Optional
+import numpy as np
+from app.services.retencao import MICROS_POR_DIA, HistoricoArquivado, juntar_historicos
+
+# Janelas das frequências: check-ins até 7 e até 30 dias (inteiros) antes da referência
+JANELA_SEMANAL_DIAS = 7
+JANELA_MENSAL_DIAS = 30
+
+
+class ArquivoNaJanela(ValueError):
+    """
+    Check-ins resumidos (arquivados ou no estado dos snapshots) dentro da janela
+    mensal da referência: o resumo não diz quantos caem na janela, e as
+    frequências sairiam menores que as calculadas com todos os check-ins
+    """
+
+
+def inicio_janela(referencia_us: int, dias: int) -> int:
+    """Check-ins depois deste instante contam na janela (até `dias` dias inteiros antes da referência)"""
+    return referencia_us - (dias + 1) * MICROS_POR_DIA
+
+
+def conferir_arquivo(arquivado: Optional[HistoricoArquivado], referencia_us: int):
+    """
+    As frequências contam só os check-ins datados (tabela quente); o resumo
+    entra nas outras features. Só dá o mesmo resultado que o histórico
+    inteiro se todo o resumo estiver antes da janela mensal.
+    """
+    if arquivado is not None and arquivado.ultima_us > inicio_janela(referencia_us, JANELA_MENSAL_DIAS):
+        raise ArquivoNaJanela(
+            f"check-ins resumidos até {arquivado.ultima_us} dentro da janela mensal da referência {referencia_us}"
+        )
+
+
+def features_do_historico(arquivado: Optional[HistoricoArquivado], recentes: Optional[HistoricoArquivado],
+                          na_semana: int, no_mes: int, referencia_us: int, matricula_us: int,
+                          preco_plano: float) -> np.ndarray:
+    """
+    Única implementação das features (calcular_features e o índice em memória
+    só medem as partes): o resumo dos check-ins arquivados, o dos datados até a
+    referência (todos depois do arquivo) e quantos destes caem em cada janela.
+    """
+    conferir_arquivo(arquivado, referencia_us)
+    historico = juntar_historicos(arquivado, recentes)
+
+    if historico is not None:
+        dias_ultimo_checkin = min((referencia_us - historico.ultima_us) // MICROS_POR_DIA, 365)  # Limita a 1 ano
+        n = historico.total - 1
+        if n > 0:
+            # Variância populacional dos intervalos, pelas somas exatas (inteiras)
+            soma, quadrados = historico.soma_intervalos, historico.soma_quadrados
+            variancia_intervalos = float(np.clip((n * quadrados - soma * soma) / (n * n), 0, 100))
+        else:
+            variancia_intervalos = 30
+        total = historico.total
+    else:
+        dias_ultimo_checkin = 365  # Se nunca fez checkin, assume 1 ano
+        variancia_intervalos = 30
+        total = 0
+
+    tempo_matricula = max((referencia_us - matricula_us) // MICROS_POR_DIA, 1)  # Evita divisão por zero
+    return np.array([
+        min(na_semana / JANELA_SEMANAL_DIAS, 1.0),  # Limita a 100%
+        min(no_mes / JANELA_MENSAL_DIAS, 1.0),
+        dias_ultimo_checkin,
+        variancia_intervalos,
+        tempo_matricula,
+        min(total / tempo_matricula, 1.0),  # Limita a 1 por dia
+        preco_plano
+    ], dtype=np.float64)
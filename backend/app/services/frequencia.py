@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+from math import ceil
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, distinct, func
+from sqlalchemy.orm import Session
+from app.models import Aluno, Checkin
+
+JANELAS_PADRAO = [7, 30, 90]
+JANELA_RESUMO = 30  # Janela dos campos de topo da resposta (compatibilidade)
+
+def _utc_sem_fuso(data: Optional[datetime]) -> Optional[datetime]:
+    """Datas com fuso viram UTC sem fuso, como as gravadas nos check-ins"""
+    if data is None or data.tzinfo is None:
+        return data
+    return data.astimezone(timezone.utc).replace(tzinfo=None)
+
+def montar_janelas(dias: List[int], inicio: Optional[datetime] = None,
+                   fim: Optional[datetime] = None) -> List[Tuple[datetime, datetime, int]]:
+    """
+    Converte os parâmetros da consulta em intervalos (inicio, fim, total_dias).
+    As janelas em dias terminam agora; inicio/fim definem um intervalo
+    personalizado (datas com fuso são convertidas para UTC).
+    """
+    if any(n <= 0 for n in dias):
+        raise ValueError("As janelas devem ter pelo menos 1 dia")
+    agora = datetime.utcnow()
+    janelas = [(agora - timedelta(days=n), agora, n) for n in sorted(set(dias) | {JANELA_RESUMO})]
+    inicio, fim = _utc_sem_fuso(inicio), _utc_sem_fuso(fim)
+    if inicio is not None:
+        fim = fim or agora
+        if fim <= inicio:
+            raise ValueError("O fim do intervalo deve ser posterior ao início")
+        janelas.append((inicio, fim, max(ceil((fim - inicio) / timedelta(days=1)), 1)))
+    return janelas
+
+def calcular_frequencias(db: Session, aluno_ids: List[int],
+                         janelas: List[Tuple[datetime, datetime, int]],
+                         academia_id: Optional[int] = None) -> Dict[int, dict]:
+    """
+    Calcula check-ins e dias distintos de presença de vários alunos em
+    várias janelas com uma única consulta agregada.
+
+    Returns:
+        dict: aluno_id -> resposta no formato de schemas.Frequencia
+              (alunos inexistentes ou de outra academia ficam de fora)
+    """
+    if not aluno_ids:
+        return {}
+
+    menor_inicio = min(inicio for inicio, _, _ in janelas)
+    dia = func.date_trunc("day", Checkin.data)
+
+    colunas = []
+    for inicio, fim, _ in janelas:
+        na_janela = and_(Checkin.data >= inicio, Checkin.data <= fim)
+        colunas.append(func.count(Checkin.id).filter(na_janela))
+        colunas.append(func.count(distinct(dia)).filter(na_janela))
+
+    # LEFT JOIN a partir de alunos: a mesma consulta confirma a existência do aluno
+    consulta = db.query(Aluno.id, *colunas).outerjoin(
+        Checkin,
+        and_(Checkin.aluno_id == Aluno.id, Checkin.data >= menor_inicio)
+    ).filter(Aluno.id.in_(aluno_ids))
+    if academia_id is not None:
+        consulta = consulta.filter(Aluno.academia_id == academia_id)
+    linhas = consulta.group_by(Aluno.id).all()
+
+    resultado = {}
+    for linha in linhas:
+        aluno_id, contagens = linha[0], linha[1:]
+        por_janela = []
+        for i, (inicio, fim, total_dias) in enumerate(janelas):
+            total_checkins, dias_presentes = contagens[2 * i], contagens[2 * i + 1]
+            por_janela.append({
+                "inicio": inicio,
+                "fim": fim,
+                "total_dias": total_dias,
+                "total_checkins": total_checkins,
+                "dias_presentes": dias_presentes,
+                "percentual": dias_presentes / total_dias,
+            })
+        resumo = next(
+            (j for j, (_, _, n) in zip(por_janela, janelas) if n == JANELA_RESUMO),
+            por_janela[0]
+        )
+        resultado[aluno_id] = {
+            "total_dias": resumo["total_dias"],
+            "dias_presentes": resumo["dias_presentes"],
+            "percentual": resumo["percentual"],
+            "janelas": por_janela,
+        }
+    return resultado
@@ -0,0 +1,355 @@
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_right, insort
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import func, select
+from app.database import SessionLocal
+from app.metricas import metricas
+from app.models import Aluno, Checkin, ResumoCheckinMes
+from app.services.features import JANELA_MENSAL_DIAS, JANELA_SEMANAL_DIAS, features_do_historico, inicio_janela
+from app.services.retencao import MICROS_POR_DIA, HistoricoArquivado, micros, resumir_meses
+
+# Índice em memória dos check-ins por aluno: o risco é calculado sem
+# carregar o histórico do banco nem hidratar objetos ORM
+ATIVO = os.getenv("INDICE_CHECKINS_ATIVO", "false").lower() in ("1", "true", "sim")
+INTERVALO_S = float(os.getenv("INDICE_CHECKINS_INTERVALO_MS", "1000")) / 1000.0
+# Tempo máximo de uma transação que insere check-ins; ids mais antigos que
+# isso (desde que vistos) não são mais relidos na sincronização
+ATRASO_S = float(os.getenv("INDICE_CHECKINS_ATRASO_S", "60"))
+# Intervalo da reconciliação com a retenção e as exclusões (feitas por qualquer processo)
+RECONCILIAR_S = float(os.getenv("INDICE_CHECKINS_RECONCILIAR_S", "60"))
+# Ids do topo relidos depois do aquecimento (transações abertas durante a carga)
+MARGEM_IDS_AQUECIMENTO = 1000
+LINHAS_POR_LOTE = 10000
+ALUNOS_POR_LOTE = 1000
+
+
+class HistoricoAluno:
+    """
+    Check-ins de um aluno em colunas compactas: datas ordenadas (µs) e somas
+    acumuladas dos intervalos em dias e dos seus quadrados. As features saem
+    de buscas binárias e dessas somas, sem percorrer o histórico. Os
+    check-ins arquivados entram pelo resumo em `arquivado`.
+    """
+    __slots__ = ("datas", "soma", "soma_quadrados", "arquivado")
+
+    def __init__(self, arquivado: Optional[HistoricoArquivado] = None):
+        self.datas = array("q")
+        self.soma = array("q")            # soma[i]: intervalos entre datas[0..i]
+        self.soma_quadrados = array("q")
+        self.arquivado = arquivado
+
+    def __len__(self):
+        return len(self.datas)
+
+    def acrescentar(self, data_us: int):
+        if not self.datas or data_us >= self.datas[-1]:
+            intervalo = (data_us - self.datas[-1]) // MICROS_POR_DIA if self.datas else 0
+            self.datas.append(data_us)
+            self.soma.append((self.soma[-1] if self.soma else 0) + intervalo)
+            self.soma_quadrados.append((self.soma_quadrados[-1] if self.soma_quadrados else 0) + intervalo * intervalo)
+            return
+        # Fora de ordem (lote atrasado): raro, refaz as somas a partir da posição
+        insort(self.datas, data_us)
+        self._refazer_somas(bisect_right(self.datas, data_us) - 1)
+
+    def remover(self, data_us: int) -> bool:
+        posicao = bisect_right(self.datas, data_us) - 1
+        if posicao < 0 or self.datas[posicao] != data_us:
+            return False
+        del self.datas[posicao]
+        self._refazer_somas(posicao)
+        return True
+
+    def _refazer_somas(self, inicio: int):
+        del self.soma[inicio:]
+        del self.soma_quadrados[inicio:]
+        for i in range(inicio, len(self.datas)):
+            intervalo = (self.datas[i] - self.datas[i - 1]) // MICROS_POR_DIA if i else 0
+            self.soma.append((self.soma[i - 1] if i else 0) + intervalo)
+            self.soma_quadrados.append((self.soma_quadrados[i - 1] if i else 0) + intervalo * intervalo)
+
+    def features(self, data_matricula: datetime, preco_plano: float, referencia: datetime) -> np.ndarray:
+        """Mesmas features de calcular_features, em O(log n) no tamanho do histórico"""
+        ref = micros(referencia)
+        validos = bisect_right(self.datas, ref)
+        recentes = None
+        if validos:
+            recentes = HistoricoArquivado(validos, self.datas[0], self.datas[validos - 1],
+                                          self.soma[validos - 1], self.soma_quadrados[validos - 1])
+        return features_do_historico(
+            self.arquivado,
+            recentes,
+            validos - bisect_right(self.datas, inicio_janela(ref, JANELA_SEMANAL_DIAS), 0, validos),
+            validos - bisect_right(self.datas, inicio_janela(ref, JANELA_MENSAL_DIAS), 0, validos),
+            ref,
+            micros(data_matricula),
+            preco_plano
+        )
+
+
+class IndiceCheckins:
+    """
+    Histórico de check-ins de todos os alunos, aquecido do banco na
+    inicialização. O processo que grava um check-in o acrescenta na hora;
+    os dos outros processos chegam pela sincronização, que a cada
+    INTERVALO_S relê os ids acima da marca d'água. Check-ins acrescentados
+    localmente que não aparecem no banco depois de ATRASO_S (transação
+    desfeita) são retirados. A cada RECONCILIAR_S, a reconciliação acompanha
+    os arquivamentos e as exclusões de alunos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._historicos: Dict[int, HistoricoAluno] = {}
+        self._marca = 0                                            # ids até aqui já estão no índice
+        self._recentes: Dict[int, float] = {}                      # id acima da marca -> quando foi visto
+        self._locais: Dict[int, Tuple[int, int, float]] = {}       # id -> (aluno, data em µs, quando)
+        self._total = 0
+        self._marca_resumos: Optional[datetime] = None            # maior atualizado_em dos resumos já lidos
+        self.pronto = False
+        self._thread = None
+
+    def features(self, aluno_id: int, data_matricula: datetime, preco_plano: float,
+                 referencia: datetime) -> Optional[np.ndarray]:
+        """Features do aluno a partir do índice, ou None se ele ainda não foi aquecido"""
+        if not self.pronto:
+            metricas.incrementar("indice_checkins_indisponivel")
+            return None
+        with self._lock:
+            historico = self._historicos.get(aluno_id)
+            if historico is None:
+                historico = HistoricoAluno()  # Aluno sem check-ins
+            return historico.features(data_matricula, preco_plano, referencia)
+
+    def adicionar(self, aluno_id: int, checkin_id: int, data: datetime):
+        """Acrescenta um check-in gravado por este processo (ainda na transação)"""
+        if not self.pronto:
+            return  # Chega pela sincronização depois do aquecimento
+        data_us = micros(data)
+        with self._lock:
+            if checkin_id <= self._marca or checkin_id in self._recentes or checkin_id in self._locais:
+                return
+            self._acrescentar(aluno_id, data_us)
+            self._locais[checkin_id] = (aluno_id, data_us, time.monotonic())
+
+    def _acrescentar(self, aluno_id: int, data_us: int):
+        historico = self._historicos.get(aluno_id)
+        if historico is None:
+            historico = self._historicos[aluno_id] = HistoricoAluno()
+        historico.acrescentar(data_us)
+        self._total += 1
+
+    def aquecer(self):
+        inicio = time.perf_counter()
+        db = SessionLocal()
+        try:
+            historicos: Dict[int, HistoricoAluno] = {}
+            maior_id = db.query(func.max(Checkin.id)).scalar() or 0
+            marca_resumos = db.query(func.max(ResumoCheckinMes.atualizado_em)).scalar()
+            marca = max(maior_id - MARGEM_IDS_AQUECIMENTO, 0)
+            recentes = {}
+            total = 0
+            agora = time.monotonic()
+            consulta = select(Checkin.id, Checkin.aluno_id, Checkin.data).where(
+                Checkin.id <= maior_id, Checkin.data.isnot(None)
+            ).order_by(Checkin.aluno_id, Checkin.data).execution_options(yield_per=LINHAS_POR_LOTE)
+            for checkin_id, aluno_id, data in db.execute(consulta):
+                historico = historicos.get(aluno_id)
+                if historico is None:
+                    historico = historicos[aluno_id] = HistoricoAluno()
+                historico.acrescentar(micros(data))
+                total += 1
+                if checkin_id > marca:
+                    recentes[checkin_id] = agora
+
+            # Resumos dos check-ins arquivados (services/retencao.py)
+            meses = db.query(ResumoCheckinMes).order_by(ResumoCheckinMes.aluno_id, ResumoCheckinMes.mes)
+            for aluno_id, resumos in groupby(meses.yield_per(LINHAS_POR_LOTE), key=lambda resumo: resumo.aluno_id):
+                historico = historicos.get(aluno_id)
+                if historico is None:
+                    historico = historicos[aluno_id] = HistoricoAluno()
+                historico.arquivado = resumir_meses(resumos)
+        finally:
+            db.close()
+
+        with self._lock:
+            self._historicos = historicos
+            self._marca = marca
+            self._recentes = recentes
+            self._total = total
+            self._marca_resumos = marca_resumos
+            self.pronto = True
+        metricas.definir("indice_checkins_alunos", len(historicos))
+        metricas.definir("indice_checkins_total", total)
+        print(f"Índice de check-ins aquecido: {total} check-ins de {len(historicos)} alunos "
+              f"em {time.perf_counter() - inicio:.1f}s")
+
+    def sincronizar(self):
+        """Traz os check-ins gravados por outros processos desde a marca d'água"""
+        inicio = time.perf_counter()
+        db = SessionLocal()
+        try:
+            linhas = db.execute(select(Checkin.id, Checkin.aluno_id, Checkin.data).where(
+                Checkin.id > self._marca, Checkin.data.isnot(None)
+            ).order_by(Checkin.id)).all()
+        finally:
+            db.close()
+
+        agora = time.monotonic()
+        novos = 0
+        with self._lock:
+            for checkin_id, aluno_id, data in linhas:
+                if checkin_id in self._recentes:
+                    continue
+                self._recentes[checkin_id] = agora
+                if self._locais.pop(checkin_id, None) is None:
+                    self._acrescentar(aluno_id, micros(data))
+                    novos += 1
+
+            # Acrescentados aqui e nunca vistos no banco: a transação foi desfeita
+            for checkin_id, (aluno_id, data_us, quando) in list(self._locais.items()):
+                if agora - quando > ATRASO_S:
+                    del self._locais[checkin_id]
+                    historico = self._historicos.get(aluno_id)
+                    if historico is not None and historico.remover(data_us):
+                        self._total -= 1
+                    metricas.incrementar("indice_checkins_desfeitos")
+
+            # Ids vistos há mais de ATRASO_S: qualquer id menor já foi confirmado ou desfeito
+            confirmados = [checkin_id for checkin_id, quando in self._recentes.items() if agora - quando >= ATRASO_S]
+            if confirmados:
+                self._marca = max(confirmados)
+                self._recentes = {
+                    checkin_id: quando for checkin_id, quando in self._recentes.items() if checkin_id > self._marca
+                }
+            total = self._total
+
+        metricas.incrementar("indice_checkins_sincronizados", novos)
+        metricas.definir("indice_checkins_alunos", len(self._historicos))
+        metricas.definir("indice_checkins_total", total)
+        metricas.observar("indice_checkins_sincronizacao_ms", (time.perf_counter() - inicio) * 1000)
+
+    def reconciliar(self):
+        """
+        Acompanha a retenção e as exclusões: refaz do banco o histórico dos
+        alunos com resumos mensais gravados desde a última reconciliação (os
+        check-ins arquivados saem da memória e entram pelo resumo) e retira
+        os alunos excluídos. A memória fica limitada aos dados vivos.
+        """
+        inicio = time.perf_counter()
+        # Só alunos já no índice antes da leitura podem sair: os criados depois não estariam nela
+        with self._lock:
+            anteriores = set(self._historicos)
+        db = SessionLocal()
+        try:
+            consulta = db.query(ResumoCheckinMes.aluno_id, func.max(ResumoCheckinMes.atualizado_em))
+            if self._marca_resumos is not None:
+                # atualizado_em é o início da transação: relê ATRASO_S para trás,
+                # para não perder um arquivamento confirmado depois da marca
+                consulta = consulta.filter(
+                    ResumoCheckinMes.atualizado_em > self._marca_resumos - timedelta(seconds=ATRASO_S)
+                )
+            alterados = consulta.group_by(ResumoCheckinMes.aluno_id).all()
+            existentes = {aluno_id for (aluno_id,) in db.query(Aluno.id)}
+        finally:
+            db.close()
+
+        ids = sorted(aluno_id for aluno_id, _ in alterados if aluno_id in existentes)
+        for i in range(0, len(ids), ALUNOS_POR_LOTE):
+            self._refazer(ids[i:i + ALUNOS_POR_LOTE])
+
+        with self._lock:
+            # Com check-ins gravados aqui e não confirmados, o aluno pode ser da mesma transação
+            pendentes = {aluno_id for aluno_id, _, _ in self._locais.values()}
+            excluidos = [aluno_id for aluno_id in anteriores - existentes - pendentes if aluno_id in self._historicos]
+            for aluno_id in excluidos:
+                self._total -= len(self._historicos.pop(aluno_id))
+            total = self._total
+            if alterados:
+                marca_resumos = max(atualizado_em for _, atualizado_em in alterados)
+                if self._marca_resumos is None or marca_resumos > self._marca_resumos:
+                    self._marca_resumos = marca_resumos
+
+        metricas.incrementar("indice_checkins_refeitos", len(ids))
+        metricas.incrementar("indice_checkins_alunos_excluidos", len(excluidos))
+        metricas.definir("indice_checkins_alunos", len(self._historicos))
+        metricas.definir("indice_checkins_total", total)
+        metricas.observar("indice_checkins_reconciliacao_ms", (time.perf_counter() - inicio) * 1000)
+
+    def _refazer(self, aluno_ids: List[int]):
+        """Troca o histórico dos alunos pelo do banco (check-ins e resumos lidos na mesma foto)"""
+        db = SessionLocal()
+        try:
+            # Um arquivamento confirmado entre as duas leituras contaria os check-ins duas vezes (ou nenhuma)
+            db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            linhas = db.execute(select(Checkin.id, Checkin.aluno_id, Checkin.data).where(
+                Checkin.aluno_id.in_(aluno_ids), Checkin.data.isnot(None)
+            ).order_by(Checkin.aluno_id, Checkin.data)).all()
+            meses = db.query(ResumoCheckinMes).filter(
+                ResumoCheckinMes.aluno_id.in_(aluno_ids)
+            ).order_by(ResumoCheckinMes.aluno_id, ResumoCheckinMes.mes).all()
+        finally:
+            db.close()
+
+        historicos = {aluno_id: HistoricoAluno() for aluno_id in aluno_ids}
+        for aluno_id, resumos in groupby(meses, key=lambda resumo: resumo.aluno_id):
+            historicos[aluno_id].arquivado = resumir_meses(resumos)
+
+        # Roda na thread da sincronização: nenhum id lido aqui é acrescentado de novo por ela
+        agora = time.monotonic()
+        with self._lock:
+            for checkin_id, aluno_id, data in linhas:
+                historicos[aluno_id].acrescentar(micros(data))
+                if checkin_id > self._marca:
+                    self._recentes.setdefault(checkin_id, agora)
+                    self._locais.pop(checkin_id, None)
+            # Gravados aqui e ainda não confirmados continuam no histórico
+            for aluno_id, data_us, _ in self._locais.values():
+                if aluno_id in historicos:
+                    historicos[aluno_id].acrescentar(data_us)
+            for aluno_id, historico in historicos.items():
+                anterior = self._historicos.pop(aluno_id, None)
+                self._total += len(historico) - (len(anterior) if anterior is not None else 0)
+                if len(historico) or historico.arquivado is not None:
+                    self._historicos[aluno_id] = historico
+
+    def _executar(self):
+        while not self.pronto:
+            try:
+                self.aquecer()
+            except Exception as e:
+                print(f"Erro ao aquecer o índice de check-ins: {e}")
+                time.sleep(INTERVALO_S * 10)
+        ultima_reconciliacao = time.monotonic()
+        while True:
+            time.sleep(INTERVALO_S)
+            try:
+                self.sincronizar()
+            except Exception as e:
+                print(f"Erro ao sincronizar o índice de check-ins: {e}")
+            if time.monotonic() - ultima_reconciliacao >= RECONCILIAR_S:
+                ultima_reconciliacao = time.monotonic()
+                try:
+                    self.reconciliar()
+                except Exception as e:
+                    print(f"Erro ao reconciliar o índice de check-ins: {e}")
+
+    def iniciar(self):
+        """Aquece e sincroniza em uma thread; até ficar pronto, o risco usa o histórico do banco"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._executar, name="indice-checkins", daemon=True)
+            self._thread.start()
+
+
+indice_checkins = IndiceCheckins() if ATIVO else None
+
+
+def carregar_checkins() -> bool:
+    """Se as consultas de pontuação ainda precisam trazer Aluno.checkins do banco"""
+    return indice_checkins is None or not indice_checkins.pronto
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+from typing import Callable, List
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.mensagens import rota_evento
+from app.models import Aluno, EventoOutbox
+
+# Tipos de evento de domínio. Eles ficam em um namespace próprio (gym.eventos.*,
+# ver rota_evento): as filas antigas (gym.checkins.*, por exemplo) gravam
+# check-ins ao consumir e não podem recebê-los
+TIPO_CHECKIN = "checkin"
+TIPO_MATRICULA = "matricula"
+TIPO_CANCELAMENTO = "cancelamento"
+
+def registrar_evento(db: Session, tipo: str, payload: dict):
+    """
+    Adiciona o evento à transação atual; só é publicado se ela for confirmada.
+    A routing key vem da academia do payload.
+    """
+    db.add(EventoOutbox(
+        routing_key=rota_evento(tipo, payload["academia_id"]), payload=payload, criado_em=datetime.utcnow()
+    ))
+
+def registrar_eventos(db: Session, tipo: str, payloads: List[dict]):
+    """Versão em lote de registrar_evento, com um único INSERT"""
+    if not payloads:
+        return
+    agora = datetime.utcnow()
+    db.execute(insert(EventoOutbox).values([
+        {"routing_key": rota_evento(tipo, payload["academia_id"]), "payload": payload,
+         "criado_em": agora, "tentativas": 0}
+        for payload in payloads
+    ]))
+
+def evento_checkin(checkin_id: int, aluno_id: int, academia_id: int, data: datetime) -> dict:
+    return {"checkin_id": checkin_id, "aluno_id": aluno_id, "academia_id": academia_id, "data": data.isoformat()}
+
+def evento_matricula(aluno: Aluno) -> dict:
+    return {
+        "aluno_id": aluno.id,
+        "academia_id": aluno.academia_id,
+        "plano_id": aluno.plano_id,
+        "data_matricula": aluno.data_matricula.isoformat() if aluno.data_matricula else None,
+    }
+
+def evento_cancelamento(aluno: Aluno) -> dict:
+    return {
+        "aluno_id": aluno.id,
+        "academia_id": aluno.academia_id,
+        "plano_id": aluno.plano_id,
+        "data_cancelamento": aluno.data_cancelamento.isoformat() if aluno.data_cancelamento else None,
+    }
+
+def publicar_pendentes(db: Session, publicar: Callable[[List[EventoOutbox]], int], lote: int) -> int:
+    """
+    Publica até `lote` eventos pendentes, em ordem de criação.
+
+    As linhas são travadas com SKIP LOCKED, então vários relays podem rodar
+    sem publicar o mesmo evento duas vezes. `publicar` devolve quantos eventos,
+    a partir do primeiro, o broker confirmou; só esses são marcados. Se o
+    processo cair entre a confirmação e o commit, o evento é publicado de
+    novo: os consumidores devem deduplicar pelo message_id (id do evento).
+
+    Returns:
+        int: quantidade de eventos publicados
+    """
+    eventos = db.query(EventoOutbox).filter(
+        EventoOutbox.publicado_em.is_(None)
+    ).order_by(EventoOutbox.id).limit(lote).with_for_update(skip_locked=True).all()
+
+    if not eventos:
+        db.rollback()
+        return 0
+
+    confirmados = 0
+    try:
+        confirmados = publicar(eventos)
+    finally:
+        agora = datetime.utcnow()
+        for evento in eventos[:confirmados]:
+            evento.publicado_em = agora
+        for evento in eventos[confirmados:]:
+            evento.tentativas += 1
+        db.commit()
+
+    return confirmados
+
+def limpar_publicados(db: Session, dias: int) -> int:
+    """Remove eventos já publicados há mais de `dias` dias"""
+    removidos = db.query(EventoOutbox).filter(
+        EventoOutbox.publicado_em < datetime.utcnow() - timedelta(days=dias)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return removidos
@@ -0,0 +1,183 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Set
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.models import Academia, Aluno, Checkin, PontuacaoPendente, VersaoPontuada
+from app.models.aluno import StatusMatricula
+from app.services.academias import chave_modelo
+from app.services.churn_predictor import ChurnPredictor, preditores
+from app.services.indice_checkins import carregar_checkins
+
+# Idades do último check-in (em dias) que mudam as features o bastante para recalcular o risco.
+# 7 e 30 são as janelas de frequência; 14 pega quem começou a sumir entre elas.
+LIMIARES_DIAS = tuple(int(dias) for dias in os.getenv("PONTUACAO_LIMIARES_DIAS", "7,14,30").split(","))
+ALUNOS_POR_LOTE = 500
+
+def pontuar(aluno: Aluno, preditor: Optional[ChurnPredictor] = None) -> float:
+    """Recalcula o risco do aluno e guarda a versão do modelo que o calculou"""
+    preditor = preditor or preditores.do_aluno(aluno)
+    aluno.risco_churn = preditor.predict(aluno)
+    aluno.versao_risco = preditor.versao
+    return aluno.risco_churn
+
+def marcar_pendente(db: Session, aluno_id: int, motivo: str):
+    """Marca o aluno para a próxima pontuação incremental, na transação atual"""
+    db.execute(insert(PontuacaoPendente).values(
+        aluno_id=aluno_id, motivo=motivo, marcado_em=datetime.utcnow()
+    ).on_conflict_do_nothing())
+
+def _pendentes(db: Session) -> Set[int]:
+    return {aluno_id for (aluno_id,) in db.query(PontuacaoPendente.aluno_id)}
+
+def _versoes_atuais(db: Session) -> Dict[int, Optional[str]]:
+    """Versão do modelo em uso por academia (None = heurística)"""
+    return {
+        academia.id: preditores.para_predicao(chave_modelo(academia)).versao
+        for academia in db.query(Academia).all()
+    }
+
+def _versao_desatualizada(db: Session, versoes: Dict[int, Optional[str]]) -> Set[int]:
+    """
+    Alunos ativos pontuados por uma versão diferente da atual do modelo da sua
+    academia. Só procura nas academias cuja versão mudou desde a última
+    pontuação concluída: nas demais, cadastro, check-in e atualização já
+    pontuam com a versão atual.
+    """
+    pontuadas = dict(db.query(VersaoPontuada.academia_id, VersaoPontuada.versao))
+    ids = set()
+    for academia_id, versao in versoes.items():
+        if academia_id in pontuadas and pontuadas[academia_id] == versao:
+            continue
+        ids.update(aluno_id for (aluno_id,) in db.query(Aluno.id).filter(
+            Aluno.academia_id == academia_id,
+            Aluno.status_matricula == StatusMatricula.ATIVA.value,
+            Aluno.versao_risco.is_distinct_from(versao)
+        ))
+    return ids
+
+def _registrar_versoes(db: Session, versoes: Dict[int, Optional[str]]):
+    """Guarda as versões com que a pontuação concluída deixou cada academia"""
+    if not versoes:
+        return
+    comando = insert(VersaoPontuada).values([
+        {"academia_id": academia_id, "versao": versao} for academia_id, versao in versoes.items()
+    ])
+    db.execute(comando.on_conflict_do_update(
+        index_elements=[VersaoPontuada.academia_id], set_={"versao": comando.excluded.versao}
+    ))
+    db.commit()
+
+def _cruzaram_limiar(db: Session, academia_ids: Iterable[int], desde: datetime, agora: datetime) -> Set[int]:
+    """
+    Alunos ativos com algum check-in que passou de um dos LIMIARES_DIAS de
+    idade entre `desde` e `agora`. Lê só os check-ins dessas faixas de data,
+    academia por academia pelo índice (academia_id, data), então o custo
+    acompanha o movimento.
+    """
+    ids = set()
+    for academia_id in academia_ids:
+        for dias in LIMIARES_DIAS:
+            idade = timedelta(days=dias)
+            ids.update(aluno_id for (aluno_id,) in db.query(Checkin.aluno_id).join(
+                Aluno, Checkin.aluno_id == Aluno.id
+            ).filter(
+                Checkin.academia_id == academia_id,
+                Checkin.data > desde - idade,
+                Checkin.data <= agora - idade,
+                Aluno.status_matricula == StatusMatricula.ATIVA.value
+            ).distinct())
+    return ids
+
+def selecionar_alterados(
+    db: Session, desde: datetime, agora: datetime, versoes: Optional[Dict[int, Optional[str]]] = None
+) -> Dict[str, Set[int]]:
+    """Conjunto sujo da pontuação incremental, por motivo"""
+    versoes = _versoes_atuais(db) if versoes is None else versoes
+    return {
+        "pendentes": _pendentes(db),
+        "versao_modelo": _versao_desatualizada(db, versoes),
+        "limiar_dias": _cruzaram_limiar(db, versoes, desde, agora),
+    }
+
+def pontuar_alunos(db: Session, ids: Iterable[int]) -> int:
+    """Recalcula o risco dos alunos em lotes, com um commit por lote, e limpa as marcas de pendência"""
+    ids = sorted(ids)
+    inicio = datetime.utcnow()
+    total = 0
+    for i in range(0, len(ids), ALUNOS_POR_LOTE):
+        lote = ids[i:i + ALUNOS_POR_LOTE]
+        # Com o índice de check-ins pronto, o histórico não precisa vir do banco
+        opcoes = [joinedload(Aluno.plano), joinedload(Aluno.academia)]
+        if carregar_checkins():
+            opcoes += [joinedload(Aluno.checkins), selectinload(Aluno.resumos_checkins)]
+        alunos = db.query(Aluno).options(*opcoes).filter(Aluno.id.in_(lote)).all()
+        for aluno in alunos:
+            try:
+                pontuar(aluno)
+                total += 1
+            except Exception as e:
+                print(f"Erro ao atualizar risco do aluno {aluno.id}: {e}")
+                # Fica para a próxima, mesmo que a versão do modelo não mude (uma
+                # marca anterior é renovada para não ser apagada junto com o lote)
+                agora = datetime.utcnow()
+                db.execute(insert(PontuacaoPendente).values(
+                    aluno_id=aluno.id, motivo="erro", marcado_em=agora
+                ).on_conflict_do_update(
+                    index_elements=[PontuacaoPendente.aluno_id], set_={"motivo": "erro", "marcado_em": agora}
+                ))
+        # Marcas feitas durante a pontuação ficam para a próxima
+        db.query(PontuacaoPendente).filter(
+            PontuacaoPendente.aluno_id.in_(lote),
+            PontuacaoPendente.marcado_em <= inicio
+        ).delete(synchronize_session=False)
+        db.commit()
+        db.expunge_all()
+    return total
+
+def pontuar_alterados(db: Session, desde: datetime, agora: datetime = None) -> dict:
+    """
+    Pontuação incremental: só os alunos do conjunto sujo. Depois de uma
+    nova versão de modelo, todos os alunos dele estão no conjunto.
+    """
+    agora = agora or datetime.utcnow()
+    versoes = _versoes_atuais(db)
+    alterados = selecionar_alterados(db, desde, agora, versoes)
+    ids = set().union(*alterados.values())
+    resumo = {motivo: len(alunos) for motivo, alunos in alterados.items()}
+    resumo["pontuados"] = pontuar_alunos(db, ids)
+    # Só depois de pontuar todos: se a execução cair no meio, a próxima procura de novo
+    _registrar_versoes(db, versoes)
+    print(f"Pontuação incremental desde {desde}: {resumo}")
+    return resumo
+
+def pontuar_todos(db: Session) -> int:
+    """Pontuação completa de todos os alunos ativos (uso manual)"""
+    ids = [aluno_id for (aluno_id,) in db.query(Aluno.id).filter(
+        Aluno.status_matricula == StatusMatricula.ATIVA.value
+    )]
+    total = pontuar_alunos(db, ids)
+    print(f"Pontuação completa: {total} alunos")
+    return total
+
+if __name__ == "__main__":
+    # Pontuação pela linha de comando, por exemplo via cron:
+    #   python -m app.services.pontuacao --desde 2024-01-01T00:00   (incremental)
+    #   python -m app.services.pontuacao --completa
+    import argparse
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Recalcula o risco de churn dos alunos alterados")
+    parser.add_argument("--desde", type=datetime.fromisoformat,
+                        help="Início da janela dos limiares de dias (padrão: 24 horas atrás)")
+    parser.add_argument("--completa", action="store_true", help="Recalcula todos os alunos ativos")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        if args.completa:
+            pontuar_todos(session)
+        else:
+            pontuar_alterados(session, args.desde or datetime.utcnow() - timedelta(days=1))
+    finally:
+        session.close()
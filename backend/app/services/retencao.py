@@ -0,0 +1,362 @@
+import csv
+import gzip
+import os
+import uuid
+from datetime import date, datetime, timedelta
+from functools import reduce
+from itertools import groupby
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+import numpy as np
+from sqlalchemy import delete, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, undefer
+from app.metricas import metricas
+from app.models import (
+    Academia, Aluno, Checkin, EstadoFeaturesAluno, PontuacaoPendente, ResumoCheckinMes, SnapshotFeatures
+)
+from app.models.aluno import StatusMatricula
+from app.models.snapshot import TipoSnapshot
+
+# Check-ins mais antigos que isso (em meses inteiros) saem da tabela quente. As
+# janelas do modelo são de 7 e 30 dias e os dias desde o último check-in param em 365.
+HORIZONTE_DIAS = max(int(os.getenv("RETENCAO_CHECKINS_DIAS", "400")), 31)
+# Cancelados há mais que isso têm todos os check-ins arquivados (vazio: desativado);
+# com RETENCAO_CANCELADOS_EXCLUIR=true, os próprios alunos são excluídos
+CANCELADOS_DIAS = os.getenv("RETENCAO_CANCELADOS_DIAS", "")
+EXCLUIR_CANCELADOS = os.getenv("RETENCAO_CANCELADOS_EXCLUIR", "false").lower() in ("1", "true", "sim")
+DIRETORIO = Path(os.getenv("ARQUIVO_CHECKINS_DIR", "app/arquivo_checkins"))
+ALUNOS_POR_LOTE = 500
+# Ids do topo considerados ainda não vistos pelo estado incremental dos snapshots
+# (transações abertas enquanto ele era gravado)
+MARGEM_IDS_ESTADO = 1000
+
+MICROS_POR_DIA = 86_400_000_000
+_EPOCA = datetime(1970, 1, 1)
+
+
+def micros(data: datetime) -> int:
+    """Mesma conversão de para_micros (datetime UTC sem fuso -> microssegundos)"""
+    delta = data - _EPOCA
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+class HistoricoArquivado(NamedTuple):
+    """
+    Resumo de um trecho do histórico de check-ins de um aluno (os arquivados,
+    um mês, o estado dos snapshots ou os da tabela quente)
+    """
+    total: int
+    primeira_us: int
+    ultima_us: int
+    soma_intervalos: int   # intervalos em dias entre check-ins consecutivos
+    soma_quadrados: int
+
+
+def resumo_das_datas(datas_us: Sequence[int]) -> Optional[HistoricoArquivado]:
+    """Resumo das datas em µs, em ordem"""
+    datas = np.asarray(datas_us, dtype=np.int64)
+    if not datas.size:
+        return None
+    intervalos = np.diff(datas) // MICROS_POR_DIA
+    return HistoricoArquivado(int(datas.size), int(datas[0]), int(datas[-1]),
+                              int(intervalos.sum()), int((intervalos * intervalos).sum()))
+
+
+def juntar_historicos(antes: Optional[HistoricoArquivado],
+                      depois: Optional[HistoricoArquivado]) -> Optional[HistoricoArquivado]:
+    """
+    Resumo de dois trechos consecutivos (`depois` começa na última data de
+    `antes` ou depois dela): o intervalo da passagem sai da última data de
+    um e da primeira do outro. Todas as junções de resumos passam por aqui.
+    """
+    if antes is None:
+        return depois
+    if depois is None:
+        return antes
+    passagem = (depois.primeira_us - antes.ultima_us) // MICROS_POR_DIA
+    return HistoricoArquivado(
+        antes.total + depois.total,
+        antes.primeira_us,
+        depois.ultima_us,
+        antes.soma_intervalos + depois.soma_intervalos + passagem,
+        antes.soma_quadrados + depois.soma_quadrados + passagem * passagem,
+    )
+
+
+def _historico_do_mes(mes: ResumoCheckinMes) -> HistoricoArquivado:
+    return HistoricoArquivado(mes.total, micros(mes.primeira), micros(mes.ultima),
+                              mes.soma_intervalos, mes.soma_quadrados)
+
+
+def resumir_meses(meses: Iterable[ResumoCheckinMes]) -> Optional[HistoricoArquivado]:
+    """Junta os resumos mensais de um aluno, em ordem de mês"""
+    return reduce(juntar_historicos, (_historico_do_mes(mes) for mes in meses), None)
+
+
+def estender_historico(historico: Optional[HistoricoArquivado],
+                       datas_us: Sequence[int]) -> Optional[HistoricoArquivado]:
+    """Acrescenta ao resumo as datas em µs, em ordem e todas posteriores a historico.ultima_us"""
+    return juntar_historicos(historico, resumo_das_datas(datas_us))
+
+
+def _inicio_do_mes(data: datetime) -> datetime:
+    return datetime(data.year, data.month, 1)
+
+
+def _proximo_mes(data: datetime) -> datetime:
+    return (data.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _campos_do_mes(historico: HistoricoArquivado, datas_us: Optional[List[int]]) -> dict:
+    """Colunas do resumo mensal (ResumoCheckinMes) a partir do resumo das datas"""
+    return {
+        "total": historico.total,
+        "primeira": _EPOCA + timedelta(microseconds=historico.primeira_us),
+        "ultima": _EPOCA + timedelta(microseconds=historico.ultima_us),
+        "soma_intervalos": historico.soma_intervalos,
+        "soma_quadrados": historico.soma_quadrados,
+        "datas": datas_us,
+    }
+
+
+def _resumo_das_datas(datas_us: List[int]) -> dict:
+    """Campos do resumo mensal a partir das datas em µs, em ordem"""
+    return _campos_do_mes(resumo_das_datas(datas_us), datas_us)
+
+
+def _resumos(linhas: List[tuple]) -> List[dict]:
+    """Resumos por aluno e mês das linhas (id, aluno_id, academia_id, data) arquivadas"""
+    com_data = sorted((linha for linha in linhas if linha[3] is not None), key=lambda linha: (linha[1], linha[3]))
+    resumos = []
+    for (aluno_id, mes), grupo in groupby(com_data, key=lambda linha: (linha[1], date(linha[3].year, linha[3].month, 1))):
+        grupo = list(grupo)
+        resumos.append({
+            "aluno_id": aluno_id,
+            "mes": mes,
+            "academia_id": grupo[0][2],
+            **_resumo_das_datas([micros(linha[3]) for linha in grupo]),
+        })
+    return resumos
+
+
+def _juntar_mes(existente: ResumoCheckinMes, novo: dict):
+    """
+    Junta ao resumo já gravado do mês os check-ins arquivados agora (chegaram
+    depois do arquivamento do mês). Com as datas gravadas, refaz o resumo a
+    partir delas. Nos resumos sem datas (anteriores à coluna), o intervalo da
+    fronteira sai da última data de um lado e da primeira do outro, exato
+    quando os novos vêm todos antes ou todos depois dos antigos.
+    """
+    if existente.datas is not None:
+        campos = _resumo_das_datas(sorted(existente.datas + novo["datas"]))
+    else:
+        antigo, recente = _historico_do_mes(existente), resumo_das_datas(novo["datas"])
+        if recente.primeira_us >= antigo.ultima_us:
+            juntos = juntar_historicos(antigo, recente)
+        elif recente.ultima_us <= antigo.primeira_us:
+            juntos = juntar_historicos(recente, antigo)
+        else:
+            # Intercalados sem as datas antigas: só dá para aproximar
+            juntos = juntar_historicos(antigo, recente._replace(primeira_us=antigo.ultima_us))
+            metricas.incrementar("resumos_checkins_aproximados")
+            print(f"Resumo de check-ins do aluno {existente.aluno_id} em {existente.mes} aproximado "
+                  f"(check-ins atrasados intercalados em um resumo sem datas)")
+        campos = _campos_do_mes(juntos, None)
+    for campo, valor in campos.items():
+        setattr(existente, campo, valor)
+
+
+def _gravar_arquivo(linhas: List[tuple], motivo: str) -> Path:
+    """Grava as linhas em um CSV compactado e sincroniza com o disco"""
+    DIRETORIO.mkdir(parents=True, exist_ok=True)
+    caminho = DIRETORIO / f"checkins-{motivo}-{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.csv.gz"
+    with open(caminho, "wb") as bruto:
+        with gzip.open(bruto, "wt", newline="") as arquivo:
+            escritor = csv.writer(arquivo)
+            escritor.writerow(["id", "aluno_id", "academia_id", "data"])
+            for checkin_id, aluno_id, academia_id, data in linhas:
+                escritor.writerow([checkin_id, aluno_id, academia_id, data.isoformat() if data else ""])
+        bruto.flush()
+        os.fsync(bruto.fileno())
+    return caminho
+
+
+def _descartar_estados(db: Session, linhas: List[tuple]):
+    """
+    Apaga o estado incremental dos snapshots (EstadoFeaturesAluno) dos alunos
+    com check-ins arquivados que ele ainda não tinha absorvido (data a partir
+    do corte, ou id acima da marca): sem as linhas na tabela quente, o job
+    diário não os leria mais, e recalcula o estado a partir dos resumos.
+    """
+    estados = {aluno_id: (corte, marca) for aluno_id, corte, marca in db.query(
+        EstadoFeaturesAluno.aluno_id, EstadoFeaturesAluno.corte, EstadoFeaturesAluno.marca
+    ).filter(EstadoFeaturesAluno.aluno_id.in_({linha[1] for linha in linhas}))}
+    descartados = {
+        aluno_id for checkin_id, aluno_id, _, data in linhas
+        if aluno_id in estados and data is not None
+        and (data >= estados[aluno_id][0] or checkin_id > estados[aluno_id][1] - MARGEM_IDS_ESTADO)
+    }
+    if descartados:
+        db.query(EstadoFeaturesAluno).filter(
+            EstadoFeaturesAluno.aluno_id.in_(descartados)
+        ).delete(synchronize_session=False)
+
+
+def _arquivar(db: Session, condicao, motivo: str) -> int:
+    """
+    Remove os check-ins da condição, grava as linhas removidas no arquivo e
+    junta os resumos mensais, em uma transação. O arquivo é gravado antes do
+    commit; se o commit falhar, é apagado. Depois de uma queda entre os
+    dois, o mesmo check-in pode aparecer em dois arquivos (o id identifica).
+    """
+    # Sem sincronizar a sessão (a condição pode ter subconsultas); o commit abaixo a expira
+    linhas = db.execute(delete(Checkin).where(condicao).returning(
+        Checkin.id, Checkin.aluno_id, Checkin.academia_id, Checkin.data
+    ).execution_options(synchronize_session=False)).all()
+    if not linhas:
+        db.rollback()
+        return 0
+
+    caminho = _gravar_arquivo(linhas, motivo)
+    try:
+        _descartar_estados(db, linhas)
+        resumos = _resumos(linhas)
+        if resumos:
+            # Meses já resumidos (check-ins que chegaram atrasados): junta ao
+            # resumo existente, travado; os outros são inseridos. Dois
+            # arquivamentos inserindo o mesmo mês ao mesmo tempo falham na chave
+            # primária e a transação inteira é desfeita (a próxima execução refaz)
+            existentes = {
+                (resumo.aluno_id, resumo.mes): resumo
+                for resumo in db.query(ResumoCheckinMes).options(undefer(ResumoCheckinMes.datas)).filter(
+                    tuple_(ResumoCheckinMes.aluno_id, ResumoCheckinMes.mes).in_(
+                        [(resumo["aluno_id"], resumo["mes"]) for resumo in resumos]
+                    )
+                ).with_for_update()
+            }
+            novos = []
+            for resumo in resumos:
+                existente = existentes.get((resumo["aluno_id"], resumo["mes"]))
+                if existente is None:
+                    novos.append(resumo)
+                else:
+                    _juntar_mes(existente, resumo)
+            if novos:
+                db.execute(insert(ResumoCheckinMes).values(novos))
+        db.commit()
+    except Exception:
+        db.rollback()
+        caminho.unlink(missing_ok=True)
+        raise
+
+    metricas.incrementar("checkins_arquivados", len(linhas))
+    print(f"Arquivados {len(linhas)} check-ins em {caminho.name}")
+    return len(linhas)
+
+
+def arquivar_antigos(db: Session, horizonte_dias: int = HORIZONTE_DIAS, agora: datetime = None) -> int:
+    """
+    Arquiva os check-ins anteriores ao mês que contém `agora - horizonte_dias`,
+    um mês e uma academia por transação (só meses inteiros viram resumo).
+
+    Os check-ins de um aluno cancelado ficam na tabela quente até existir o
+    snapshot de cancelamento: as features em data_cancelamento contam os da
+    janela mensal antes dela, que o resumo não teria (ver features.conferir_arquivo).
+    """
+    corte = _inicio_do_mes((agora or datetime.utcnow()) - timedelta(days=max(horizonte_dias, 31)))
+    cancelado_sem_snapshot = db.query(Aluno.id).filter(
+        Aluno.id == Checkin.aluno_id,
+        Aluno.status_matricula == StatusMatricula.CANCELADA.value,
+        ~db.query(SnapshotFeatures.id).filter(
+            SnapshotFeatures.aluno_id == Aluno.id,
+            SnapshotFeatures.tipo == TipoSnapshot.CANCELAMENTO.value
+        ).exists()
+    ).exists()
+    total = 0
+    for (academia_id,) in db.query(Academia.id).order_by(Academia.id).all():
+        mais_antigo = db.query(func.min(Checkin.data)).filter(
+            Checkin.academia_id == academia_id, Checkin.data < corte, ~cancelado_sem_snapshot
+        ).scalar()
+        if mais_antigo is None:
+            continue
+        mes = _inicio_do_mes(mais_antigo)
+        while mes < corte:
+            total += _arquivar(db, (Checkin.academia_id == academia_id) & (Checkin.data >= mes)
+                               & (Checkin.data < _proximo_mes(mes)) & ~cancelado_sem_snapshot,
+                               f"{academia_id}-{mes:%Y%m}")
+            mes = _proximo_mes(mes)
+    return total
+
+
+def excluir_alunos(db: Session, ids: List[int]) -> int:
+    """
+    Exclui os alunos com tudo o que aponta para eles (check-ins, resumos,
+    snapshots, estados de features e marcas de pontuação). Não faz commit.
+    """
+    if not ids:
+        return 0
+    for modelo in (Checkin, ResumoCheckinMes, SnapshotFeatures, EstadoFeaturesAluno, PontuacaoPendente):
+        db.query(modelo).filter(modelo.aluno_id.in_(ids)).delete(synchronize_session=False)
+    return db.query(Aluno).filter(Aluno.id.in_(ids)).delete(synchronize_session=False)
+
+
+def arquivar_cancelados(db: Session, dias: int, excluir: bool = False, agora: datetime = None) -> dict:
+    """
+    Arquiva todos os check-ins dos alunos cancelados há mais de `dias` e,
+    com `excluir`, exclui os alunos. Sem excluir, só entram os que já têm o
+    snapshot de cancelamento: o treino continua usando esse vetor.
+    """
+    limite = (agora or datetime.utcnow()) - timedelta(days=dias)
+    consulta = db.query(Aluno.id).filter(
+        Aluno.status_matricula == StatusMatricula.CANCELADA.value,
+        Aluno.data_cancelamento < limite
+    )
+    if not excluir:
+        consulta = consulta.filter(db.query(SnapshotFeatures.id).filter(
+            SnapshotFeatures.aluno_id == Aluno.id,
+            SnapshotFeatures.tipo == TipoSnapshot.CANCELAMENTO.value
+        ).exists())
+    ids = [aluno_id for (aluno_id,) in consulta.order_by(Aluno.id)]
+
+    resumo = {"alunos": len(ids), "checkins": 0, "excluidos": 0}
+    for i in range(0, len(ids), ALUNOS_POR_LOTE):
+        lote = ids[i:i + ALUNOS_POR_LOTE]
+        resumo["checkins"] += _arquivar(db, Checkin.aluno_id.in_(lote), "cancelados")
+        if excluir:
+            resumo["excluidos"] += excluir_alunos(db, lote)
+            db.commit()
+    return resumo
+
+
+def executar_retencao(db: Session, agora: datetime = None) -> dict:
+    """Job do ciclo de vida dos check-ins (agendado no worker)"""
+    resumo = {"antigos": arquivar_antigos(db, agora=agora)}
+    if CANCELADOS_DIAS:
+        resumo["cancelados"] = arquivar_cancelados(db, int(CANCELADOS_DIAS), EXCLUIR_CANCELADOS, agora=agora)
+    print(f"Retenção de check-ins: {resumo}")
+    return resumo
+
+
+if __name__ == "__main__":
+    # Execução manual, por exemplo:
+    #   python -m app.services.retencao --horizonte-dias 400
+    #   python -m app.services.retencao --cancelados-dias 365 --excluir
+    import argparse
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Arquiva check-ins antigos e de alunos cancelados")
+    parser.add_argument("--horizonte-dias", type=int, default=HORIZONTE_DIAS,
+                        help="Idade a partir da qual os check-ins são arquivados")
+    parser.add_argument("--cancelados-dias", type=int,
+                        help="Arquiva todos os check-ins dos cancelados há mais desses dias")
+    parser.add_argument("--excluir", action="store_true", help="Exclui também os alunos cancelados")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        print(f"Check-ins antigos arquivados: {arquivar_antigos(session, args.horizonte_dias)}")
+        if args.cancelados_dias is not None:
+            print(f"Cancelados: {arquivar_cancelados(session, args.cancelados_dias, args.excluir)}")
+    finally:
+        session.close()
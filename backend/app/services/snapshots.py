@@ -0,0 +1,334 @@
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import and_, func, or_, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models import Aluno, Checkin, EstadoFeaturesAluno, Plano, ResumoCheckinMes, SnapshotFeatures
+from app.models.aluno import StatusMatricula
+from app.models.snapshot import TipoSnapshot
+from app.metricas import metricas
+from app.services.churn_predictor import NOMES_FEATURES, calcular_features, churn_predictor
+from app.services.features import ArquivoNaJanela
+from app.services.retencao import (
+    MARGEM_IDS_ESTADO, HistoricoArquivado, estender_historico, micros, resumir_meses
+)
+
+# Colunas de features na ordem usada pelo modelo
+COLUNAS_FEATURES = NOMES_FEATURES
+# Check-ins mais antigos que isso em relação à referência ficam fora das janelas de
+# frequência (7 e 30 dias) e entram só pelo estado incremental do aluno
+JANELA_RECENTE = timedelta(days=31)
+ALUNOS_POR_LOTE = 500
+
+_EPOCA = datetime(1970, 1, 1)
+_VAZIO = np.array([], dtype=np.int64)
+
+def _mapeamento(aluno_id: int, features: np.ndarray, data_referencia: datetime,
+                tipo: TipoSnapshot, cancelado: int) -> dict:
+    return {
+        "aluno_id": aluno_id,
+        "data_referencia": data_referencia,
+        "tipo": tipo.value,
+        "cancelado": cancelado,
+        "criado_em": datetime.utcnow(),
+        **{coluna: float(valor) for coluna, valor in zip(COLUNAS_FEATURES, features)},
+    }
+
+def registrar_snapshot_cancelamento(db: Session, aluno: Aluno):
+    """
+    Grava as features do aluno no instante do cancelamento, na mesma
+    transação que altera o status. É esse vetor que o treino usa como exemplo positivo.
+    """
+    features = churn_predictor._extract_features(
+        aluno, normalizar=False, referencia=aluno.data_cancelamento
+    )[0]
+    db.add(SnapshotFeatures(**_mapeamento(
+        aluno.id, features, aluno.data_cancelamento, TipoSnapshot.CANCELAMENTO, 1
+    )))
+
+def gerar_snapshots_cancelamento_pendentes(db: Session) -> int:
+    """Cria o snapshot de cancelamento dos alunos cancelados que ainda não têm um"""
+    possui_snapshot = db.query(SnapshotFeatures.id).filter(
+        SnapshotFeatures.aluno_id == Aluno.id,
+        SnapshotFeatures.tipo == TipoSnapshot.CANCELAMENTO.value
+    ).exists()
+    pendentes = db.query(Aluno).filter(
+        Aluno.status_matricula == StatusMatricula.CANCELADA.value,
+        Aluno.data_cancelamento.isnot(None),
+        ~possui_snapshot
+    ).all()
+
+    for aluno in pendentes:
+        try:
+            registrar_snapshot_cancelamento(db, aluno)
+        except Exception as e:
+            print(f"Erro ao gerar snapshot de cancelamento do aluno {aluno.id}: {e}")
+    db.commit()
+    return len(pendentes)
+
+def _estado_para_historico(estado: EstadoFeaturesAluno) -> Optional[HistoricoArquivado]:
+    if estado is None or not estado.total:
+        return None
+    return HistoricoArquivado(estado.total, micros(estado.primeira), micros(estado.ultima),
+                              estado.soma_intervalos, estado.soma_quadrados)
+
+def _mapeamento_estado(aluno_id: int, historico: Optional[HistoricoArquivado], corte: datetime,
+                       marca: int) -> dict:
+    return {
+        "aluno_id": aluno_id,
+        "corte": corte,
+        "marca": marca,
+        "total": historico.total if historico else 0,
+        "primeira": _EPOCA + timedelta(microseconds=historico.primeira_us) if historico else None,
+        "ultima": _EPOCA + timedelta(microseconds=historico.ultima_us) if historico else None,
+        "soma_intervalos": historico.soma_intervalos if historico else 0,
+        "soma_quadrados": historico.soma_quadrados if historico else 0,
+        "atualizado_em": datetime.utcnow(),
+    }
+
+def _historicos_completos(db: Session, ids: List[int]) -> Dict[int, Tuple[np.ndarray, Optional[HistoricoArquivado]]]:
+    """
+    Datas (µs, em ordem) de todos os check-ins na tabela quente e resumo dos
+    arquivados de cada aluno, lidos em lotes de alunos sem hidratar objetos ORM
+    """
+    historicos = {}
+    for i in range(0, len(ids), ALUNOS_POR_LOTE):
+        lote = ids[i:i + ALUNOS_POR_LOTE]
+        checkins = db.query(Checkin.aluno_id, Checkin.data).filter(
+            Checkin.aluno_id.in_(lote), Checkin.data.isnot(None)
+        ).order_by(Checkin.aluno_id, Checkin.data)
+        datas = {
+            aluno_id: np.array([data for _, data in linhas], dtype="datetime64[us]").astype(np.int64)
+            for aluno_id, linhas in groupby(checkins, key=lambda linha: linha[0])
+        }
+        meses = db.query(ResumoCheckinMes).filter(
+            ResumoCheckinMes.aluno_id.in_(lote)
+        ).order_by(ResumoCheckinMes.aluno_id, ResumoCheckinMes.mes)
+        arquivados = {
+            aluno_id: resumir_meses(resumos)
+            for aluno_id, resumos in groupby(meses, key=lambda resumo: resumo.aluno_id)
+        }
+        for aluno_id in lote:
+            historicos[aluno_id] = (datas.get(aluno_id, _VAZIO), arquivados.get(aluno_id))
+    return historicos
+
+def gerar_snapshots_diarios(db: Session, data_referencia: datetime = None, academia_id: int = None) -> int:
+    """
+    Grava o vetor de features de cada aluno ativo em `data_referencia`,
+    de todas as academias ou só de `academia_id`, e apaga os snapshots
+    diários anteriores: o treino só usa o mais recente de cada aluno.
+
+    Com o estado incremental do aluno (EstadoFeaturesAluno), lê só os
+    check-ins a partir do corte do estado: o custo acompanha o movimento
+    recente, não o histórico. Alunos sem estado, com check-ins atrasados ou
+    com referência anterior ao estado leem o histórico inteiro (e o estado
+    é refeito). Reexecutar para a mesma data substitui os snapshots.
+    """
+    referencia = data_referencia or datetime.utcnow()
+    corte = referencia - JANELA_RECENTE
+    filtros_aluno = [Aluno.status_matricula == StatusMatricula.ATIVA.value]
+    if academia_id is not None:
+        filtros_aluno.append(Aluno.academia_id == academia_id)
+
+    alunos = {
+        aluno_id: (data_matricula, float(preco) if preco else 0.0)
+        for aluno_id, data_matricula, preco in db.query(
+            Aluno.id, Aluno.data_matricula, Plano.preco
+        ).outerjoin(Plano, Aluno.plano_id == Plano.id).filter(
+            *filtros_aluno,
+            Aluno.data_matricula <= referencia
+        )
+    }
+    marca = db.query(func.max(Checkin.id)).scalar() or 0
+    estados = {
+        estado.aluno_id: estado
+        for estado in db.query(EstadoFeaturesAluno).join(
+            Aluno, EstadoFeaturesAluno.aluno_id == Aluno.id
+        ).filter(*filtros_aluno)
+    }
+
+    # Check-ins gravados depois do estado com data anterior ao corte dele
+    # (lotes reenviados, datas retroativas): o estado desses alunos é refeito
+    atrasados = {aluno_id for (aluno_id,) in db.query(Checkin.aluno_id).join(
+        EstadoFeaturesAluno, Checkin.aluno_id == EstadoFeaturesAluno.aluno_id
+    ).join(Aluno, Checkin.aluno_id == Aluno.id).filter(
+        *filtros_aluno,
+        Checkin.id > EstadoFeaturesAluno.marca - MARGEM_IDS_ESTADO,
+        Checkin.data < EstadoFeaturesAluno.corte
+    ).distinct()}
+    incrementais = {
+        aluno_id for aluno_id in alunos
+        if aluno_id in estados and aluno_id not in atrasados and estados[aluno_id].corte <= corte
+    }
+
+    # Incrementais: check-ins a partir do corte de cada estado, até a referência
+    recentes = db.query(Checkin.aluno_id, Checkin.data).join(
+        EstadoFeaturesAluno, Checkin.aluno_id == EstadoFeaturesAluno.aluno_id
+    ).join(Aluno, Checkin.aluno_id == Aluno.id).filter(
+        *filtros_aluno,
+        Checkin.data >= EstadoFeaturesAluno.corte,
+        Checkin.data <= referencia
+    ).order_by(Checkin.aluno_id, Checkin.data).yield_per(10000)
+    datas_recentes = {
+        aluno_id: np.array([data for _, data in linhas], dtype="datetime64[us]").astype(np.int64)
+        for aluno_id, linhas in groupby(recentes, key=lambda linha: linha[0])
+        if aluno_id in incrementais
+    }
+    completos = _historicos_completos(db, sorted(set(alunos) - incrementais))
+
+    corte_us = micros(corte)
+    mapeamentos = []
+    novos_estados = []
+    sem_snapshot = 0
+    for aluno_id, (data_matricula, preco) in alunos.items():
+        if aluno_id in incrementais:
+            datas = datas_recentes.get(aluno_id, _VAZIO)
+            anteriores = datas[datas < corte_us]
+            historico = estender_historico(_estado_para_historico(estados[aluno_id]), anteriores)
+            features = calcular_features(datas[datas >= corte_us], data_matricula, preco, referencia, historico)
+        else:
+            datas, arquivado = completos[aluno_id]
+            try:
+                features = calcular_features(datas, data_matricula, preco, referencia, arquivado)
+            except ArquivoNaJanela:
+                # Referência no passado, dentro do período já arquivado
+                sem_snapshot += 1
+                continue
+            if arquivado is not None and arquivado.ultima_us >= corte_us:
+                # Arquivo mais novo que o corte (referência no passado): sem estado
+                mapeamentos.append(_mapeamento(aluno_id, features, referencia, TipoSnapshot.DIARIO, 0))
+                continue
+            historico = estender_historico(arquivado, datas[datas < corte_us])
+        mapeamentos.append(_mapeamento(aluno_id, features, referencia, TipoSnapshot.DIARIO, 0))
+        novos_estados.append(_mapeamento_estado(aluno_id, historico, corte, marca))
+
+    if novos_estados:
+        comando = insert(EstadoFeaturesAluno).values(novos_estados)
+        db.execute(comando.on_conflict_do_update(
+            index_elements=[EstadoFeaturesAluno.aluno_id],
+            set_={coluna: comando.excluded[coluna] for coluna in novos_estados[0] if coluna != "aluno_id"}
+        ))
+
+    # Substitui os da mesma data e descarta os anteriores
+    substituidos = db.query(SnapshotFeatures).filter(
+        SnapshotFeatures.tipo == TipoSnapshot.DIARIO.value,
+        SnapshotFeatures.data_referencia <= referencia
+    )
+    if academia_id is not None:
+        substituidos = substituidos.filter(
+            SnapshotFeatures.aluno_id.in_(db.query(Aluno.id).filter(Aluno.academia_id == academia_id))
+        )
+    substituidos.delete(synchronize_session=False)
+    db.bulk_insert_mappings(SnapshotFeatures, mapeamentos)
+    db.commit()
+
+    print(f"Snapshots diários gerados para {len(mapeamentos)} alunos em {referencia} "
+          f"({len(incrementais)} incrementais, {sem_snapshot} com check-ins arquivados na janela)")
+    return len(mapeamentos)
+
+def _features_sem_snapshot(db: Session, filtro_alunos, desde: datetime = None):
+    """
+    Features dos alunos que ainda não têm o snapshot usado no treino (criados
+    depois do último job diário, ou cancelados sem snapshot), calculadas dos
+    check-ins: ativos agora e cancelados em data_cancelamento.
+    """
+    com_diario = db.query(SnapshotFeatures.id).filter(
+        SnapshotFeatures.aluno_id == Aluno.id, SnapshotFeatures.tipo == TipoSnapshot.DIARIO.value
+    ).exists()
+    com_cancelamento = db.query(SnapshotFeatures.id).filter(
+        SnapshotFeatures.aluno_id == Aluno.id, SnapshotFeatures.tipo == TipoSnapshot.CANCELAMENTO.value
+    ).exists()
+    alunos = db.query(
+        Aluno.id, Aluno.status_matricula, Aluno.data_matricula, Aluno.data_cancelamento, Plano.preco
+    ).outerjoin(Plano, Aluno.plano_id == Plano.id).filter(
+        filtro_alunos,
+        or_(
+            and_(Aluno.status_matricula == StatusMatricula.ATIVA.value, ~com_diario),
+            and_(Aluno.status_matricula == StatusMatricula.CANCELADA.value,
+                 Aluno.data_cancelamento.isnot(None), ~com_cancelamento)
+        )
+    ).order_by(Aluno.id).all()
+    if not alunos:
+        return [], [], []
+
+    historicos = _historicos_completos(db, [aluno.id for aluno in alunos])
+    agora = datetime.utcnow()
+    X, y, recentes = [], [], []
+    for aluno_id, status, data_matricula, data_cancelamento, preco in alunos:
+        cancelado = status == StatusMatricula.CANCELADA.value
+        datas, arquivado = historicos[aluno_id]
+        try:
+            X.append(calcular_features(datas, data_matricula, float(preco) if preco else 0.0,
+                                       data_cancelamento if cancelado else agora, arquivado))
+        except ArquivoNaJanela as e:
+            # Cancelado arquivado antes de ter o snapshot (retenção anterior à trava em
+            # arquivar_antigos): as frequências no cancelamento não existem mais, fica fora do treino
+            metricas.incrementar("treino_alunos_arquivo_na_janela")
+            print(f"Aluno {aluno_id} fora do treino: {e}")
+            continue
+        y.append(1 if cancelado else 0)
+        recentes.append(desde is not None and (
+            data_matricula > desde or (cancelado and data_cancelamento > desde)
+        ))
+    return X, y, recentes
+
+def carregar_matriz_treino(db: Session, desde: datetime = None, filtro_alunos=None):
+    """
+    Monta a matriz de treino a partir dos snapshots: o de cancelamento
+    para os alunos cancelados e o diário (só o mais recente é mantido) para
+    os ativos. Os alunos ainda sem snapshot são calculados dos check-ins.
+    `filtro_alunos` restringe aos alunos de um modelo (por academia).
+
+    Returns:
+        tuple: (X, y, recentes) ou None se não há alunos
+    """
+    if filtro_alunos is None:
+        filtro_alunos = true()
+
+    colunas = [getattr(SnapshotFeatures, coluna) for coluna in COLUNAS_FEATURES]
+    linhas = db.query(
+        *colunas,
+        SnapshotFeatures.cancelado,
+        SnapshotFeatures.tipo,
+        SnapshotFeatures.data_referencia,
+        Aluno.data_matricula
+    ).join(Aluno, SnapshotFeatures.aluno_id == Aluno.id).filter(
+        filtro_alunos,
+        or_(
+            and_(SnapshotFeatures.tipo == TipoSnapshot.CANCELAMENTO.value,
+                 Aluno.status_matricula == StatusMatricula.CANCELADA.value),
+            and_(SnapshotFeatures.tipo == TipoSnapshot.DIARIO.value,
+                 Aluno.status_matricula == StatusMatricula.ATIVA.value)
+        )
+    ).distinct(SnapshotFeatures.aluno_id).order_by(
+        SnapshotFeatures.aluno_id, SnapshotFeatures.data_referencia.desc()
+    ).all()
+    X_faltantes, y_faltantes, recentes_faltantes = _features_sem_snapshot(db, filtro_alunos, desde)
+
+    if not linhas and not X_faltantes:
+        return None
+
+    n = len(COLUNAS_FEATURES)
+    X = np.array([linha[:n] for linha in linhas] + X_faltantes, dtype=np.float64).reshape(-1, n)
+    y = np.array([linha[n] for linha in linhas] + y_faltantes, dtype=np.int64)
+    recentes = np.array([
+        desde is not None and (
+            (tipo == TipoSnapshot.CANCELAMENTO.value and data_referencia > desde)
+            or data_matricula > desde
+        )
+        for tipo, data_referencia, data_matricula in (linha[n + 1:] for linha in linhas)
+    ] + recentes_faltantes, dtype=bool)
+    return X, y, recentes
+
+if __name__ == "__main__":
+    # Permite agendar o job diário via cron: python -m app.services.snapshots
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        gerar_snapshots_cancelamento_pendentes(session)
+        gerar_snapshots_diarios(session)
+    finally:
+        session.close()
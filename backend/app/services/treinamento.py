@@ -0,0 +1,185 @@
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app import models
+from app.database import engine
+from app.replicas import sessao_leitura
+from app.metricas import metricas
+from app.services.churn_predictor import ChurnPredictor, churn_predictor, preditores
+from app.services.snapshots import carregar_matriz_treino
+
+# Controle do treinamento em segundo plano: no máximo um por modelo (o compartilhado
+# ou o próprio de uma academia) e por processo; pedidos feitos durante um treino
+# são agrupados em um único treino seguinte do mesmo modelo
+_lock_treino = threading.Lock()
+_estado_treino = {}
+# Entre processos (os workers do uvicorn e o de eventos), uma trava consultiva
+# no primário por modelo: só um treina, os outros carregam a versão publicada
+TRAVA_TREINO = 4242027
+
+def _ultimo_treino(preditor: ChurnPredictor) -> datetime:
+    criado_em = preditor.meta.get("criado_em") if preditor.is_trained else None
+    return datetime.fromisoformat(criado_em) if criado_em else None
+
+def filtro_alunos_do_modelo(chave):
+    """Alunos usados no treino de um modelo: os da academia ou os das academias sem modelo próprio"""
+    if chave is not None:
+        return models.Aluno.academia_id == chave
+    sem_modelo_proprio = select(models.Academia.id).where(models.Academia.modelo_proprio.is_(False))
+    return models.Aluno.academia_id.in_(sem_modelo_proprio)
+
+def treinar_modelo(db: Session, modo: str = None, chave=None, forcar: bool = False):
+    """
+    Treina um modelo de churn: o próprio da academia `chave` ou, sem chave,
+    o compartilhado pelas academias sem modelo próprio, lendo apenas os
+    alunos dessas academias. Sem `forcar`, o treino só acontece se os dados
+    mudaram o bastante desde o anterior (ChurnPredictor.avaliar_deriva).
+    """
+    try:
+        preditor = preditores.do_modelo(chave)
+        # Outro processo pode ter publicado um treino desde o último deste
+        preditor._recarregar_se_necessario()
+        filtro = filtro_alunos_do_modelo(chave)
+        desde = _ultimo_treino(preditor)
+        descricao = f"academia {chave}" if chave is not None else "compartilhado"
+
+        # Usa a matriz pré-calculada dos snapshots; os alunos ainda sem snapshot são calculados dos check-ins
+        dados = carregar_matriz_treino(db, desde=desde, filtro_alunos=filtro)
+        if dados is None or len(dados[0]) < 2:
+            print(f"Dados insuficientes para treinar o modelo ({descricao})")
+            return False
+        X, y, recentes = dados
+
+        if len(set(y)) > 1:
+            decisao = preditor.avaliar_deriva(X, y, recentes)
+            metricas.incrementar("treinos_executados" if decisao["retreinar"] or forcar else "treinos_ignorados")
+            if not decisao["retreinar"] and not forcar:
+                print(f"Treino do modelo ({descricao}) ignorado: {decisao}")
+                return False
+            print(f"Treino do modelo ({descricao}) {'necessário' if decisao['retreinar'] else 'forçado'}: {decisao}")
+            print(f"Treinando modelo ({descricao}) com {len(X)} amostras ({sum(y)} churns, {sum(recentes)} recentes)")
+            # Os riscos não são recalculados aqui: a nova versão põe todos os alunos
+            # deste modelo no conjunto da próxima pontuação incremental do worker
+            return preditor.train(X, y, recentes=recentes, modo=modo)
+        return False
+    except Exception as e:
+        print(f"Erro ao treinar modelo: {e}")
+        return False
+
+def _treinar_com_trava(chave):
+    """Treina o modelo se nenhum outro processo o estiver treinando"""
+    # Trava de sessão em autocommit: não deixa uma transação aberta durante o treino
+    # e cai com a conexão se o processo morrer
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexao:
+        if not conexao.execute(select(func.pg_try_advisory_lock(TRAVA_TREINO, chave or 0))).scalar():
+            metricas.incrementar("treinos_em_outro_processo")
+            print(f"Modelo {chave if chave is not None else 'compartilhado'} já em treino em outro processo")
+            return
+        try:
+            # O treino só lê do banco: pode usar uma réplica
+            db = sessao_leitura()
+            try:
+                treinar_modelo(db, chave=chave)
+            finally:
+                db.close()
+        finally:
+            conexao.execute(select(func.pg_advisory_unlock(TRAVA_TREINO, chave or 0)))
+
+def _executar_treinamentos(chave):
+    while True:
+        try:
+            _treinar_com_trava(chave)
+        except Exception as e:
+            print(f"Erro ao treinar modelo: {e}")
+
+        with _lock_treino:
+            estado = _estado_treino[chave]
+            if not estado["pendente"]:
+                del _estado_treino[chave]
+                return
+            estado["pendente"] = False
+
+def agendar_treinamento(chave=None):
+    """
+    Dispara o treinamento do modelo `chave` (None = compartilhado) fora da
+    thread da requisição. Se já houver um treino desse modelo em andamento,
+    agenda apenas mais um ao final dele; modelos diferentes treinam em paralelo.
+    """
+    with _lock_treino:
+        if chave in _estado_treino:
+            _estado_treino[chave]["pendente"] = True
+            return
+        _estado_treino[chave] = {"pendente": False}
+
+    nome = f"treino-churn-{chave}" if chave is not None else "treino-churn"
+    threading.Thread(target=_executar_treinamentos, args=(chave,), name=nome, daemon=True).start()
+
+def comparar_modos(X, y, recentes, n_arvores_incremento: int = 20, seed: int = 42) -> dict:
+    """
+    Compara tempo de ajuste e qualidade (em um conjunto de validação)
+    entre o treino completo em um núcleo, o completo paralelo e o incremental.
+
+    O incremental parte de um modelo ajustado só com as amostras antigas
+    e adiciona árvores ajustadas na janela recente, como em produção.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, brier_score_loss, roc_auc_score
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+    from app.services.churn_predictor import _pesos_classes
+
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y)
+    recentes = np.asarray(recentes, dtype=bool)
+
+    X_treino, X_teste, y_treino, y_teste, rec_treino, _ = train_test_split(
+        X, y, recentes, test_size=0.25, stratify=y, random_state=seed
+    )
+    scaler = StandardScaler().fit(X_treino)
+    X_treino = scaler.transform(X_treino)
+    X_teste = scaler.transform(X_teste)
+
+    base = churn_predictor._novo_modelo().get_params()
+
+    def avaliar(modelo, tempo):
+        proba = modelo.predict_proba(X_teste)[:, 1]
+        resultado = {
+            "tempo_s": round(tempo, 4),
+            "arvores": len(modelo.estimators_),
+            "acuracia": round(float(accuracy_score(y_teste, proba >= 0.5)), 4),
+            "brier": round(float(brier_score_loss(y_teste, proba)), 4),
+        }
+        if len(set(y_teste)) > 1:
+            resultado["roc_auc"] = round(float(roc_auc_score(y_teste, proba)), 4)
+        return resultado
+
+    relatorio = {"amostras_treino": int(len(y_treino)), "amostras_teste": int(len(y_teste)),
+                 "recentes": int(rec_treino.sum())}
+
+    for nome, n_jobs in (("completo_1_nucleo", 1), ("completo_paralelo", -1)):
+        modelo = RandomForestClassifier(**{**base, "n_jobs": n_jobs,
+                                           "class_weight": _pesos_classes(y_treino)})
+        inicio = time.perf_counter()
+        modelo.fit(X_treino, y_treino)
+        relatorio[nome] = avaliar(modelo, time.perf_counter() - inicio)
+
+    antigos = ~rec_treino
+    relatorio["incremental"] = None
+    if rec_treino.any() and len(set(y_treino[antigos])) > 1:
+        X_janela, y_janela = churn_predictor._janela_incremental(X_treino, y_treino, rec_treino)
+        if len(set(y_janela)) > 1:
+            modelo = RandomForestClassifier(**{**base, "class_weight": _pesos_classes(y_treino[antigos])})
+            modelo.fit(X_treino[antigos], y_treino[antigos])
+            modelo.set_params(
+                warm_start=True,
+                n_estimators=modelo.n_estimators + n_arvores_incremento,
+                class_weight=_pesos_classes(y_janela)
+            )
+            inicio = time.perf_counter()
+            modelo.fit(X_janela, y_janela)
+            relatorio["incremental"] = avaliar(modelo, time.perf_counter() - inicio)
+
+    return relatorio
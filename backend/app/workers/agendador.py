@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Tuple
+from sqlalchemy import or_, update
+from sqlalchemy.dialects.postgresql import insert
+from app.database import SessionLocal
+from app.models import ExecucaoAgendada
+
+# Tarefa: função (desde, agora) chamada com o instante da execução anterior e o atual
+Tarefa = Callable[[datetime, datetime], object]
+
+INTERVALO_VERIFICACAO_S = 30
+# Tempo máximo de uma execução: depois dele, a reserva vence e outro worker pode executar a tarefa
+DURACAO_RESERVA = timedelta(minutes=int(os.getenv("AGENDADOR_RESERVA_MIN", "120")))
+
+def proxima_execucao(expressao: str, apos: datetime) -> datetime:
+    """
+    Próximo instante da agenda depois de `apos` (UTC). Aceita "HH:MM"
+    (todo dia nesse horário) ou "*/N" (a cada N minutos).
+    """
+    if expressao.startswith("*/"):
+        return apos + timedelta(minutes=int(expressao[2:]))
+    hora, minuto = (int(parte) for parte in expressao.split(":"))
+    candidato = apos.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+    return candidato if candidato > apos else candidato + timedelta(days=1)
+
+class Agendador:
+    """
+    Executa tarefas periódicas dentro do worker. A última execução de cada
+    tarefa fica em execucoes_agendadas. Antes de rodar, o worker reserva a
+    tarefa por DURACAO_RESERVA (um UPDATE condicional, confirmado na hora):
+    com vários workers, cada horário roda uma vez só, sem transação aberta
+    durante a tarefa, e um worker que morreu no meio libera a tarefa quando a
+    reserva vence. Um worker reiniciado retoma a agenda de onde parou.
+    """
+
+    def __init__(self, tarefas: Dict[str, Tuple[str, Tarefa]]):
+        self.tarefas = tarefas
+        self._thread = None
+
+    def _reservar(self, db, nome: str, ultima_execucao: datetime) -> bool:
+        """Reserva a tarefa se ninguém a reservou (ou a reserva venceu) desde a leitura"""
+        agora = datetime.utcnow()
+        reservada = db.execute(update(ExecucaoAgendada).where(
+            ExecucaoAgendada.tarefa == nome,
+            ExecucaoAgendada.ultima_execucao == ultima_execucao,
+            or_(ExecucaoAgendada.reservada_ate.is_(None), ExecucaoAgendada.reservada_ate < agora)
+        ).values(reservada_ate=agora + DURACAO_RESERVA)).rowcount
+        db.commit()
+        return reservada == 1
+
+    def executar(self, nome: str, agora: datetime = None, forcar: bool = False) -> bool:
+        """Executa a tarefa se estiver no horário (ou se `forcar`); devolve se executou"""
+        expressao, funcao = self.tarefas[nome]
+        agora = agora or datetime.utcnow()
+        db = SessionLocal()
+        try:
+            # Na primeira vez, a agenda começa agora: a tarefa roda no próximo horário
+            db.execute(insert(ExecucaoAgendada).values(tarefa=nome, ultima_execucao=agora).on_conflict_do_nothing())
+            db.commit()
+
+            ultima_execucao, = db.query(ExecucaoAgendada.ultima_execucao).filter(ExecucaoAgendada.tarefa == nome).one()
+            if not forcar and agora < proxima_execucao(expressao, ultima_execucao):
+                return False
+            if not self._reservar(db, nome, ultima_execucao):
+                return False  # Outro worker está executando (ou acabou de executar)
+
+            inicio = time.perf_counter()
+            valores = {"reservada_ate": None}
+            try:
+                resultado = funcao(ultima_execucao, agora)
+            except Exception as e:
+                # A execução anterior continua valendo: a tarefa é tentada de novo na próxima verificação
+                print(f"Erro na tarefa agendada {nome}: {e}")
+                valores["resultado"] = f"erro: {e}"[:500]
+            else:
+                valores.update(ultima_execucao=agora, resultado=str(resultado)[:500])
+                print(f"Tarefa agendada {nome} concluída em {time.perf_counter() - inicio:.1f}s")
+            db.execute(update(ExecucaoAgendada).where(ExecucaoAgendada.tarefa == nome).values(**valores))
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+    def _executar(self):
+        while True:
+            for nome in self.tarefas:
+                try:
+                    self.executar(nome)
+                except Exception as e:
+                    print(f"Erro no agendador ({nome}): {e}")
+            time.sleep(INTERVALO_VERIFICACAO_S)
+
+    def iniciar(self):
+        if self._thread is None:
+            agenda = ", ".join(f"{nome} ({expressao})" for nome, (expressao, _) in self.tarefas.items())
+            print(f"Agendador iniciado: {agenda}")
+            self._thread = threading.Thread(target=self._executar, name="agendador", daemon=True)
+            self._thread.start()
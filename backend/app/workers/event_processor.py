@@ -5,7 +5,7 @@ import sys
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine, func
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
@@ -15,134 +15,172 @@ load_dotenv()
 # Adicionar o diretório raiz ao PYTHONPATH
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
-from app.models import Aluno, Checkin, Plano
+from app.models import Aluno, Plano
 from app.database import SessionLocal
-from app.ml.churn_predictor import churn_predictor
+from app.replicas import sessao_leitura
+from app.etags import compactar_versoes
+from app.metricas import metricas
+from app.services.frequencia import calcular_frequencias
+from app.mensagens import decodificar_lote_checkins, filas_eventos, para_datetimes
+from app.services.checkins import gravar_lote
+from app.services.indice_checkins import indice_checkins
+from app.services.pontuacao import pontuar_alterados, pontuar_todos
+from app.services.retencao import executar_retencao
+from app.services.snapshots import gerar_snapshots_cancelamento_pendentes, gerar_snapshots_diarios
+from app.workers.agendador import Agendador
 
 def process_checkin_batch(ch, method, properties, body):
     """
-    Processa um lote de checkins recebidos via RabbitMQ
+    Processa um lote de checkins recebidos via RabbitMQ, em JSON ou no
+    formato colunar (escolhido pelo content_type da mensagem)
     """
+    session = None
     try:
-        data = json.loads(body)
-        checkins = data.get('checkins', [])
+        aluno_ids, datas_us = decodificar_lote_checkins(body, getattr(properties, 'content_type', None))
         
-        if not checkins:
+        if not len(aluno_ids):
             print("Nenhum checkin recebido para processamento")
             return
         
         session = SessionLocal()
         
-        for checkin_data in checkins:
-            aluno_id = checkin_data.get('aluno_id')
-            data_checkin = datetime.fromisoformat(checkin_data.get('data'))
-            
-            # Verifica se o aluno existe
-            aluno = session.query(Aluno).filter(Aluno.id == aluno_id).first()
-            if not aluno:
-                print(f"Aluno com ID {aluno_id} não encontrado")
-                continue
-            
-            # Cria o checkin
-            novo_checkin = Checkin(
-                aluno_id=aluno_id,
-                data=data_checkin
-            )
-            
-            session.add(novo_checkin)
+        # Insere o lote de uma vez, com o risco de cada aluno e os eventos do outbox
+        inseridos = gravar_lote(session, list(zip(aluno_ids.tolist(), para_datetimes(datas_us))))
         
         session.commit()
-        print(f"Processados {len(checkins)} checkins com sucesso")
+        print(f"Processados {len(inseridos)} checkins com sucesso")
         
     except Exception as e:
         print(f"Erro ao processar lote de checkins: {str(e)}")
     finally:
-        session.close()
+        if session is not None:
+            session.close()
 
-def process_daily_report(ch, method, properties, body):
+def gerar_relatorio_diario(data_referencia: datetime, academia_id: int = None) -> int:
     """
-    Gera relatório diário de frequência dos alunos
+    Gera relatório diário de frequência dos alunos e os snapshots de features
     """
+    # Define o período de análise (últimos 30 dias)
+    data_inicio = data_referencia - timedelta(days=30)
+    
+    # O relatório só lê: pode vir de uma réplica
+    session = sessao_leitura()
     try:
-        data = json.loads(body)
-        data_referencia = datetime.fromisoformat(data.get('data_referencia'))
-        
-        # Define o período de análise (últimos 30 dias)
-        data_inicio = data_referencia - timedelta(days=30)
         
-        session = SessionLocal()
+        # Consulta os alunos de todas as academias ou só da academia pedida
+        consulta = session.query(Aluno.id, Aluno.academia_id, Aluno.nome)
+        if academia_id is not None:
+            consulta = consulta.filter(Aluno.academia_id == academia_id)
+        alunos = consulta.all()
         
-        # Consulta todos os alunos
-        alunos = session.query(Aluno).all()
+        # Conta checkins e dias presentes de todos os alunos em uma única consulta
+        frequencias = calcular_frequencias(
+            session,
+            [aluno.id for aluno in alunos],
+            [(data_inicio, data_referencia, 30)]
+        )
         
         relatorio = []
         
         for aluno in alunos:
-            # Conta checkins no período
-            total_checkins = session.query(func.count(Checkin.id)).filter(
-                Checkin.aluno_id == aluno.id,
-                Checkin.data >= data_inicio,
-                Checkin.data <= data_referencia
-            ).scalar()
-            
-            # Calcula frequência
-            frequencia = total_checkins / 30.0  # 30 dias
-            
+            frequencia = frequencias[aluno.id]
             relatorio.append({
                 'aluno_id': aluno.id,
+                'academia_id': aluno.academia_id,
                 'nome': aluno.nome,
-                'total_checkins': total_checkins,
-                'frequencia': frequencia,
+                'total_checkins': frequencia['janelas'][0]['total_checkins'],
+                'dias_presentes': frequencia['dias_presentes'],
+                'frequencia': frequencia['percentual'],
                 'periodo': f"{data_inicio.date()} a {data_referencia.date()}"
             })
         
         # Salva o relatório (aqui você pode implementar a lógica para salvar em arquivo ou banco)
         print(f"Relatório diário gerado para {len(relatorio)} alunos")
         print(json.dumps(relatorio, indent=2, default=str))
-        
+    finally:
+        session.close()
+    
+    # Registra o snapshot diário de features usado no treinamento. Lê e grava
+    # em seguida, então usa o primário para não duplicar snapshots já gravados
+    snapshots = SessionLocal()
+    try:
+        gerar_snapshots_cancelamento_pendentes(snapshots)
+        gerar_snapshots_diarios(snapshots, data_referencia, academia_id)
+    finally:
+        snapshots.close()
+    return len(relatorio)
+
+def process_daily_report(ch, method, properties, body):
+    """
+    Gera relatório diário de frequência dos alunos sob demanda
+    """
+    try:
+        data = json.loads(body)
+        gerar_relatorio_diario(datetime.fromisoformat(data.get('data_referencia')), data.get('academia_id'))
     except Exception as e:
         print(f"Erro ao gerar relatório diário: {str(e)}")
+
+def pontuar_incremental(desde: datetime, agora: datetime) -> dict:
+    """Recalcula o risco só dos alunos alterados desde a execução anterior"""
+    session = SessionLocal()
+    try:
+        return pontuar_alterados(session, desde, agora)
     finally:
         session.close()
 
+def arquivar_checkins(agora: datetime) -> dict:
+    """Arquiva os check-ins fora do horizonte de retenção e os de cancelados antigos"""
+    session = SessionLocal()
+    try:
+        return executar_retencao(session, agora)
+    finally:
+        session.close()
+
+def compactar_versoes_recursos() -> int:
+    """Soma as alterações registradas pelos gatilhos nos contadores dos ETags"""
+    session = SessionLocal()
+    try:
+        return compactar_versoes(session)
+    finally:
+        session.close()
+
+# Horários (UTC) das tarefas do worker: "HH:MM" diário ou "*/N" a cada N minutos.
+# O relatório grava os snapshots diários antes da pontuação da madrugada, e a
+# retenção roda depois das duas.
+AGENDA_RELATORIO_DIARIO = os.getenv("AGENDA_RELATORIO_DIARIO", "02:00")
+AGENDA_PONTUACAO = os.getenv("AGENDA_PONTUACAO", "03:00")
+AGENDA_RETENCAO = os.getenv("AGENDA_RETENCAO", "04:00")
+AGENDA_VERSOES = os.getenv("AGENDA_VERSOES", "*/1")
+
+agendador = Agendador({
+    "relatorio_diario": (AGENDA_RELATORIO_DIARIO, lambda desde, agora: gerar_relatorio_diario(agora)),
+    "pontuacao": (AGENDA_PONTUACAO, pontuar_incremental),
+    "retencao_checkins": (AGENDA_RETENCAO, lambda desde, agora: arquivar_checkins(agora)),
+    "compactar_versoes": (AGENDA_VERSOES, lambda desde, agora: compactar_versoes_recursos()),
+})
+
 def process_churn_analysis(ch, method, properties, body):
     """
-    Atualiza o modelo de previsão de churn para todos os alunos
+    Atualiza o risco de churn sob demanda: só dos alunos alterados desde a
+    última pontuação ou, com tipo "analise_completa", de todos os ativos
     """
+    session = None
     try:
         data = json.loads(body)
-        tipo_analise = data.get('tipo', 'analise_completa')
-        
-        session = SessionLocal()
-        
-        # Obtém todos os alunos
-        alunos = session.query(Aluno).all()
+        tipo_analise = data.get('tipo', 'incremental')
         
-        for aluno in alunos:
-            # Obtém dados do aluno para previsão
-            dados_aluno = {
-                'aluno_id': aluno.id,
-                'dias_matricula': (datetime.now() - aluno.data_matricula).days,
-                'frequencia': session.query(func.count(Checkin.id)).filter(
-                    Checkin.aluno_id == aluno.id,
-                    Checkin.data >= datetime.now() - timedelta(days=30)
-                ).scalar() / 30.0
-            }
-            
-            # Faz a previsão de churn
-            risco_churn = churn_predictor.predict(dados_aluno)
-            
-            # Atualiza o risco de churn do aluno
-            aluno.risco_churn = risco_churn
-            session.add(aluno)
-        
-        session.commit()
-        print(f"Análise de churn concluída para {len(alunos)} alunos")
+        if tipo_analise == 'analise_completa':
+            session = SessionLocal()
+            pontuar_todos(session)
+        else:
+            # Avança a mesma marca da pontuação agendada
+            agendador.executar('pontuacao', forcar=True)
         
     except Exception as e:
         print(f"Erro ao realizar análise de churn: {str(e)}")
     finally:
-        session.close()
+        if session is not None:
+            session.close()
 
 def process_batch(ch, method, properties, body):
     """
@@ -164,6 +202,22 @@ def process_batch(ch, method, properties, body):
     except Exception as e:
         print(f"Erro ao processar operação em lote: {str(e)}")
 
+def process_evento(ch, method, properties, body):
+    """
+    Consome os eventos de domínio publicados pelo relay do outbox
+    (gym.eventos.<shard>.<academia_id>.<tipo>). A entrega é ao menos uma vez:
+    o message_id é o id do evento e permite descartar repetições. Por
+    enquanto só valida e conta por tipo (sem log por evento: no pico das
+    catracas são centenas por segundo).
+    """
+    try:
+        json.loads(body)
+        metricas.incrementar(f"eventos_{method.routing_key.rsplit('.', 1)[-1]}_consumidos")
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+    except Exception as e:
+        print(f"Erro ao processar evento: {str(e)}")
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+
 def main():
     url = os.getenv('RABBITMQ_URL')
     if not url:
@@ -177,7 +231,15 @@ def main():
     channel.basic_consume(queue='daily_reports', on_message_callback=process_daily_report)
     channel.basic_consume(queue='churn_analysis', on_message_callback=process_churn_analysis)
     channel.basic_consume(queue='batch_processing', on_message_callback=process_batch)
+    # Shards de eventos atendidos por este worker (WORKER_SHARDS=0,2 por exemplo; padrão: todos)
+    shards = os.getenv('WORKER_SHARDS')
+    filas = [f"eventos.{shard.strip()}" for shard in shards.split(",")] if shards else list(filas_eventos())
+    for fila in filas:
+        channel.basic_consume(queue=fila, on_message_callback=process_evento)
     
+    if indice_checkins is not None:
+        indice_checkins.iniciar()
+    agendador.iniciar()
     print("Iniciando processamento de eventos. Para sair pressione CTRL+C")
     channel.start_consuming()
 
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Adicionar o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.database import SessionLocal
+from app.rabbitmq import RabbitMQClient
+from app.services.outbox import limpar_publicados, publicar_pendentes
+
+LOTE = int(os.getenv("OUTBOX_LOTE", "500"))
+INTERVALO_MS = int(os.getenv("OUTBOX_INTERVALO_MS", "500"))
+RETENCAO_DIAS = int(os.getenv("OUTBOX_RETENCAO_DIAS", "7"))
+LIMPEZA_A_CADA_S = 3600
+
+def main():
+    """
+    Relay do outbox: lê os eventos pendentes em lotes e publica no
+    exchange gym_events, com um commit transacional do broker por lote
+    (os eventos só são marcados depois dele). Enquanto houver lotes
+    cheios, continua sem esperar; sem pendentes, dorme INTERVALO_MS.
+    """
+    cliente = RabbitMQClient(transacional=True)
+
+    def publicar(eventos):
+        return cliente.publish_confirmado([
+            (str(evento.id), evento.routing_key, {"evento_id": evento.id, **evento.payload})
+            for evento in eventos
+        ])
+
+    print(f"Relay do outbox iniciado (lotes de {LOTE}). Para sair pressione CTRL+C")
+    ultima_limpeza = 0.0
+    while True:
+        db = SessionLocal()
+        try:
+            inicio = time.perf_counter()
+            publicados = publicar_pendentes(db, publicar, LOTE)
+            if publicados:
+                print(f"Publicados {publicados} eventos em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+            if time.monotonic() - ultima_limpeza > LIMPEZA_A_CADA_S:
+                removidos = limpar_publicados(db, RETENCAO_DIAS)
+                if removidos:
+                    print(f"Removidos {removidos} eventos publicados há mais de {RETENCAO_DIAS} dias")
+                ultima_limpeza = time.monotonic()
+        except Exception as e:
+            print(f"Erro no relay do outbox: {str(e)}")
+            db.rollback()
+            publicados = 0
+        finally:
+            db.close()
+
+        if publicados < LOTE:
+            time.sleep(INTERVALO_MS / 1000.0)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Encerrando relay...")
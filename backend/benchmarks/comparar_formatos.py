@@ -0,0 +1,91 @@
+"""
+Compara os formatos de mensagem para lotes de check-ins (JSON e colunar).
+
+Mede o tamanho do corpo, o tempo de codificação e o de decodificação até
+a lista de (aluno_id, datetime) que o worker grava no banco. Para o JSON,
+mede também a decodificação antiga, com datetime.fromisoformat por linha.
+
+Uso:
+    python -m benchmarks.comparar_formatos
+    python -m benchmarks.comparar_formatos --checkins 1000000 --repeticoes 3
+"""
+import argparse
+import json
+import time
+import zlib
+from datetime import datetime, timedelta
+import numpy as np
+from app.mensagens import (
+    CONTENT_TYPE_CHECKINS, CONTENT_TYPE_JSON, codificar_lote_checkins,
+    decodificar_lote_checkins, para_datetimes
+)
+
+
+def lote_sintetico(n: int, alunos: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    inicio = datetime(2024, 1, 1)
+    segundos = np.sort(rng.integers(0, 90 * 86400, n))
+    aluno_ids = rng.integers(1, alunos + 1, n)
+    return [
+        {"aluno_id": int(aluno_id), "data": inicio + timedelta(seconds=int(s), microseconds=int(s) % 1000)}
+        for aluno_id, s in zip(aluno_ids, segundos)
+    ]
+
+
+def cronometrar(funcao, repeticoes: int):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return resultado, round(melhor * 1000, 2)
+
+
+def decodificar_json_por_linha(corpo: bytes):
+    """Decodificação usada pelo worker antes do formato colunar"""
+    return [
+        (c["aluno_id"], datetime.fromisoformat(c["data"]))
+        for c in json.loads(corpo)["checkins"]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkins", type=int, default=200000)
+    parser.add_argument("--alunos", type=int, default=5000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    checkins = lote_sintetico(args.checkins, args.alunos)
+    relatorio = {"checkins": args.checkins}
+
+    for formato, content_type in (("json", CONTENT_TYPE_JSON), ("colunar", CONTENT_TYPE_CHECKINS)):
+        (corpo, _), tempo_codificar = cronometrar(
+            lambda: codificar_lote_checkins(checkins, formato), args.repeticoes
+        )
+
+        def decodificar():
+            aluno_ids, datas_us = decodificar_lote_checkins(corpo, content_type)
+            return list(zip(aluno_ids.tolist(), para_datetimes(datas_us)))
+
+        entradas, tempo_decodificar = cronometrar(decodificar, args.repeticoes)
+        assert entradas == [(c["aluno_id"], c["data"]) for c in checkins]
+
+        relatorio[formato] = {
+            "bytes": len(corpo),
+            "bytes_por_checkin": round(len(corpo) / args.checkins, 2),
+            "bytes_zlib": len(zlib.compress(corpo)),
+            "codificar_ms": tempo_codificar,
+            "decodificar_ms": tempo_decodificar,
+        }
+
+    corpo_json, _ = codificar_lote_checkins(checkins, "json")
+    _, relatorio["json"]["decodificar_por_linha_ms"] = cronometrar(
+        lambda: decodificar_json_por_linha(corpo_json), args.repeticoes
+    )
+
+    print(json.dumps(relatorio, indent=2))
+
+
+if __name__ == "__main__":
+    main()
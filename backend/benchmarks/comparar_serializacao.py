@@ -0,0 +1,111 @@
+"""
+Compara o custo por linha da listagem de alunos pelo caminho ORM + Pydantic
+(response_model com orm_mode) e pelo caminho enxuto (tuplas de colunas
+serializadas direto para JSON).
+
+Uso:
+    python -m benchmarks.comparar_serializacao                  # linhas sintéticas
+    python -m benchmarks.comparar_serializacao --linhas 50000
+    python -m benchmarks.comparar_serializacao --banco          # inclui a consulta ao banco configurado no .env
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app import models, schemas
+from app.serializacao import campos, orjson, para_json
+
+CAMPOS_MODELO = campos(schemas.Aluno)
+
+
+def linhas_sinteticas(n: int):
+    """Tuplas na ordem dos campos do schema, como as da consulta de colunas"""
+    inicio = datetime(2024, 1, 1, 6, 30)
+    linhas = []
+    for i in range(1, n + 1):
+        cancelado = i % 5 == 0
+        aluno = {
+            "id": i,
+            "nome": f"Aluno {i}",
+            "email": f"aluno{i}@academia.com",
+            "telefone": "11999990000",
+            "plano_id": 1 + i % 3,
+            "nome_plano": ("Básico", "Premium", "VIP")[i % 3],
+            "risco_churn": (i % 97) / 100.0,
+            "status_matricula": "CANCELADA" if cancelado else "ATIVA",
+            "data_matricula": inicio + timedelta(minutes=i),
+            "data_cancelamento": inicio + timedelta(days=30, minutes=i) if cancelado else None,
+        }
+        linhas.append(tuple(aluno[campo] for campo in CAMPOS_MODELO))
+    return linhas
+
+
+def caminho_orm(linhas):
+    """O que o FastAPI faz com response_model=List[schemas.Aluno] e objetos ORM"""
+    objetos = [models.Aluno(**dict(zip(CAMPOS_MODELO, linha))) for linha in linhas]
+    validados = [schemas.Aluno.from_orm(objeto) for objeto in objetos]
+    return JSONResponse(content=jsonable_encoder(validados)).body
+
+
+def caminho_enxuto(linhas):
+    return para_json([dict(zip(CAMPOS_MODELO, linha)) for linha in linhas])
+
+
+def cronometrar(funcao, linhas, repeticoes: int):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(linhas)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return resultado, melhor
+
+
+def consultas_do_banco(repeticoes: int) -> dict:
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        colunas = [getattr(models.Aluno, campo) for campo in CAMPOS_MODELO]
+        _, tempo_orm = cronometrar(lambda _: db.query(models.Aluno).all(), None, repeticoes)
+        linhas, tempo_colunas = cronometrar(lambda _: db.query(*colunas).all(), None, repeticoes)
+        db.expunge_all()
+        return {
+            "linhas": len(linhas),
+            "consulta_orm_ms": round(tempo_orm * 1000, 2),
+            "consulta_colunas_ms": round(tempo_colunas * 1000, 2),
+        }, linhas
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=20000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--banco", action="store_true", help="Usa os alunos do banco e mede também as consultas")
+    args = parser.parse_args()
+
+    relatorio = {"encoder": "orjson" if orjson is not None else "json"}
+    if args.banco:
+        relatorio["banco"], linhas = consultas_do_banco(args.repeticoes)
+    else:
+        linhas = linhas_sinteticas(args.linhas)
+
+    corpo_orm, tempo_orm = cronometrar(caminho_orm, linhas, args.repeticoes)
+    corpo_enxuto, tempo_enxuto = cronometrar(caminho_enxuto, linhas, args.repeticoes)
+    assert json.loads(corpo_orm) == json.loads(corpo_enxuto), "Os dois caminhos devem gerar o mesmo JSON"
+
+    n = max(len(linhas), 1)
+    relatorio.update({
+        "linhas": len(linhas),
+        "orm_pydantic": {"total_ms": round(tempo_orm * 1000, 2), "us_por_linha": round(tempo_orm / n * 1e6, 2)},
+        "enxuto": {"total_ms": round(tempo_enxuto * 1000, 2), "us_por_linha": round(tempo_enxuto / n * 1e6, 2)},
+        "bytes": len(corpo_enxuto),
+    })
+    print(json.dumps(relatorio, indent=2))
+
+
+if __name__ == "__main__":
+    main()
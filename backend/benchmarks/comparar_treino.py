@@ -0,0 +1,70 @@
+"""
+Compara os modos de treinamento do modelo de churn.
+
+Uso:
+    python -m benchmarks.comparar_treino                 # dados sintéticos
+    python -m benchmarks.comparar_treino --banco         # matriz de treino do banco configurado no .env
+    python -m benchmarks.comparar_treino --banco --academia 3   # modelo próprio da academia 3
+    python -m benchmarks.comparar_treino --amostras 50000 --fracao-recente 0.05
+"""
+import argparse
+import json
+import numpy as np
+
+
+def dados_sinteticos(n: int, fracao_recente: float, seed: int = 42):
+    """Gera features no mesmo formato de ChurnPredictor._extract_features"""
+    rng = np.random.default_rng(seed)
+    freq_semanal = rng.beta(2, 4, n)
+    freq_mensal = np.clip(freq_semanal + rng.normal(0, 0.05, n), 0, 1)
+    dias_ultimo = np.clip(rng.exponential(10, n), 0, 365)
+    variancia = np.clip(rng.gamma(2, 5, n), 0, 100)
+    tempo_matricula = rng.integers(1, 1500, n).astype(float)
+    media_vida = np.clip(freq_mensal * rng.uniform(0.6, 1.2, n), 0, 1)
+    preco = rng.choice([99.9, 199.9, 299.9], n)
+    X = np.column_stack([freq_semanal, freq_mensal, dias_ultimo, variancia,
+                         tempo_matricula, media_vida, preco])
+    logito = -2.0 + 0.08 * dias_ultimo - 4.0 * freq_mensal + 0.02 * variancia
+    y = (rng.random(n) < 1 / (1 + np.exp(-logito))).astype(int)
+    recentes = rng.random(n) < fracao_recente
+    return X, y, recentes
+
+
+def dados_do_banco(chave=None):
+    """Mesma matriz do treino em produção: snapshots e, para os alunos sem snapshot, check-ins e resumos"""
+    from app.replicas import sessao_leitura
+    from app.services.churn_predictor import preditores
+    from app.services.snapshots import carregar_matriz_treino
+    from app.services.treinamento import _ultimo_treino, filtro_alunos_do_modelo
+
+    db = sessao_leitura()
+    try:
+        dados = carregar_matriz_treino(db, desde=_ultimo_treino(preditores.do_modelo(chave)),
+                                       filtro_alunos=filtro_alunos_do_modelo(chave))
+    finally:
+        db.close()
+    if dados is None:
+        raise SystemExit("Nenhum aluno para treinar este modelo")
+    return dados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--banco", action="store_true", help="Usa os alunos do banco em vez de dados sintéticos")
+    parser.add_argument("--academia", type=int, help="Com --banco, o modelo próprio da academia (padrão: compartilhado)")
+    parser.add_argument("--amostras", type=int, default=20000)
+    parser.add_argument("--fracao-recente", type=float, default=0.05)
+    args = parser.parse_args()
+
+    from app.services.treinamento import comparar_modos
+
+    if args.banco:
+        X, y, recentes = dados_do_banco(args.academia)
+    else:
+        X, y, recentes = dados_sinteticos(args.amostras, args.fracao_recente)
+
+    print(json.dumps(comparar_modos(X, y, recentes), indent=2))
+
+
+if __name__ == "__main__":
+    main()
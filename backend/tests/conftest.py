@@ -0,0 +1,95 @@
+import os
+import uuid
+import pytest
+from dotenv import load_dotenv
+
+# Mesma configuração da aplicação: variáveis de ambiente ou backend/.env
+load_dotenv()
+
+# O pacote app importa app.database, que exige a configuração do banco. Sem ela,
+# usa a de um banco local de testes: o engine só conecta no primeiro uso, então
+# os testes sem banco rodam sempre e os que usam a fixture db são pulados
+PADROES_BANCO = {
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_DB": "iagym_testes",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+}
+for variavel, valor in PADROES_BANCO.items():
+    os.environ.setdefault(variavel, valor)
+
+
+@pytest.fixture(scope="session")
+def engine_testes():
+    from sqlalchemy.exc import OperationalError
+    from app.database import engine
+    from app.migracoes import migrar
+
+    try:
+        engine.connect().close()
+    except OperationalError as e:
+        pytest.skip(f"Banco de dados indisponível: {str(e).splitlines()[0]}")
+    migrar(engine)
+    return engine
+
+
+@pytest.fixture
+def db(engine_testes):
+    from app.database import SessionLocal
+
+    sessao = SessionLocal()
+    try:
+        yield sessao
+    finally:
+        sessao.rollback()
+        sessao.close()
+
+
+@pytest.fixture
+def academia(db):
+    """Academia nova, com um plano; apaga ao final tudo o que foi criado nela"""
+    from app.mensagens import rota_evento
+    from app.models import (Academia, AlteracaoRecurso, Aluno, ContagemCheckinPendente, EventoOutbox, Plano,
+                            ResumoCheckinHora, ResumoDashboard, VersaoRecurso)
+    from app.services.retencao import excluir_alunos
+
+    nova = Academia(nome=f"teste-{uuid.uuid4().hex[:12]}")
+    db.add(nova)
+    db.flush()
+    db.add(Plano(academia_id=nova.id, nome="Básico", preco=100.0, descricao="Plano de teste"))
+    db.commit()
+    academia_id = nova.id
+    yield nova
+
+    db.rollback()
+    excluir_alunos(db, [aluno_id for (aluno_id,) in db.query(Aluno.id).filter(Aluno.academia_id == academia_id)])
+    # As exclusões em alunos e planos registram alterações de versão: as versões saem por último
+    for modelo in (Plano, ContagemCheckinPendente, ResumoCheckinHora, ResumoDashboard, VersaoRecurso,
+                   AlteracaoRecurso):
+        db.query(modelo).filter(modelo.academia_id == academia_id).delete(synchronize_session=False)
+    db.query(EventoOutbox).filter(
+        EventoOutbox.routing_key.like(rota_evento("%", academia_id))
+    ).delete(synchronize_session=False)
+    db.query(Academia).filter(Academia.id == academia_id).delete(synchronize_session=False)
+    db.commit()
+
+
+@pytest.fixture
+def novo_aluno(db, academia):
+    """Cria alunos na academia do teste"""
+    from datetime import datetime
+    from app.models import Aluno
+
+    def criar(data_matricula: datetime = None, **campos) -> Aluno:
+        plano = academia.planos[0]
+        aluno = Aluno(
+            academia_id=academia.id, nome="Aluno de teste", email=f"{uuid.uuid4().hex[:12]}@teste.com",
+            plano_id=plano.id, nome_plano=plano.nome,
+            data_matricula=data_matricula or datetime(2024, 1, 2), **campos
+        )
+        db.add(aluno)
+        db.commit()
+        return aluno
+
+    return criar
@@ -0,0 +1,110 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app.models import Academia, Plano
+from app.models.academia import ACADEMIA_PADRAO
+from app.replicas import get_db
+from app.routes import academias as rotas_academias
+from app.routes import planos as rotas_planos
+from app.services import academias
+from app.services.academias import hash_chave
+
+CHAVE_REDE = "chave-da-rede"
+CHAVE_PADRAO = "chave-da-principal"
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    # SQLite em memória compartilhado entre as threads do TestClient
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[Academia.__table__, Plano.__table__])
+    Sessao = sessionmaker(bind=engine)
+    with Sessao() as db:
+        db.add(Academia(id=ACADEMIA_PADRAO, nome="Academia principal", chave_api_hash=hash_chave(CHAVE_PADRAO)))
+        db.add(Academia(id=2, nome="Outra", chave_api_hash=hash_chave("chave-da-outra")))
+        db.commit()
+    monkeypatch.setattr(academias, "CHAVE_API_REDE", CHAVE_REDE)
+    # A versão dos planos vira a academia resolvida pela chave, visível no ETag
+    monkeypatch.setattr(rotas_planos, "etag_recursos", lambda db, academia_id, *recursos, **kwargs: f'"{academia_id}"')
+
+    def sessao():
+        db = Sessao()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(rotas_academias.router, prefix="/academia")
+    app.include_router(rotas_planos.router, prefix="/plano")
+    app.dependency_overrides[get_db] = sessao
+    return TestClient(app)
+
+
+def _cabecalhos(chave=None, academia_id=None):
+    cabecalhos = {}
+    if chave is not None:
+        cabecalhos["X-Chave-Api"] = chave
+    if academia_id is not None:
+        cabecalhos["X-Academia-Id"] = str(academia_id)
+    return cabecalhos
+
+
+@pytest.mark.parametrize("chave,status", [(None, 401), ("", 401), ("inventada", 401)])
+def test_rotas_da_academia_exigem_chave_valida(cliente, chave, status):
+    assert cliente.get("/plano/", headers=_cabecalhos(chave)).status_code == status
+
+
+def test_chave_de_academia_nao_escolhe_outra_academia(cliente):
+    resposta = cliente.get("/plano/", headers=_cabecalhos(CHAVE_PADRAO, academia_id=2))
+    assert resposta.status_code == 403
+
+
+@pytest.mark.parametrize("chave,academia_id,esperada", [
+    (CHAVE_PADRAO, None, ACADEMIA_PADRAO),
+    (CHAVE_PADRAO, ACADEMIA_PADRAO, ACADEMIA_PADRAO),
+    ("chave-da-outra", None, 2),
+    (CHAVE_REDE, None, ACADEMIA_PADRAO),
+    (CHAVE_REDE, 2, 2),
+])
+def test_academia_da_requisicao(cliente, chave, academia_id, esperada):
+    resposta = cliente.get("/plano/", headers=_cabecalhos(chave, academia_id))
+    assert resposta.status_code == 200
+    assert resposta.headers["etag"] == f'"{esperada}"'
+
+
+def test_chave_da_rede_com_academia_inexistente(cliente):
+    assert cliente.get("/plano/", headers=_cabecalhos(CHAVE_REDE, academia_id=99)).status_code == 404
+
+
+@pytest.mark.parametrize("chave,status", [(None, 401), (CHAVE_PADRAO, 403), (CHAVE_REDE, 200)])
+def test_listar_academias_so_com_a_chave_da_rede(cliente, chave, status):
+    assert cliente.get("/academia/", headers=_cabecalhos(chave)).status_code == status
+
+
+def test_academia_so_ve_e_altera_a_si_mesma(cliente):
+    assert cliente.get("/academia/2", headers=_cabecalhos(CHAVE_PADRAO)).status_code == 403
+    assert cliente.put("/academia/2", json={"nome": "Tomada"}, headers=_cabecalhos(CHAVE_PADRAO)).status_code == 403
+    assert cliente.post("/academia/2/chave-api", headers=_cabecalhos(CHAVE_PADRAO)).status_code == 403
+
+
+def test_academia_criada_recebe_a_chave_uma_vez(cliente):
+    assert cliente.post("/academia/", json={"nome": "Nova"}, headers=_cabecalhos(CHAVE_PADRAO)).status_code == 403
+
+    criada = cliente.post("/academia/", json={"nome": "Nova"}, headers=_cabecalhos(CHAVE_REDE)).json()
+    chave = criada["chave_api"]
+
+    resposta = cliente.get(f"/academia/{criada['id']}", headers=_cabecalhos(chave))
+    assert resposta.status_code == 200
+    assert "chave_api" not in resposta.json()
+
+
+def test_troca_de_chave_invalida_a_anterior(cliente):
+    nova = cliente.post("/academia/2/chave-api", headers=_cabecalhos("chave-da-outra")).json()["chave_api"]
+
+    assert cliente.get("/academia/2", headers=_cabecalhos("chave-da-outra")).status_code == 401
+    assert cliente.get("/academia/2", headers=_cabecalhos(nova)).status_code == 200
@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from app import admissao
+from app.admissao import CHECKIN, DEGRADADO, RISCO, ClasseAdmissao, admitir
+from app.metricas import metricas
+
+
+@pytest.fixture
+def classes(monkeypatch):
+    # Uma vaga por classe; o risco espera até 50 ms com no máximo um na fila
+    classes = {
+        CHECKIN: ClasseAdmissao("teste_checkin", 1, 1000, 8),
+        RISCO: ClasseAdmissao("teste_risco", 1, 50, 1),
+        DEGRADADO: ClasseAdmissao("teste_degradado", 1, 0, 0),
+    }
+    monkeypatch.setattr(admissao, "ATIVO", True)
+    monkeypatch.setattr(admissao, "classes", classes)
+    return classes
+
+
+def _recusadas(nome):
+    return metricas.resumo()["contadores"].get(f"admissao_{nome}_recusadas", 0)
+
+
+async def _entrar(nome, degradar=False):
+    """Reserva a vaga como a dependência da rota; devolve o gerador (aclose libera) e se degradou"""
+    dependencia = admitir(nome, degradar)()
+    return dependencia, await dependencia.__anext__()
+
+
+def test_sem_vaga_recusa_com_503_e_retry_after(classes):
+    async def cenario():
+        ocupada, _ = await _entrar(RISCO)
+        try:
+            with pytest.raises(HTTPException) as erro:
+                await _entrar(RISCO)
+        finally:
+            await ocupada.aclose()
+        return erro.value
+
+    antes = _recusadas(RISCO)
+    erro = asyncio.run(cenario())
+
+    assert erro.status_code == 503
+    assert erro.headers["Retry-After"] == str(classes[RISCO].tentar_em)
+    assert _recusadas(RISCO) == antes + 1
+    assert classes[RISCO].ativos == 0
+
+
+def test_sem_vaga_rota_degradavel_passa_para_o_degradado(classes):
+    async def cenario():
+        ocupada, _ = await _entrar(RISCO)
+        degradada, degradado = await _entrar(RISCO, degradar=True)
+        ocupados = classes[DEGRADADO].ativos
+        await degradada.aclose()
+        await ocupada.aclose()
+        return degradado, ocupados
+
+    assert asyncio.run(cenario()) == (True, 1)
+    assert classes[DEGRADADO].ativos == 0
+
+
+def test_vaga_liberada_durante_a_espera_e_aproveitada(classes):
+    async def cenario():
+        ocupada, _ = await _entrar(RISCO)
+        asyncio.get_running_loop().call_later(0.01, lambda: asyncio.ensure_future(ocupada.aclose()))
+        segunda, degradado = await _entrar(RISCO)
+        await segunda.aclose()
+        return degradado
+
+    assert asyncio.run(cenario()) is False
+
+
+def test_fila_cheia_recusa_sem_esperar(classes):
+    async def cenario():
+        ocupada, _ = await _entrar(RISCO)
+        na_fila = asyncio.ensure_future(_entrar(RISCO))
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(HTTPException):
+                await _entrar(RISCO)
+            return classes[RISCO].na_fila
+        finally:
+            await ocupada.aclose()
+            segunda, _ = await na_fila
+            await segunda.aclose()
+
+    # A terceira é recusada enquanto a segunda ainda espera a vaga
+    assert asyncio.run(cenario()) == 1
+
+
+def test_checkins_nao_disputam_com_o_risco(classes):
+    async def cenario():
+        ocupada, _ = await _entrar(RISCO)
+        checkin, _ = await _entrar(CHECKIN)
+        await checkin.aclose()
+        await ocupada.aclose()
+
+    asyncio.run(cenario())
+
+
+def test_resposta_503_pela_rota(monkeypatch):
+    # Limite zero: toda requisição é recusada, com o cabeçalho na resposta HTTP
+    monkeypatch.setattr(admissao, "ATIVO", True)
+    monkeypatch.setattr(admissao, "classes", {
+        RISCO: ClasseAdmissao("teste_http", 0, 0, 0), DEGRADADO: ClasseAdmissao("teste_http_degradado", 0, 0, 0)
+    })
+    app = FastAPI()
+
+    @app.get("/risco", dependencies=[Depends(admitir(RISCO))])
+    def risco():
+        return {}
+
+    resposta = TestClient(app).get("/risco")
+    assert resposta.status_code == 503
+    assert resposta.headers["retry-after"] == "1"
@@ -0,0 +1,91 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import OperationalError
+from app.database import SessionLocal
+from app.models import ExecucaoAgendada
+from app.workers.agendador import Agendador, proxima_execucao
+
+INICIO = datetime(2024, 3, 1, 12, 0)
+
+
+@pytest.mark.parametrize("expressao,apos,esperada", [
+    ("*/5", datetime(2024, 3, 1, 12, 3), datetime(2024, 3, 1, 12, 8)),
+    ("03:00", datetime(2024, 3, 1, 2, 59), datetime(2024, 3, 1, 3, 0)),
+    ("03:00", datetime(2024, 3, 1, 3, 0), datetime(2024, 3, 2, 3, 0)),
+])
+def test_proxima_execucao(expressao, apos, esperada):
+    assert proxima_execucao(expressao, apos) == esperada
+
+
+@pytest.fixture
+def tarefa(db):
+    nome = f"teste-{uuid.uuid4().hex[:12]}"
+    yield nome
+    db.rollback()
+    db.query(ExecucaoAgendada).filter(ExecucaoAgendada.tarefa == nome).delete()
+    db.commit()
+
+
+def _execucao(db, nome):
+    db.expire_all()
+    return db.query(ExecucaoAgendada).filter(ExecucaoAgendada.tarefa == nome).one()
+
+
+def test_executa_uma_vez_por_horario(tarefa):
+    chamadas = []
+    agendador = Agendador({tarefa: ("*/1", lambda desde, agora: chamadas.append((desde, agora)))})
+
+    assert not agendador.executar(tarefa, INICIO)  # Só começa a agenda
+    assert agendador.executar(tarefa, INICIO + timedelta(minutes=2))
+    assert not agendador.executar(tarefa, INICIO + timedelta(minutes=2))
+    assert chamadas == [(INICIO, INICIO + timedelta(minutes=2))]
+
+
+def test_tarefa_roda_sem_transacao_aberta_e_reservada(db, tarefa):
+    def funcao(desde, agora):
+        # A linha não fica travada durante a tarefa...
+        outra = SessionLocal()
+        try:
+            outra.query(ExecucaoAgendada).filter(ExecucaoAgendada.tarefa == tarefa).with_for_update(nowait=True).one()
+        finally:
+            outra.rollback()
+            outra.close()
+        # ...mas a reserva impede outra execução ao mesmo tempo
+        return agendador.executar(tarefa, agora, forcar=True)
+
+    agendador = Agendador({tarefa: ("*/1", funcao)})
+    agendador.executar(tarefa, INICIO)
+
+    assert agendador.executar(tarefa, INICIO + timedelta(minutes=1))
+    execucao = _execucao(db, tarefa)
+    assert execucao.resultado == "False"
+    assert execucao.reservada_ate is None
+
+
+def test_reserva_vencida_e_retomada(db, tarefa):
+    agendador = Agendador({tarefa: ("*/1", lambda desde, agora: "ok")})
+    agendador.executar(tarefa, INICIO)
+    execucao = _execucao(db, tarefa)
+    # Reserva de um worker que morreu
+    execucao.reservada_ate = datetime.utcnow() + timedelta(minutes=5)
+    db.commit()
+    assert not agendador.executar(tarefa, forcar=True)
+
+    execucao.reservada_ate = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert agendador.executar(tarefa, forcar=True)
+
+
+def test_erro_mantem_a_execucao_anterior_e_libera_a_reserva(db, tarefa):
+    def falhar(desde, agora):
+        raise RuntimeError("falhou")
+
+    agendador = Agendador({tarefa: ("*/1", falhar)})
+    agendador.executar(tarefa, INICIO)
+
+    assert agendador.executar(tarefa, INICIO + timedelta(minutes=1))
+    execucao = _execucao(db, tarefa)
+    assert execucao.ultima_execucao == INICIO
+    assert execucao.resultado == "erro: falhou"
+    assert execucao.reservada_ate is None
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from app.services.artefatos_modelo import (EscalonadorPlano, FlorestaPlana, carregar_artefatos,
+                                           salvar_artefatos, versao_atual)
+
+
+@pytest.fixture(scope="module")
+def treinados():
+    gerador = np.random.default_rng(7)
+    X = gerador.normal(size=(400, 7)) * [1, 1, 30, 10, 5, 200, 300]
+    y = (X[:, 0] + X[:, 2] / 30 + gerador.normal(scale=0.5, size=400) > 0).astype(int)
+    scaler = StandardScaler().fit(X)
+    modelo = RandomForestClassifier(n_estimators=25, max_depth=5, class_weight="balanced", random_state=42)
+    modelo.fit(scaler.transform(X), y)
+    return modelo, scaler, gerador.normal(size=(150, 7)) * [1, 1, 30, 10, 5, 200, 300]
+
+
+def test_floresta_plana_igual_ao_sklearn(treinados):
+    modelo, scaler, X = treinados
+    X = scaler.transform(X)
+    floresta = FlorestaPlana.de_sklearn(modelo)
+
+    np.testing.assert_allclose(floresta.predict_proba(X), modelo.predict_proba(X), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(floresta.classes_, modelo.classes_)
+
+
+def test_floresta_plana_em_limiar_exato(treinados):
+    # Valores iguais ao limiar vão para a esquerda, como no sklearn (comparação em float32)
+    modelo, _, _ = treinados
+    arvore = modelo.estimators_[0].tree_
+    internos = arvore.children_left != -1
+    X = np.zeros((int(internos.sum()), 7))
+    X[np.arange(len(X)), arvore.feature[internos]] = arvore.threshold[internos]
+
+    np.testing.assert_allclose(FlorestaPlana.de_sklearn(modelo).predict_proba(X),
+                               modelo.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_escalonador_plano_igual_ao_standard_scaler(treinados):
+    _, scaler, X = treinados
+    escalonador = EscalonadorPlano.de_sklearn(scaler)
+
+    np.testing.assert_allclose(escalonador.transform(X), scaler.transform(X))
+    np.testing.assert_allclose(escalonador.inverse_transform(scaler.transform(X)), X)
+
+
+def test_artefatos_salvos_e_mapeados_preveem_igual(treinados, tmp_path):
+    modelo, scaler, X = treinados
+    versao = salvar_artefatos(tmp_path, FlorestaPlana.de_sklearn(modelo), EscalonadorPlano.de_sklearn(scaler))
+    assert versao_atual(tmp_path) == versao
+
+    floresta, escalonador, meta = carregar_artefatos(tmp_path, versao)
+    assert isinstance(floresta.valores, np.memmap)
+    assert meta["n_arvores"] == len(modelo.estimators_)
+    np.testing.assert_allclose(floresta.predict_proba(escalonador.transform(X)),
+                               modelo.predict_proba(scaler.transform(X)), rtol=0, atol=1e-12)
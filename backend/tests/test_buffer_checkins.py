@@ -0,0 +1,180 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from app.models import Checkin, SegmentoAplicado
+from app.services import buffer_checkins as modulo
+from app.services import checkins
+from app.services.buffer_checkins import BufferCheckins, _Segmento
+
+
+class BufferEmMemoria(BufferCheckins):
+    """Grava os segmentos em um dicionário, pelo nome, como SegmentoAplicado faz no banco"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gravados = {}
+        self.falhar = False
+
+    def _aplicar(self, nome, entradas):
+        if self.falhar:
+            return False
+        self.gravados.setdefault(nome, list(entradas))
+        return True
+
+
+class BufferDeTeste(BufferCheckins):
+    """Guarda os nomes dos segmentos gravados, para limpar buffer_segmentos_aplicados"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aplicados = []
+
+    def _aplicar(self, nome, entradas):
+        self.aplicados.append(nome)
+        return super()._aplicar(nome, entradas)
+
+
+def _escrever_segmento(diretorio, entradas, sobra: str = "", nome: str = None) -> str:
+    nome = nome or f"99999-{uuid.uuid4().hex}.log"
+    linhas = "".join(json.dumps({"aluno_id": a, "data": d.isoformat()}) + "\n" for a, d in entradas)
+    (diretorio / nome).write_text(linhas + sobra)
+    return nome
+
+
+ENTRADAS = [(1, datetime(2024, 5, 1, 8)), (2, datetime(2024, 5, 2, 9, 30, 0, 250))]
+
+
+def test_recupera_orfaos_e_ignora_linha_truncada(tmp_path):
+    buffer = BufferEmMemoria(diretorio=tmp_path)
+    primeiro = _escrever_segmento(tmp_path, ENTRADAS, sobra='{"aluno_id": 3, "da')
+    segundo = _escrever_segmento(tmp_path, ENTRADAS[:1])
+
+    buffer._recuperar_orfaos()
+
+    assert buffer.gravados == {primeiro: ENTRADAS, segundo: ENTRADAS[:1]}
+    assert not list(tmp_path.glob("*.log"))
+
+
+def test_falha_ao_gravar_mantem_o_segmento(tmp_path):
+    buffer = BufferEmMemoria(diretorio=tmp_path)
+    nome = _escrever_segmento(tmp_path, ENTRADAS)
+
+    buffer.falhar = True
+    buffer._recuperar_orfaos()
+    assert (tmp_path / nome).exists() and not buffer.gravados
+
+    # A próxima recuperação (outro processo, ou o mesmo reiniciado) consegue travar e gravar
+    buffer.falhar = False
+    buffer._recuperar_orfaos()
+    assert buffer.gravados == {nome: ENTRADAS}
+    assert not (tmp_path / nome).exists()
+
+
+def test_segmento_travado_por_outro_processo_fica(tmp_path):
+    buffer = BufferEmMemoria(diretorio=tmp_path)
+    nome = _escrever_segmento(tmp_path, ENTRADAS)
+    dono = _Segmento(tmp_path / nome)
+    try:
+        buffer._recuperar_orfaos()
+        assert (tmp_path / nome).exists() and not buffer.gravados
+    finally:
+        dono.arquivo.close()
+
+
+def test_enfileirados_sao_gravados_ao_parar(tmp_path):
+    buffer = BufferEmMemoria(diretorio=tmp_path, intervalo_ms=10_000, max_linhas=3)
+    buffer.iniciar()
+    try:
+        datas = [buffer.enfileirar(7) for _ in range(5)]
+    finally:
+        buffer.parar()
+
+    gravadas = [data for entradas in buffer.gravados.values() for _, data in entradas]
+    assert sorted(gravadas) == datas
+    assert not list(tmp_path.glob("*.log"))
+
+
+def test_parar_sem_checkins_apaga_o_segmento_vazio(tmp_path):
+    buffer = BufferEmMemoria(diretorio=tmp_path)
+    buffer.iniciar()
+    buffer.parar()
+
+    assert not list(tmp_path.glob("*.log")) and not buffer.gravados
+
+
+def test_enfileirar_depois_de_parar_nao_grava(tmp_path):
+    buffer = BufferEmMemoria(diretorio=tmp_path)
+    buffer.iniciar()
+    buffer.enfileirar(7)
+    buffer.parar()
+
+    assert buffer.enfileirar(8) is None
+    assert [aluno_id for entradas in buffer.gravados.values() for aluno_id, _ in entradas] == [7]
+
+
+@pytest.fixture
+def buffer(db, tmp_path, monkeypatch):
+    # Sem treinos em segundo plano disparados pelos lotes do teste
+    monkeypatch.setattr(modulo, "_agendar_retreino_se_necessario", lambda inseridos: None)
+    monkeypatch.setattr(checkins, "_agendar_retreino_se_necessario", lambda inseridos: None)
+    buffer = BufferDeTeste(diretorio=tmp_path, intervalo_ms=50, max_linhas=100)
+    yield buffer
+    db.rollback()
+    db.query(SegmentoAplicado).filter(
+        SegmentoAplicado.nome.in_(buffer.aplicados)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def _checkins(db, aluno):
+    db.expire_all()
+    return sorted(data for (data,) in db.query(Checkin.data).filter(Checkin.aluno_id == aluno.id))
+
+
+def test_reaplicar_segmento_nao_duplica(db, buffer, novo_aluno):
+    aluno = novo_aluno()
+    entradas = [(aluno.id, datetime(2024, 5, 1, 8) + timedelta(days=i)) for i in range(3)]
+    nome = f"teste-{uuid.uuid4().hex}.log"
+
+    assert buffer._aplicar(nome, entradas)
+    assert buffer._aplicar(nome, entradas)
+
+    assert _checkins(db, aluno) == [data for _, data in entradas]
+    assert db.query(SegmentoAplicado.checkins).filter(SegmentoAplicado.nome == nome).scalar() == 3
+
+
+def test_queda_antes_de_apagar_o_segmento_nao_duplica(db, buffer, tmp_path, novo_aluno):
+    aluno = novo_aluno()
+    entradas = [(aluno.id, datetime(2024, 5, 1, 8)), (aluno.id, datetime(2024, 5, 2, 9))]
+    nome = _escrever_segmento(tmp_path, entradas)
+    buffer._recuperar_orfaos()
+
+    # O mesmo segmento reaparece, como se o processo caísse depois do commit e antes do unlink
+    _escrever_segmento(tmp_path, entradas, nome=nome)
+    buffer._recuperar_orfaos()
+
+    assert not list(tmp_path.glob("*.log"))
+    assert _checkins(db, aluno) == [data for _, data in entradas]
+
+
+def test_enfileirados_chegam_ao_banco(db, buffer, novo_aluno):
+    aluno = novo_aluno()
+    buffer.iniciar()
+    try:
+        datas = [buffer.enfileirar(aluno.id) for _ in range(5)]
+    finally:
+        buffer.parar()
+
+    assert _checkins(db, aluno) == datas
+
+
+def test_checkin_com_buffer_parado_vai_direto_ao_banco(db, buffer, novo_aluno):
+    aluno = novo_aluno()
+    buffer.iniciar()
+    buffer.parar()
+
+    checkin = checkins.enfileirar_checkin(db, buffer, aluno.id, aluno.academia_id)
+
+    assert isinstance(checkin, Checkin) and checkin.aluno_id == aluno.id
+    assert _checkins(db, aluno) == [checkin.data]
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+import pytest
+from app.database import SessionLocal
+from app.models import Checkin, ContagemCheckinPendente, ResumoCheckinHora, ResumoDashboard
+from app.services.dashboard import atualizar_resumo, obter_dashboard
+
+
+@pytest.fixture
+def aluno(db, novo_aluno):
+    aluno = novo_aluno()
+    # Resumo já criado (e reconstruído, ainda vazio) antes dos check-ins do teste
+    assert atualizar_resumo(db, aluno.academia_id)
+    return aluno
+
+
+def _novo(aluno, data):
+    return Checkin(aluno_id=aluno.id, academia_id=aluno.academia_id, data=data)
+
+
+def _inserir(db, aluno, *datas):
+    checkins = [_novo(aluno, data) for data in datas]
+    db.add_all(checkins)
+    db.commit()
+    return checkins
+
+
+def _por_hora(db, academia_id):
+    db.expire_all()
+    return {
+        (dia, hora): total for dia, hora, total in db.query(
+            ResumoCheckinHora.dia, ResumoCheckinHora.hora, ResumoCheckinHora.total
+        ).filter(ResumoCheckinHora.academia_id == academia_id)
+    }
+
+
+def _esperado(*datas):
+    horas = {}
+    for data in datas:
+        if data is not None:
+            chave = (data.date(), data.hour)
+            horas[chave] = horas.get(chave, 0) + 1
+    return horas
+
+
+def test_checkin_de_transacao_aberta_entra_quando_confirmada(db, aluno):
+    agora = datetime.utcnow()
+    aberta = SessionLocal()
+    try:
+        # Id menor em uma transação ainda aberta e id maior, com data antiga, já confirmado
+        lento = _novo(aluno, agora)
+        aberta.add(lento)
+        aberta.flush()
+        rapido, = _inserir(db, aluno, agora - timedelta(days=2))
+        assert lento.id < rapido.id
+
+        assert atualizar_resumo(db, aluno.academia_id)
+        assert _por_hora(db, aluno.academia_id) == _esperado(rapido.data)
+
+        aberta.commit()
+    finally:
+        aberta.close()
+
+    assert atualizar_resumo(db, aluno.academia_id)
+    assert atualizar_resumo(db, aluno.academia_id)
+    assert _por_hora(db, aluno.academia_id) == _esperado(agora, agora - timedelta(days=2))
+
+
+def test_transacao_desfeita_nao_conta(db, aluno):
+    desfeita = SessionLocal()
+    try:
+        desfeita.add(_novo(aluno, datetime.utcnow()))
+        desfeita.flush()
+        desfeita.rollback()
+    finally:
+        desfeita.close()
+    confirmado, = _inserir(db, aluno, datetime.utcnow() - timedelta(hours=5))
+
+    assert atualizar_resumo(db, aluno.academia_id)
+    assert _por_hora(db, aluno.academia_id) == _esperado(confirmado.data)
+
+
+def test_datas_fora_de_ordem_no_futuro_e_sem_data(db, aluno):
+    agora = datetime.utcnow()
+    checkins = _inserir(db, aluno, agora + timedelta(days=1), agora - timedelta(days=40), None, agora)
+
+    assert atualizar_resumo(db, aluno.academia_id)
+    assert _por_hora(db, aluno.academia_id) == _esperado(*[checkin.data for checkin in checkins])
+    assert not db.query(ContagemCheckinPendente).filter(
+        ContagemCheckinPendente.academia_id == aluno.academia_id
+    ).count()
+
+
+def test_reconstrucao_conta_cada_checkin_uma_vez(db, aluno):
+    agora = datetime.utcnow()
+    checkins = _inserir(db, aluno, agora - timedelta(days=1), agora - timedelta(days=1, minutes=5), agora)
+
+    # Resumo marcado para reconstrução com contagens ainda pendentes: os check-ins
+    # entram pela reconstrução e as pendentes são descartadas no mesmo comando
+    db.query(ResumoDashboard).filter(ResumoDashboard.academia_id == aluno.academia_id).update({"reconstruir": True})
+    db.commit()
+    assert atualizar_resumo(db, aluno.academia_id)
+    assert atualizar_resumo(db, aluno.academia_id)
+
+    assert _por_hora(db, aluno.academia_id) == _esperado(*[checkin.data for checkin in checkins])
+    dados = obter_dashboard(db, aluno.academia_id)
+    assert dados["checkins_por_dia"][-1]["total"] == 1
+    assert dados["checkins_por_dia"][-2]["total"] == 2
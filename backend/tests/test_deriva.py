@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.services import churn_predictor as modulo_preditor
+from app.services import treinamento
+from app.services.churn_predictor import ChurnPredictor, resumir_distribuicao
+
+
+def _dados(n=2000, seed=3, deslocamento=0.0, churn=0.2):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.beta(2, 4, n), rng.beta(2, 4, n), np.clip(rng.exponential(10, n) + deslocamento, 0, 365),
+        rng.gamma(2, 5, n), rng.integers(1, 1500, n), rng.uniform(0, 1, n), rng.choice([99.9, 199.9], n)
+    ])
+    y = (rng.random(n) < churn).astype(int)
+    return X, y
+
+
+@pytest.fixture
+def preditor(tmp_path):
+    # Modelo "treinado" só com o resumo da distribuição de treino nos metadados
+    preditor = ChurnPredictor(tmp_path)
+    preditor.is_trained = True
+    preditor.meta = {"estatisticas": resumir_distribuicao(*_dados()), "criado_em": datetime.utcnow().isoformat()}
+    return preditor
+
+
+def test_mesma_distribuicao_nao_retreina(preditor):
+    X, y = _dados(seed=4)
+    decisao = preditor.avaliar_deriva(X, y, np.zeros(len(y), dtype=bool))
+    assert decisao["retreinar"] is False
+    assert decisao["psi_max"] < modulo_preditor.DERIVA_PSI_MAX
+
+
+def test_feature_deslocada_retreina(preditor):
+    X, y = _dados(seed=4, deslocamento=15)
+    decisao = preditor.avaliar_deriva(X, y, np.zeros(len(y), dtype=bool))
+    assert decisao["retreinar"] is True
+    assert decisao["feature_psi_max"] == "dias_ultimo_checkin"
+
+
+def test_cancelamentos_novos_retreinam(preditor):
+    X, y = _dados(seed=4)
+    recentes = np.zeros(len(y), dtype=bool)
+    recentes[np.flatnonzero(y == 1)[:modulo_preditor.DERIVA_NOVOS_CANCELAMENTOS]] = True
+    decisao = preditor.avaliar_deriva(X, y, recentes)
+    assert decisao["retreinar"] is True
+    assert decisao["novos_cancelamentos"] == modulo_preditor.DERIVA_NOVOS_CANCELAMENTOS
+
+
+def test_taxa_de_churn_mudou_retreina(preditor):
+    X, y = _dados(seed=4, churn=0.35)
+    assert preditor.avaliar_deriva(X, y, np.zeros(len(y), dtype=bool))["retreinar"] is True
+
+
+def test_modelo_antigo_ou_sem_estatisticas_retreina(preditor):
+    X, y = _dados(seed=4)
+    preditor.meta["criado_em"] = (datetime.utcnow() - timedelta(hours=modulo_preditor.DERIVA_IDADE_MAX_H + 1)).isoformat()
+    assert preditor.avaliar_deriva(X, y)["retreinar"] is True
+
+    preditor.meta = {}
+    assert preditor.avaliar_deriva(X, y)["retreinar"] is True
+
+
+@pytest.mark.parametrize("forcar,treinado", [(False, False), (True, True)])
+def test_treino_sem_deriva_e_ignorado(preditor, monkeypatch, forcar, treinado):
+    X, y = _dados(seed=4)
+    treinos = []
+    monkeypatch.setattr(treinamento.preditores, "do_modelo", lambda chave: preditor)
+    monkeypatch.setattr(treinamento, "carregar_matriz_treino",
+                        lambda db, desde, filtro_alunos: (X, y, np.zeros(len(y), dtype=bool)))
+    monkeypatch.setattr(preditor, "train", lambda X, y, recentes, modo: treinos.append(modo) or True)
+
+    assert treinamento.treinar_modelo(None, forcar=forcar) is treinado
+    assert len(treinos) == int(treinado)
@@ -0,0 +1,96 @@
+import pytest
+from starlette.requests import Request
+from app import etags
+from app.etags import com_etag, corresponde, etag_recursos, gerar_etag, nao_modificado, versao_aluno, versoes
+from app.models import AlteracaoRecurso, Checkin
+from app.routes import planos as rotas_planos
+
+TAG = gerar_etag(1, "planos", 7)
+
+
+def _requisicao(if_none_match=None):
+    cabecalhos = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": cabecalhos})
+
+
+def test_etag_muda_com_qualquer_parte():
+    assert gerar_etag(1, "planos", 7) == TAG
+    assert len({TAG, gerar_etag(1, "planos", 8), gerar_etag(2, "planos", 7), gerar_etag(1, "alunos", 7)}) == 4
+
+
+@pytest.mark.parametrize("cabecalho", [TAG, f"W/{TAG}", f'"outra", {TAG}', "*"])
+def test_corresponde(cabecalho):
+    assert corresponde(_requisicao(cabecalho), TAG)
+
+
+@pytest.mark.parametrize("cabecalho", [None, "", '"outra"', TAG[:-2] + '"'])
+def test_nao_corresponde(cabecalho):
+    assert not corresponde(_requisicao(cabecalho), TAG)
+
+
+def test_304_sem_corpo_e_com_a_etag():
+    resposta = nao_modificado(TAG)
+    assert resposta.status_code == 304
+    assert resposta.body == b""
+    assert resposta.headers["etag"] == TAG
+    assert resposta.headers["cache-control"] == "no-cache"
+
+
+def test_listagem_responde_304_sem_consultar(monkeypatch):
+    monkeypatch.setattr(rotas_planos, "etag_recursos", lambda *args, **kwargs: TAG)
+
+    # Sem sessão: qualquer consulta além da versão falharia
+    resposta = rotas_planos.listar_planos(_requisicao(TAG), db=None, academia=type("Academia", (), {"id": 1}))
+
+    assert resposta.status_code == 304
+
+
+class _SessaoFalsa:
+    def __init__(self, linhas):
+        self.linhas = linhas
+
+    def execute(self, consulta):
+        return self
+
+    def all(self):
+        return self.linhas
+
+
+@pytest.mark.parametrize("pendentes,compacta", [(etags.LIMITE_PENDENTES, False), (etags.LIMITE_PENDENTES + 1, True)])
+def test_compacta_em_linha_acima_do_limite(monkeypatch, pendentes, compacta):
+    compactadas = []
+    monkeypatch.setattr(etags, "compactar_em_linha", compactadas.append)
+
+    resultado = versoes(_SessaoFalsa([("alunos", 10 + pendentes, pendentes)]), 3, ["alunos", "planos"])
+
+    assert resultado == [10 + pendentes, 0]
+    assert compactadas == ([3] if compacta else [])
+
+
+def test_checkin_muda_so_a_versao_do_proprio_aluno(db, novo_aluno):
+    aluno, outro = novo_aluno(), novo_aluno()
+    recursos = [versao_aluno(aluno.id), versao_aluno(outro.id), "planos"]
+    antes = versoes(db, aluno.academia_id, recursos)
+    db.rollback()
+
+    db.add(Checkin(aluno_id=aluno.id, academia_id=aluno.academia_id))
+    db.commit()
+    depois = versoes(db, aluno.academia_id, recursos)
+
+    assert depois[0] > antes[0]
+    assert depois[1:] == antes[1:]
+
+
+def test_compactacao_em_linha_mantem_a_versao_e_limita_as_pendentes(db, novo_aluno, monkeypatch):
+    monkeypatch.setattr(etags, "LIMITE_PENDENTES", 2)
+    aluno = novo_aluno()
+    for numero in range(5):
+        aluno.nome = f"Aluno {numero}"
+        db.commit()
+
+    tag = etag_recursos(db, aluno.academia_id, "alunos")
+    db.rollback()
+    pendentes = db.query(AlteracaoRecurso).filter(AlteracaoRecurso.academia_id == aluno.academia_id).count()
+
+    assert pendentes == 0
+    assert etag_recursos(db, aluno.academia_id, "alunos") == tag
@@ -0,0 +1,104 @@
+import csv
+import io
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from app.routes import exportacao as rotas_exportacao
+from app.services import exportacao
+from app.services.exportacao import COLUNAS, exportar, gerar_csv, montar_consulta
+
+DATA = datetime(2024, 3, 5, 7, 30)
+LOTES = [
+    [(1, 10, DATA), (2, 10, None)],
+    [(3, 11, datetime(2024, 3, 6))],
+]
+
+
+def _sql(consulta):
+    return str(consulta.compile(dialect=postgresql.dialect()))
+
+
+def test_csv_com_cabecalho_e_um_bloco_por_lote():
+    blocos = list(gerar_csv("checkins", iter(LOTES)))
+
+    assert len(blocos) == len(LOTES)
+    linhas = list(csv.reader(io.StringIO(b"".join(blocos).decode())))
+    assert linhas == [
+        [coluna.key for coluna in COLUNAS["checkins"]],
+        ["1", "10", DATA.isoformat()],
+        ["2", "10", ""],
+        ["3", "11", "2024-03-06T00:00:00"],
+    ]
+
+
+def test_csv_sem_linhas_tem_so_o_cabecalho():
+    assert b"".join(gerar_csv("checkins", iter([]))) == b"id,aluno_id,data\r\n"
+
+
+def test_parquet_um_row_group_por_lote():
+    pq = pytest.importorskip("pyarrow.parquet")
+    arquivo = pq.ParquetFile(io.BytesIO(b"".join(exportacao.gerar_parquet("checkins", iter(LOTES)))))
+
+    assert arquivo.metadata.num_row_groups == len(LOTES)
+    assert arquivo.read().to_pydict() == {"id": [1, 2, 3], "aluno_id": [10, 10, 11],
+                                          "data": [DATA, None, datetime(2024, 3, 6)]}
+
+
+def test_consulta_filtra_academia_periodo_e_status():
+    sql = _sql(montar_consulta("checkins", DATA, DATA, "ativo", academia_id=7))
+
+    assert "JOIN alunos ON alunos.id = checkins.aluno_id" in sql
+    assert "checkins.data >=" in sql and "checkins.data <=" in sql
+    assert "alunos.status_matricula =" in sql
+    assert "checkins.academia_id =" in sql
+
+
+def test_consulta_de_checkins_sem_status_nao_junta_alunos():
+    assert "JOIN" not in _sql(montar_consulta("checkins", academia_id=7))
+
+
+def test_tabela_ou_formato_desconhecido_e_recusado(monkeypatch):
+    monkeypatch.setattr(exportacao, "_lotes", lambda consulta, linhas_por_lote: iter([]))
+
+    with pytest.raises(ValueError):
+        montar_consulta("planos")
+    with pytest.raises(ValueError):
+        exportar("alunos", "xlsx")
+
+
+def test_exportar_le_em_lotes_do_tamanho_pedido(monkeypatch):
+    lidos = []
+
+    def lotes(consulta, linhas_por_lote):
+        lidos.append(linhas_por_lote)
+        return iter(LOTES)
+
+    monkeypatch.setattr(exportacao, "_lotes", lotes)
+
+    assert len(list(exportar("checkins", "csv", linhas_por_lote=2, academia_id=7))) == len(LOTES)
+    assert lidos == [2]
+
+
+def test_rota_recusa_periodo_invertido():
+    with pytest.raises(HTTPException) as erro:
+        rotas_exportacao._resposta_exportacao("checkins", "csv", DATA, datetime(2024, 1, 1), None,
+                                              SimpleNamespace(id=7))
+    assert erro.value.status_code == 400
+
+
+def test_rota_sem_pyarrow_responde_501(monkeypatch):
+    monkeypatch.setattr(rotas_exportacao, "parquet_disponivel", lambda: False)
+
+    with pytest.raises(HTTPException) as erro:
+        rotas_exportacao._resposta_exportacao("alunos", "parquet", None, None, None, SimpleNamespace(id=7))
+    assert erro.value.status_code == 501
+
+
+def test_rota_nomeia_o_arquivo_com_a_academia(monkeypatch):
+    monkeypatch.setattr(rotas_exportacao, "exportar", lambda *args, **kwargs: iter([]))
+
+    resposta = rotas_exportacao._resposta_exportacao("alunos", "csv", None, None, None, SimpleNamespace(id=7))
+    assert resposta.media_type == "text/csv"
+    assert 'filename="alunos_7_' in resposta.headers["content-disposition"]
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.models import ResumoCheckinMes
+from app.services.churn_predictor import calcular_features, para_micros
+from app.services.features import ArquivoNaJanela
+from app.services.indice_checkins import HistoricoAluno
+from app.services.retencao import _resumos, estender_historico, resumir_meses, resumo_das_datas
+
+MATRICULA = datetime(2023, 12, 20)
+PRECO = 150.0
+# Check-ins irregulares (frações de dia) de janeiro a agosto de 2024
+DATAS = sorted(datetime(2024, 1, 3, 6) + np.cumsum(np.random.default_rng(7).uniform(0.2, 6.0, 60)) * timedelta(days=1))
+REFERENCIA = DATAS[-1] + timedelta(days=2)
+
+
+def _arquivo(datas):
+    """Resumo dos check-ins arquivados, pelos mesmos resumos mensais da retenção"""
+    linhas = [(i, 1, 1, data) for i, data in enumerate(datas)]
+    return resumir_meses(ResumoCheckinMes(**resumo) for resumo in _resumos(linhas))
+
+
+def _do_indice(arquivado, recentes, referencia):
+    historico = HistoricoAluno(arquivado)
+    for data in para_micros(recentes):
+        historico.acrescentar(int(data))
+    return historico.features(MATRICULA, PRECO, referencia)
+
+
+@pytest.mark.parametrize("limite", [datetime(2024, 3, 1), datetime(2024, 5, 1), DATAS[-1] - timedelta(days=31)])
+def test_resumo_e_indice_iguais_ao_historico_inteiro(limite):
+    arquivadas = [data for data in DATAS if data < limite]
+    recentes = [data for data in DATAS if data >= limite]
+    esperadas = calcular_features(para_micros(DATAS), MATRICULA, PRECO, REFERENCIA)
+    arquivado = _arquivo(arquivadas)
+
+    np.testing.assert_allclose(calcular_features(para_micros(recentes), MATRICULA, PRECO, REFERENCIA, arquivado),
+                               esperadas, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(_do_indice(arquivado, recentes, REFERENCIA), esperadas, rtol=0, atol=1e-9)
+
+
+def test_estender_e_o_mesmo_que_resumir_tudo():
+    micros = para_micros(DATAS)
+    assert estender_historico(resumo_das_datas(micros[:25]), micros[25:]) == resumo_das_datas(micros)
+    assert _arquivo(DATAS) == resumo_das_datas(micros)
+
+
+@pytest.mark.parametrize("dias", [0, 10, 30])
+def test_arquivo_dentro_da_janela_mensal_e_recusado(dias):
+    # Cancelado há muito tempo: a referência é o cancelamento, logo depois dos arquivados
+    arquivado = _arquivo(DATAS)
+    referencia = DATAS[-1] + timedelta(days=dias)
+
+    with pytest.raises(ArquivoNaJanela):
+        calcular_features(para_micros([]), MATRICULA, PRECO, referencia, arquivado)
+    with pytest.raises(ArquivoNaJanela):
+        _do_indice(arquivado, [], referencia)
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.services.frequencia import JANELA_RESUMO, montar_janelas
+
+
+def test_janelas_ordenadas_sem_repeticao_e_com_a_do_resumo():
+    janelas = montar_janelas([90, 7, 7])
+
+    assert [dias for _, _, dias in janelas] == sorted({7, 90, JANELA_RESUMO})
+    for inicio, fim, dias in janelas:
+        assert fim - inicio == timedelta(days=dias)
+    assert len({fim for _, fim, _ in janelas}) == 1
+
+
+def test_sem_janelas_fica_so_a_do_resumo():
+    assert [dias for _, _, dias in montar_janelas([])] == [JANELA_RESUMO]
+
+
+@pytest.mark.parametrize("dias", [[0], [7, -1]])
+def test_janela_sem_dias(dias):
+    with pytest.raises(ValueError):
+        montar_janelas(dias)
+
+
+def test_intervalo_personalizado_arredonda_dias_para_cima():
+    inicio = datetime(2024, 1, 1)
+    *_, personalizada = montar_janelas([], inicio, inicio + timedelta(days=2, hours=1))
+    assert personalizada == (inicio, inicio + timedelta(days=2, hours=1), 3)
+
+
+def test_intervalo_menor_que_um_dia_conta_um_dia():
+    inicio = datetime(2024, 1, 1)
+    *_, personalizada = montar_janelas([], inicio, inicio + timedelta(minutes=1))
+    assert personalizada[2] == 1
+
+
+def test_intervalo_sem_fim_termina_agora():
+    antes = datetime.utcnow()
+    *_, (inicio, fim, dias) = montar_janelas([], antes - timedelta(days=10))
+    assert antes <= fim <= datetime.utcnow()
+    assert dias in (10, 11)
+
+
+@pytest.mark.parametrize("fim", [datetime(2024, 1, 1), datetime(2023, 12, 31)])
+def test_fim_nao_posterior_ao_inicio(fim):
+    with pytest.raises(ValueError):
+        montar_janelas([], datetime(2024, 1, 1), fim)
+
+
+def test_datas_com_fuso_viram_utc_sem_fuso():
+    brasilia = timezone(timedelta(hours=-3))
+    *_, (inicio, fim, dias) = montar_janelas(
+        [], datetime(2024, 1, 1, 21, tzinfo=brasilia), datetime(2024, 1, 3, 2, tzinfo=timezone.utc)
+    )
+    assert (inicio, fim, dias) == (datetime(2024, 1, 2), datetime(2024, 1, 3, 2), 2)
+
+
+def test_fuso_so_no_inicio():
+    # Mistura de data com e sem fuso: a sem fuso já é UTC
+    *_, (inicio, fim, _) = montar_janelas(
+        [], datetime(2024, 1, 1, tzinfo=timezone(timedelta(hours=2))), datetime(2024, 1, 1)
+    )
+    assert inicio == datetime(2023, 12, 31, 22) and fim == datetime(2024, 1, 1)
+
+
+def test_fuso_com_fim_antes_do_inicio_em_utc():
+    # 10h em UTC-3 é depois de 12h em UTC
+    with pytest.raises(ValueError):
+        montar_janelas([], datetime(2024, 1, 1, 10, tzinfo=timezone(timedelta(hours=-3))),
+                       datetime(2024, 1, 1, 12, tzinfo=timezone.utc))
+
+
+def test_intervalo_com_a_duracao_do_resumo_vem_depois_das_fixas():
+    # O resumo da resposta é a primeira janela de JANELA_RESUMO dias: a fixa, não a personalizada
+    inicio = datetime(2024, 1, 1)
+    janelas = montar_janelas([7, JANELA_RESUMO], inicio, inicio + timedelta(days=JANELA_RESUMO))
+    duracoes = [dias for _, _, dias in janelas]
+
+    assert duracoes.count(JANELA_RESUMO) == 2
+    assert janelas[duracoes.index(JANELA_RESUMO)][0] != inicio
+    assert janelas[-1] == (inicio, inicio + timedelta(days=JANELA_RESUMO), JANELA_RESUMO)
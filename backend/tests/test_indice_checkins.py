@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.models import Checkin
+from app.services import retencao
+from app.services.churn_predictor import calcular_features, para_micros
+from app.services.indice_checkins import IndiceCheckins
+
+REFERENCIA = datetime(2024, 8, 10, 12)
+
+
+@pytest.fixture
+def aluno(db, novo_aluno, tmp_path, monkeypatch):
+    monkeypatch.setattr(retencao, "DIRETORIO", tmp_path)
+    aluno = novo_aluno(data_matricula=datetime(2023, 12, 20))
+    datas = [datetime(2024, 1, 3, 6) + timedelta(days=3.7 * i) for i in range(45)] + [datetime(2024, 8, 3, 6, 5)]
+    db.add_all(Checkin(aluno_id=aluno.id, academia_id=aluno.academia_id, data=data) for data in datas)
+    db.commit()
+    aluno.datas = datas
+    return aluno
+
+
+@pytest.fixture
+def indice(aluno):
+    indice = IndiceCheckins()
+    indice.aquecer()
+    return indice
+
+
+def _features(indice, aluno):
+    return indice.features(aluno.id, aluno.data_matricula, aluno.plano.preco, REFERENCIA)
+
+
+def test_reconciliacao_troca_os_arquivados_pelo_resumo(db, aluno, indice):
+    esperadas = calcular_features(np.sort(para_micros(aluno.datas)), aluno.data_matricula, aluno.plano.preco, REFERENCIA)
+    np.testing.assert_allclose(_features(indice, aluno), esperadas, rtol=0, atol=1e-9)
+
+    arquivados = retencao._arquivar(db, (Checkin.aluno_id == aluno.id) & (Checkin.data < datetime(2024, 7, 1)),
+                                    f"teste-{aluno.id}")
+    indice.reconciliar()
+
+    # Só os check-ins da tabela quente continuam na memória; as features não mudam
+    assert len(indice._historicos[aluno.id]) == len(aluno.datas) - arquivados == 1
+    np.testing.assert_allclose(_features(indice, aluno), esperadas, rtol=0, atol=1e-9)
+
+
+def test_reconciliacao_retira_alunos_excluidos(db, aluno, indice):
+    aluno_id, total = aluno.id, indice._total
+    retencao.excluir_alunos(db, [aluno_id])
+    db.commit()
+
+    indice.reconciliar()
+
+    assert aluno_id not in indice._historicos
+    assert indice._total == total - len(aluno.datas)
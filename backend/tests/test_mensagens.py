@@ -0,0 +1,69 @@
+import json
+from datetime import datetime
+import numpy as np
+import pytest
+from app.mensagens import (CONTENT_TYPE_CHECKINS, CONTENT_TYPE_JSON, codificar_checkins,
+                           codificar_lote_checkins, decodificar_checkins, decodificar_lote_checkins,
+                           para_datetimes)
+
+CHECKINS = [
+    {"aluno_id": 1, "data": datetime(2024, 3, 1, 7, 30, 0, 123456)},
+    {"aluno_id": 2 ** 40, "data": datetime(1969, 12, 31, 23, 59, 59)},
+    {"aluno_id": 3, "data": datetime(2038, 1, 19, 3, 14, 8)},
+]
+
+
+def test_round_trip_colunar():
+    aluno_ids = np.array([5, -1, 2 ** 62], dtype=np.int64)
+    datas_us = np.array([0, -1, 1_700_000_000_000_000], dtype=np.int64)
+
+    lidos_ids, lidas_datas = decodificar_checkins(codificar_checkins(aluno_ids, datas_us))
+
+    np.testing.assert_array_equal(lidos_ids, aluno_ids)
+    np.testing.assert_array_equal(lidas_datas, datas_us)
+
+
+def test_round_trip_vazio():
+    aluno_ids, datas_us = decodificar_checkins(codificar_checkins([], []))
+    assert aluno_ids.size == 0 and datas_us.size == 0
+
+
+@pytest.mark.parametrize("formato", ["json", "colunar"])
+def test_round_trip_lote(formato):
+    corpo, content_type = codificar_lote_checkins(CHECKINS, formato)
+    assert content_type == (CONTENT_TYPE_CHECKINS if formato == "colunar" else CONTENT_TYPE_JSON)
+
+    aluno_ids, datas_us = decodificar_lote_checkins(corpo, content_type)
+
+    assert aluno_ids.tolist() == [c["aluno_id"] for c in CHECKINS]
+    assert para_datetimes(datas_us) == [c["data"] for c in CHECKINS]
+
+
+def test_json_sem_content_type():
+    corpo = json.dumps({"checkins": [{"aluno_id": 7, "data": "2024-03-01T07:30:00"}]}).encode()
+    aluno_ids, datas_us = decodificar_lote_checkins(corpo)
+    assert aluno_ids.tolist() == [7]
+    assert para_datetimes(datas_us) == [datetime(2024, 3, 1, 7, 30)]
+
+
+def test_formato_desconhecido():
+    with pytest.raises(ValueError):
+        codificar_lote_checkins(CHECKINS, "xml")
+
+
+def test_colunas_de_tamanhos_diferentes():
+    with pytest.raises(ValueError):
+        codificar_checkins([1, 2], [0])
+
+
+@pytest.mark.parametrize("corromper", [
+    lambda corpo: corpo[:10],                        # cabeçalho truncado
+    lambda corpo: corpo[:-1],                        # colunas truncadas
+    lambda corpo: corpo + b"\0",                     # bytes sobrando
+    lambda corpo: b"XXXX" + corpo[4:],               # mágico errado
+    lambda corpo: corpo[:4] + b"\x02" + corpo[5:],   # versão desconhecida
+])
+def test_mensagem_invalida(corromper):
+    corpo = codificar_checkins([1, 2], [10, 20])
+    with pytest.raises(ValueError):
+        decodificar_checkins(corromper(corpo))
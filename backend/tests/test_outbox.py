@@ -0,0 +1,100 @@
+import pytest
+from app import schemas
+from app.mensagens import rota_evento
+from app.models import EventoOutbox
+from app.routes import alunos as rotas_alunos
+from app.services.outbox import TIPO_CANCELAMENTO, TIPO_MATRICULA, publicar_pendentes, registrar_evento
+
+
+class _SessaoFalsa:
+    """Devolve os eventos da consulta de pendentes e registra commit e rollback"""
+
+    def __init__(self, eventos):
+        self.eventos = eventos
+        self.chamadas = []
+
+    def query(self, *args):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def order_by(self, *args):
+        return self
+
+    def limit(self, lote):
+        self.lote = lote
+        return self
+
+    def with_for_update(self, skip_locked=False):
+        self.skip_locked = skip_locked
+        return self
+
+    def all(self):
+        return self.eventos
+
+    def commit(self):
+        self.chamadas.append("commit")
+
+    def rollback(self):
+        self.chamadas.append("rollback")
+
+
+def _eventos(n):
+    return [EventoOutbox(id=i, routing_key="gym.eventos.0.1.checkin", payload={}, tentativas=0) for i in range(n)]
+
+
+def test_so_os_confirmados_pelo_broker_sao_marcados():
+    eventos = _eventos(5)
+    db = _SessaoFalsa(eventos)
+
+    assert publicar_pendentes(db, lambda lote: 3, lote=10) == 3
+
+    assert [evento.publicado_em is not None for evento in eventos] == [True] * 3 + [False] * 2
+    assert [evento.tentativas for evento in eventos] == [0, 0, 0, 1, 1]
+    assert db.chamadas == ["commit"]
+    assert db.lote == 10 and db.skip_locked
+
+
+def test_falha_na_publicacao_conta_a_tentativa_e_libera_as_linhas():
+    eventos = _eventos(2)
+    db = _SessaoFalsa(eventos)
+
+    def publicar(lote):
+        raise ConnectionError("broker indisponível")
+
+    with pytest.raises(ConnectionError):
+        publicar_pendentes(db, publicar, lote=10)
+
+    assert all(evento.publicado_em is None and evento.tentativas == 1 for evento in eventos)
+    assert db.chamadas == ["commit"]
+
+
+def test_sem_pendentes_nao_publica():
+    db = _SessaoFalsa([])
+    assert publicar_pendentes(db, lambda lote: pytest.fail("não deveria publicar"), lote=10) == 0
+    assert db.chamadas == ["rollback"]
+
+
+def _rotas(db, academia):
+    return [rota for (rota,) in db.query(EventoOutbox.routing_key).filter(
+        EventoOutbox.routing_key.like(rota_evento("%", academia.id))
+    ).order_by(EventoOutbox.id)]
+
+
+def test_matricula_e_cancelamento_gravam_o_evento_na_transacao(db, academia, monkeypatch):
+    monkeypatch.setattr(rotas_alunos, "agendar_treinamento", lambda chave: None)
+    novo = schemas.AlunoCreate(nome="Aluna", email="aluna@teste.com", telefone="1", plano_id=academia.planos[0].id)
+
+    aluno = rotas_alunos.criar_aluno(novo, db=db, academia=academia)
+    rotas_alunos.cancelar_matricula(aluno.id, db=db, academia=academia)
+
+    assert _rotas(db, academia) == [rota_evento(TIPO_MATRICULA, academia.id), rota_evento(TIPO_CANCELAMENTO, academia.id)]
+
+
+def test_evento_de_transacao_desfeita_nao_fica_no_outbox(db, academia):
+    registrar_evento(db, TIPO_MATRICULA, {"aluno_id": 0, "academia_id": academia.id})
+    db.flush()
+    db.rollback()
+
+    assert _rotas(db, academia) == []
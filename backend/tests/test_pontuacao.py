@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from app.models import Checkin, PontuacaoPendente, VersaoPontuada
+from app.models.aluno import StatusMatricula
+from app.services import pontuacao
+from app.services.pontuacao import (
+    _cruzaram_limiar, _registrar_versoes, _versao_desatualizada, _versoes_atuais, pontuar_alterados, pontuar_alunos
+)
+
+AGORA = datetime(2024, 6, 10, 3, 0)
+
+
+def test_so_procura_versao_antiga_nas_academias_com_versao_nova(db, novo_aluno):
+    aluno = novo_aluno(versao_risco="antiga")
+    versoes = {aluno.academia_id: "nova"}
+    assert aluno.id in _versao_desatualizada(db, versoes)
+
+    _registrar_versoes(db, versoes)
+    assert aluno.id not in _versao_desatualizada(db, versoes)
+
+    # Outra versão (ou a academia passou a usar o modelo compartilhado)
+    assert aluno.id in _versao_desatualizada(db, {aluno.academia_id: "mais nova"})
+    assert aluno.id in _versao_desatualizada(db, {aluno.academia_id: None})
+
+
+def test_checkin_que_passou_do_limiar(db, novo_aluno):
+    ativo, cancelado, recente = novo_aluno(), novo_aluno(status_matricula=StatusMatricula.CANCELADA.value), novo_aluno()
+    ha_uma_semana = AGORA - timedelta(days=7, hours=1)
+    db.add_all([
+        Checkin(aluno_id=ativo.id, academia_id=ativo.academia_id, data=ha_uma_semana),
+        Checkin(aluno_id=cancelado.id, academia_id=cancelado.academia_id, data=ha_uma_semana),
+        Checkin(aluno_id=recente.id, academia_id=recente.academia_id, data=AGORA - timedelta(days=3)),
+    ])
+    db.commit()
+
+    assert _cruzaram_limiar(db, [ativo.academia_id], AGORA - timedelta(days=1), AGORA) == {ativo.id}
+
+
+def test_pontuacao_registra_as_versoes_ao_terminar(db, academia):
+    academia_id = academia.id
+    pontuar_alterados(db, AGORA - timedelta(days=1), AGORA)
+
+    registrada = db.query(VersaoPontuada.versao).filter(VersaoPontuada.academia_id == academia_id).scalar()
+    assert registrada == _versoes_atuais(db)[academia_id]
+
+
+def test_aluno_que_falhou_fica_pendente(db, novo_aluno, monkeypatch):
+    aluno_id = novo_aluno().id
+    db.add(PontuacaoPendente(aluno_id=aluno_id, motivo="cancelamento", marcado_em=AGORA))
+    db.commit()
+
+    def falhar(aluno, preditor=None):
+        raise RuntimeError("falhou")
+    monkeypatch.setattr(pontuacao, "pontuar", falhar)
+
+    assert pontuar_alunos(db, [aluno_id]) == 0
+    assert db.query(PontuacaoPendente.motivo).filter(PontuacaoPendente.aluno_id == aluno_id).scalar() == "erro"
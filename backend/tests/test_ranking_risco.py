@@ -0,0 +1,82 @@
+from datetime import datetime
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+from app.database import Base
+from app.models import Academia, Aluno, Plano
+from app.routes import alunos as rotas_alunos
+
+# Riscos com empates e zeros (alunos ainda não pontuados) para cruzar páginas no meio de um empate
+RISCOS = [0.9, 0.9, 0.9, 0.5, None, 0.5, 0.0, None, 0.2, 0.9, None]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # Só as tabelas que a consulta do ranking usa, num SQLite em memória
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Academia.__table__, Plano.__table__, Aluno.__table__])
+    sessao = sessionmaker(bind=engine)()
+    monkeypatch.setattr(rotas_alunos, "etag_recursos", lambda *args, **kwargs: '"teste"')
+    yield sessao
+    sessao.close()
+
+
+@pytest.fixture
+def academia(db):
+    academia = Academia(nome="teste")
+    db.add(academia)
+    db.flush()
+    for indice, risco in enumerate(RISCOS):
+        campos = {} if risco is None else {"risco_churn": risco}
+        db.add(Aluno(
+            academia_id=academia.id, nome=f"aluno {indice}", email=f"aluno{indice}@teste",
+            data_matricula=datetime(2024, 1, 1), **campos
+        ))
+    # Aluno de outra academia nunca aparece
+    outra = Academia(nome="outra")
+    db.add(outra)
+    db.flush()
+    db.add(Aluno(academia_id=outra.id, nome="outro", risco_churn=1.0))
+    db.commit()
+    return academia
+
+
+def _pagina(db, academia, limite, proximo):
+    requisicao = Request({"type": "http", "method": "GET", "path": "/aluno/ranking-risco", "headers": [], "query_string": b""})
+    return rotas_alunos.ranking_risco(
+        request=requisicao, response=Response(), limite=limite, plano_id=None, risco_minimo=None,
+        matricula_min_dias=None, incluir_fatores=False, db=db, academia=academia,
+        **(proximo or {"apos_risco": None, "apos_id": None})
+    )
+
+
+def _todas_as_paginas(db, academia, limite):
+    vistos, proximo = [], None
+    while True:
+        pagina = _pagina(db, academia, limite, proximo)
+        vistos.extend((item["risco_churn"], item["id"]) for item in pagina["itens"])
+        proximo = pagina["proximo"]
+        if proximo is None:
+            return vistos
+
+
+@pytest.mark.parametrize("limite", [1, 2, 3, 4, len(RISCOS), len(RISCOS) + 1])
+def test_paginas_cobrem_todos_os_alunos_uma_vez_em_ordem(db, academia, limite):
+    vistos = _todas_as_paginas(db, academia, limite)
+
+    assert len(vistos) == len(RISCOS)
+    assert vistos == sorted(vistos, reverse=True)
+
+
+def test_aluno_sem_pontuacao_tem_risco_zero(db, academia):
+    riscos = [risco for risco, _ in _todas_as_paginas(db, academia, 3)]
+    assert None not in riscos
+    assert riscos.count(0.0) == RISCOS.count(None) + RISCOS.count(0.0)
+
+
+def test_cursor_so_com_risco_e_recusado(db, academia):
+    with pytest.raises(HTTPException) as erro:
+        _pagina(db, academia, 3, {"apos_risco": 0.5, "apos_id": None})
+    assert erro.value.status_code == 400
@@ -0,0 +1,128 @@
+import pytest
+from fastapi import Response
+from sqlalchemy import Column, Integer, create_engine, update
+from sqlalchemy.orm import declarative_base
+from starlette.requests import Request
+from app import database, replicas
+from app.replicas import CABECALHO_LSN, MonitorReplicas, lsn_para_int
+
+Base = declarative_base()
+
+
+class Registro(Base):
+    __tablename__ = "registros"
+    id = Column(Integer, primary_key=True)
+
+
+def _requisicao(metodo="GET", cabecalhos=None):
+    return Request({
+        "type": "http", "method": metodo, "path": "/", "query_string": b"",
+        "headers": [(nome.lower().encode(), valor.encode()) for nome, valor in (cabecalhos or {}).items()],
+    })
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    # Duas réplicas falsas: "a" já aplicou até 0/200, "b" só até 0/100
+    posicoes = {"a": lsn_para_int("0/200"), "b": lsn_para_int("0/100")}
+    monkeypatch.setattr(replicas, "_medir_replica", lambda replica: (0.0, posicoes[replica]))
+    monitor = MonitorReplicas(["a", "b"])
+    monitor._medir()
+    monitor._thread = object()  # Sem a thread de medição
+    monkeypatch.setattr(replicas, "monitor_replicas", monitor)
+    return monitor
+
+
+def test_lsn_comparavel_entre_segmentos():
+    assert lsn_para_int("1/0") > lsn_para_int("0/FFFFFFFF")
+    assert lsn_para_int("16/B374D848") == (0x16 << 32) + 0xB374D848
+
+
+@pytest.mark.parametrize("lsn", [None, "", "abc", "1/xyz", "1/2/3"])
+def test_lsn_invalido_e_ignorado(lsn):
+    assert lsn_para_int(lsn) is None
+
+
+def test_sem_posicao_usa_as_replicas_em_rodizio(monitor):
+    assert {monitor.escolher() for _ in range(4)} == {"a", "b"}
+
+
+def test_depois_da_escrita_so_replicas_que_ja_a_aplicaram(monitor):
+    assert {monitor.escolher(lsn_para_int("0/180")) for _ in range(4)} == {"a"}
+    assert {monitor.escolher(lsn_para_int("0/100")) for _ in range(4)} == {"a", "b"}
+
+
+def test_escrita_que_nenhuma_replica_aplicou_le_do_primario(monitor):
+    assert monitor.escolher(lsn_para_int("0/201")) is None
+
+
+def test_replica_inacessivel_sai_do_rodizio(monkeypatch):
+    def medir(replica):
+        if replica == "b":
+            raise OSError("conexão recusada")
+        return 0.0, 0
+    monkeypatch.setattr(replicas, "_medir_replica", medir)
+    monitor = MonitorReplicas(["a", "b"])
+    monitor._medir()
+    monitor._thread = object()
+    assert {monitor.escolher() for _ in range(4)} == {"a"}
+
+
+def _sessao(requisicao):
+    dependencia = replicas.get_db(requisicao)
+    sessao = next(dependencia)
+    dependencia.close()
+    return sessao
+
+
+def test_get_db_le_da_replica_com_a_escrita_do_cliente(monitor):
+    assert _sessao(_requisicao(cabecalhos={CABECALHO_LSN: "0/1FF"})).info["replica"] == "a"
+
+
+def test_get_db_de_escrita_usa_o_primario(monitor):
+    assert _sessao(_requisicao("POST")).info["replica"] is None
+
+
+@pytest.fixture
+def bancos(monkeypatch):
+    primario, replica = create_engine("sqlite://"), create_engine("sqlite://")
+    Base.metadata.create_all(primario)
+    monkeypatch.setattr(database, "engine", primario)
+    return primario, replica
+
+
+def test_sessao_le_da_replica_ate_escrever(bancos):
+    primario, replica = bancos
+    sessao = database.SessionLocal(info={"replica": replica})
+    assert sessao.get_bind() is replica
+
+    sessao.add(Registro(id=1))
+    sessao.flush()
+    # Depois do flush, inclusive as leituras vão para o primário e veem a escrita
+    assert sessao.get_bind() is primario
+    assert sessao.query(Registro).count() == 1
+    sessao.close()
+
+
+def test_update_em_massa_passa_a_usar_o_primario(bancos):
+    primario, replica = bancos
+    sessao = database.SessionLocal(info={"replica": replica})
+    assert sessao.get_bind(clause=update(Registro).values(id=2)) is primario
+    assert sessao.get_bind() is primario
+    sessao.close()
+
+
+@pytest.fixture
+def com_replica(monkeypatch):
+    monkeypatch.setattr(replicas, "engines_replica", ["a"])
+    monkeypatch.setattr(replicas, "posicao_primario", lambda: "0/300")
+
+
+def test_escrita_bem_sucedida_devolve_a_posicao(com_replica):
+    resposta = replicas.marcar_escrita(_requisicao("POST"), Response(status_code=201))
+    assert resposta.headers[CABECALHO_LSN] == "0/300"
+
+
+@pytest.mark.parametrize("metodo,status", [("GET", 200), ("POST", 400), ("DELETE", 404)])
+def test_leituras_e_erros_nao_devolvem_posicao(com_replica, metodo, status):
+    assert CABECALHO_LSN not in replicas.marcar_escrita(_requisicao(metodo), Response(status_code=status)).headers
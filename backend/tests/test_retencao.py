@@ -0,0 +1,147 @@
+import gzip
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.models import Aluno, Checkin, ResumoCheckinMes
+from app.models.aluno import StatusMatricula
+from app.services import churn_predictor as modulo_preditor
+from app.services import retencao
+from app.services.churn_predictor import calcular_features, churn_predictor, para_micros
+from app.services.snapshots import _features_sem_snapshot, registrar_snapshot_cancelamento
+
+# Mais de 30 dias depois do último arquivado, como garante HORIZONTE_DIAS: as
+# frequências semanal e mensal só contam os check-ins da tabela quente
+REFERENCIAS = [datetime(2024, 8, 5), datetime(2024, 8, 10, 12), datetime(2024, 9, 1)]
+
+
+@pytest.fixture(autouse=True)
+def sem_indice(tmp_path, monkeypatch):
+    # Features lidas de aluno.checkins e dos resumos, não do índice em memória
+    monkeypatch.setattr(modulo_preditor, "indice_checkins", None)
+    monkeypatch.setattr(retencao, "DIRETORIO", tmp_path)
+
+
+@pytest.fixture
+def aluno(db, novo_aluno):
+    aluno = novo_aluno(data_matricula=datetime(2023, 12, 20))
+    gerador = np.random.default_rng(11)
+    # Intervalos irregulares (frações de dia) de janeiro a junho de 2024, seguidos de alguns em julho e agosto
+    antigos = datetime(2024, 1, 3, 6) + np.cumsum(gerador.uniform(0.2, 6.0, 60)) * timedelta(days=1)
+    recentes = [datetime(2024, 7, 2, 7), datetime(2024, 7, 12, 18, 30), datetime(2024, 8, 3, 6, 5)]
+    db.add_all(Checkin(aluno_id=aluno.id, academia_id=aluno.academia_id, data=data)
+               for data in [*antigos[antigos < datetime(2024, 6, 28)].tolist(), *recentes])
+    db.commit()
+    return aluno
+
+
+def _esperadas(datas, aluno):
+    """Features calculadas só com os check-ins, sem nenhum resumo"""
+    return [calcular_features(np.sort(para_micros(datas)), aluno.data_matricula, aluno.plano.preco, referencia)
+            for referencia in REFERENCIAS]
+
+
+def _calculadas(db, aluno):
+    """Features como em produção: check-ins da tabela quente mais os resumos mensais"""
+    db.expire_all()
+    aluno = db.query(Aluno).get(aluno.id)
+    return [churn_predictor._extract_features(aluno, normalizar=False, referencia=referencia)[0]
+            for referencia in REFERENCIAS]
+
+
+def _datas(db, aluno):
+    return [data for (data,) in db.query(Checkin.data).filter(Checkin.aluno_id == aluno.id)]
+
+
+def _datas_arquivadas(db, aluno):
+    """Datas guardadas nos resumos mensais (coluna datas, em µs)"""
+    datas = []
+    for (mes,) in db.query(ResumoCheckinMes.datas).filter(ResumoCheckinMes.aluno_id == aluno.id):
+        datas.extend(datetime(1970, 1, 1) + timedelta(microseconds=int(us)) for us in mes)
+    return datas
+
+
+def _arquivar_ate(db, aluno, limite: datetime) -> int:
+    condicao = (Checkin.aluno_id == aluno.id) & (Checkin.data < limite)
+    return retencao._arquivar(db, condicao, f"teste-{aluno.id}")
+
+
+def _conferir(db, aluno, todas):
+    esperadas = _esperadas(todas, aluno)
+    # A variância dos intervalos é limitada a 100: acima disso não distinguiria resumos errados
+    assert all(0 < features[3] < 100 for features in esperadas)
+    np.testing.assert_allclose(_calculadas(db, aluno), esperadas, rtol=0, atol=1e-9)
+
+
+def test_features_iguais_antes_e_depois_de_arquivar(db, aluno, tmp_path):
+    todas = _datas(db, aluno)
+    _conferir(db, aluno, todas)
+
+    arquivados = _arquivar_ate(db, aluno, datetime(2024, 4, 1))
+    assert arquivados == sum(data < datetime(2024, 4, 1) for data in todas)
+    _conferir(db, aluno, todas)
+
+    # Segundo arquivamento em meses novos, depois dos já resumidos
+    _arquivar_ate(db, aluno, datetime(2024, 7, 1))
+    assert len(_datas(db, aluno)) == 3
+    _conferir(db, aluno, todas)
+
+    # Cada arquivamento gera um CSV com as linhas removidas
+    linhas = sum(len(gzip.open(caminho, "rt").read().splitlines()) - 1 for caminho in tmp_path.glob("*.csv.gz"))
+    assert linhas == len(todas) - 3
+
+
+def test_checkin_atrasado_em_mes_ja_resumido(db, aluno):
+    _arquivar_ate(db, aluno, datetime(2024, 7, 1))
+
+    # Chega depois um check-in no meio de um mês arquivado: ele é arquivado
+    # de novo e juntado ao resumo existente, que guarda as datas do mês
+    db.add(Checkin(aluno_id=aluno.id, academia_id=aluno.academia_id, data=datetime(2024, 3, 15, 12)))
+    db.commit()
+    todas = _datas(db, aluno) + _datas_arquivadas(db, aluno)
+    _arquivar_ate(db, aluno, datetime(2024, 7, 1))
+
+    _conferir(db, aluno, todas)
+
+
+def test_resumo_sem_datas_junta_checkin_depois_da_ultima(db, aluno):
+    _arquivar_ate(db, aluno, datetime(2024, 7, 1))
+    todas = _datas_arquivadas(db, aluno) + _datas(db, aluno)
+
+    # Resumos gravados antes da coluna datas: a junção ainda é exata quando
+    # o novo check-in vem depois de todos os do mês
+    db.query(ResumoCheckinMes).filter(ResumoCheckinMes.aluno_id == aluno.id).update({"datas": None})
+    db.add(Checkin(aluno_id=aluno.id, academia_id=aluno.academia_id, data=datetime(2024, 6, 30, 23)))
+    db.commit()
+    todas.append(datetime(2024, 6, 30, 23))
+    _arquivar_ate(db, aluno, datetime(2024, 7, 1))
+
+    _conferir(db, aluno, todas)
+
+
+
+def test_cancelado_sem_snapshot_fica_na_tabela_quente(db, aluno):
+    aluno.status_matricula = StatusMatricula.CANCELADA.value
+    aluno.data_cancelamento = datetime(2024, 8, 4)
+    db.commit()
+    total = len(_datas(db, aluno))
+
+    retencao.arquivar_antigos(db, agora=datetime(2025, 12, 1))
+    assert len(_datas(db, aluno)) == total
+
+    # Com o snapshot de cancelamento, os check-ins podem sair
+    registrar_snapshot_cancelamento(db, db.query(Aluno).get(aluno.id))
+    db.commit()
+    retencao.arquivar_antigos(db, agora=datetime(2025, 12, 1))
+    assert _datas(db, aluno) == []
+
+
+def test_cancelado_arquivado_sem_snapshot_fica_fora_do_treino(db, aluno):
+    # Arquivado antes da trava de arquivar_antigos: os check-ins da janela do cancelamento não existem mais
+    aluno.status_matricula = StatusMatricula.CANCELADA.value
+    aluno.data_cancelamento = datetime(2024, 8, 4)
+    db.commit()
+    _arquivar_ate(db, aluno, datetime(2024, 9, 1))
+
+    X, y, _ = _features_sem_snapshot(db, Aluno.id == aluno.id)
+
+    assert (X, y) == ([], [])
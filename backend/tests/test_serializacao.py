@@ -0,0 +1,39 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import inspect
+from app import models, schemas, serializacao
+from app.serializacao import campos, resposta_lista
+
+
+@pytest.mark.parametrize("schema", [schemas.Aluno, schemas.AlunoRisco])
+def test_colunas_que_aceitam_null_sao_opcionais_na_resposta(schema):
+    colunas = inspect(models.Aluno).columns
+    for nome, campo in schema.__fields__.items():
+        if nome in colunas and colunas[nome].nullable:
+            assert campo.allow_none, f"{schema.__name__}.{nome} não aceita nulo, mas a coluna aceita"
+
+
+def test_lista_validada_aceita_linhas_com_nulos(monkeypatch):
+    monkeypatch.setattr(serializacao, "VALIDAR_LISTAS", True)
+    chaves = campos(schemas.Aluno)
+    linha = {chave: None for chave in chaves}
+    linha.update(id=1, risco_churn=0.0)
+
+    resposta = resposta_lista(schemas.Aluno, chaves, [tuple(linha[chave] for chave in chaves)])
+
+    assert resposta.status_code == 200
+    assert b'"telefone":null' in resposta.body
+
+
+def test_lista_validada_recusa_risco_nulo(monkeypatch):
+    monkeypatch.setattr(serializacao, "VALIDAR_LISTAS", True)
+    chaves = campos(schemas.Aluno)
+    linha = dict.fromkeys(chaves)
+    linha["id"] = 1
+
+    with pytest.raises(ValueError):
+        resposta_lista(schemas.Aluno, chaves, [tuple(linha[chave] for chave in chaves)])
+
+
+def test_datas_no_formato_iso():
+    assert serializacao.para_json([{"data": datetime(2024, 1, 2, 3, 4, 5)}]) == b'[{"data":"2024-01-02T03:04:05"}]'
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+from pathlib import Path
+from sqlalchemy import func, select
+from app.services import treinamento
+from app.services.treinamento import TRAVA_TREINO, _treinar_com_trava
+
+
+def test_importar_o_modulo_nao_carrega_o_modelo():
+    # Como no processo filho do treino (spawn): o módulo vem sem o preditor
+    codigo = "import app.services.churn_predictor as m; print(len(m._instancias))"
+    saida = subprocess.run([sys.executable, "-c", codigo], cwd=Path(__file__).parents[1],
+                           capture_output=True, text=True, check=True).stdout
+    assert saida.strip().splitlines()[-1] == "0"
+    assert "Modelo de churn" not in saida
+
+
+def test_so_um_processo_treina_cada_modelo(engine_testes, monkeypatch):
+    treinados = []
+    monkeypatch.setattr(treinamento, "treinar_modelo", lambda db, chave: treinados.append(chave))
+
+    # A trava de outro processo, em outra conexão
+    with engine_testes.connect().execution_options(isolation_level="AUTOCOMMIT") as outro:
+        outro.execute(select(func.pg_advisory_lock(TRAVA_TREINO, 7)))
+        _treinar_com_trava(7)
+        _treinar_com_trava(None)
+        outro.execute(select(func.pg_advisory_unlock(TRAVA_TREINO, 7)))
+    _treinar_com_trava(7)
+
+    assert treinados == [None, 7]
@@ -2,6 +2,32 @@ import axios from 'axios';
 
 const api = axios.create({
   baseURL: process.env.REACT_APP_API_URL || 'http://localhost:8000',
+  // Chave de API da academia do painel (a API recusa requisições sem chave).
+  // X-Academia-Id só é usado com a chave da rede, para escolher a academia
+  headers: {
+    ...(process.env.REACT_APP_CHAVE_API ? { 'X-Chave-Api': process.env.REACT_APP_CHAVE_API } : {}),
+    ...(process.env.REACT_APP_ACADEMIA_ID ? { 'X-Academia-Id': process.env.REACT_APP_ACADEMIA_ID } : {}),
+  },
+});
+
+// Posição do banco depois da última escrita deste painel; reenviada para que
+// as leituras seguintes não caiam numa réplica que ainda não a tem
+const CABECALHO_LSN = 'X-Iagym-Lsn';
+let ultimaEscrita: string | undefined;
+
+api.interceptors.request.use((config) => {
+  if (ultimaEscrita) {
+    config.headers = { ...config.headers, [CABECALHO_LSN]: ultimaEscrita };
+  }
+  return config;
+});
+
+api.interceptors.response.use((response) => {
+  const lsn = response.headers[CABECALHO_LSN.toLowerCase()];
+  if (lsn) {
+    ultimaEscrita = lsn;
+  }
+  return response;
 });
 
 export interface Plano {
@@ -13,14 +39,14 @@ export interface Plano {
 
 export interface Aluno {
   id: number;
-  nome: string;
-  email: string;
-  telefone: string;
-  plano_id: number;
-  data_matricula: string;
-  nome_plano: string;
+  nome: string | null;
+  email: string | null;
+  telefone: string | null;
+  plano_id: number | null;
+  data_matricula: string | null;
+  nome_plano: string | null;
   risco_churn: number;
-  status_matricula: string;
+  status_matricula: string | null;
   data_cancelamento?: string;
 }
 
@@ -30,10 +56,24 @@ export interface Checkin {
   data: string;
 }
 
+export interface JanelaFrequencia {
+  inicio: string;
+  fim: string;
+  total_dias: number;
+  total_checkins: number;
+  dias_presentes: number;
+  percentual: number;
+}
+
 export interface Frequencia {
   total_dias: number;
   dias_presentes: number;
   percentual: number;
+  janelas: JanelaFrequencia[];
+}
+
+export interface FrequenciaAluno extends Frequencia {
+  aluno_id: number;
 }
 
 export interface RiscoChurn {
@@ -41,6 +81,17 @@ export interface RiscoChurn {
   fatores: string[];
 }
 
+export interface Dashboard {
+  atualizado_em: string | null;
+  alunos_ativos: number;
+  alunos_cancelados: number;
+  histograma_risco: { inicio: number; fim: number; total: number }[];
+  risco_medio_por_plano: { plano_id: number; nome: string; risco_medio: number; alunos: number }[];
+  checkins_por_dia: { dia: string; total: number }[];
+  mapa_calor_checkins: number[][];
+  cancelamentos_por_mes: { mes: string; total: number }[];
+}
+
 export interface NovoAluno {
   nome: string;
   email: string;
@@ -78,8 +129,18 @@ export const apiService = {
   },
 
   // Frequência
-  obterFrequencia: async (alunoId: number) => {
-    const response = await api.get<Frequencia>(`/aluno/${alunoId}/frequencia/`);
+  obterFrequencia: async (alunoId: number, janelas: number[] = [7, 30, 90]) => {
+    const params = new URLSearchParams();
+    janelas.forEach((janela) => params.append('janelas', String(janela)));
+    const response = await api.get<Frequencia>(`/aluno/${alunoId}/frequencia`, { params });
+    return response.data;
+  },
+
+  obterFrequenciaLote: async (alunoIds: number[], janelas: number[] = [7, 30, 90]) => {
+    const response = await api.post<FrequenciaAluno[]>('/aluno/frequencia/lote', {
+      aluno_ids: alunoIds,
+      janelas,
+    });
     return response.data;
   },
 
@@ -89,6 +150,12 @@ export const apiService = {
     return response.data;
   },
 
+  // Dashboard
+  obterDashboard: async () => {
+    const response = await api.get<Dashboard>('/dashboard/');
+    return response.data;
+  },
+
   // Cancelar Matrícula
   cancelarMatricula: async (alunoId: number) => {
     const response = await api.post<Aluno>(`/aluno/${alunoId}/cancelar`);
@@ -304,7 +304,7 @@ const Alunos: React.FC = () => {
                       Plano: {aluno.nome_plano}
                     </Typography>
                     <Typography color="textSecondary">
-                      Data de Matrícula: {new Date(aluno.data_matricula).toLocaleDateString()}
+                      Data de Matrícula: {aluno.data_matricula ? new Date(aluno.data_matricula).toLocaleDateString() : '-'}
                     </Typography>
                     <Typography 
                       color={aluno.status_matricula === 'ATIVA' ? 'primary' : 'error'}
@@ -46,6 +46,9 @@ const FrequenciaPage: React.FC = () => {
     }
   };
 
+  // Janela dos campos de topo: a primeira com a mesma duração (as fixas vêm antes da personalizada)
+  const resumo = frequencia?.janelas.find((janela) => janela.total_dias === frequencia.total_dias);
+
   return (
     <Box sx={{ p: 4 }}>
       <Snackbar
@@ -108,6 +111,17 @@ const FrequenciaPage: React.FC = () => {
               <Typography variant="body1">
                 Percentual de Frequência: {(frequencia.percentual * 100).toFixed(1)}%
               </Typography>
+              {frequencia.janelas
+                .filter((janela) => janela !== resumo)
+                .map((janela) => (
+                  <Typography variant="body2" color="text.secondary" key={`${janela.inicio}-${janela.fim}`}>
+                    {janela.fim === resumo?.fim
+                      ? `Últimos ${janela.total_dias} dias`
+                      : `De ${new Date(janela.inicio).toLocaleDateString()} a ${new Date(janela.fim).toLocaleDateString()}`}
+                    : {janela.dias_presentes} dias presentes
+                    ({janela.total_checkins} check-ins, {(janela.percentual * 100).toFixed(1)}%)
+                  </Typography>
+                ))}
             </Box>
           </CardContent>
         </Card>